@@ -0,0 +1,205 @@
+import collections
+import datetime
+import operator
+import threading
+
+import numpy as np
+
+from jbujb_data import sketch_quantiles
+from jbujb_events import DAY_SECONDS, day_to_ts, ts_to_day
+
+# ---------- Rolling Statistics ----------
+WEEK = 7
+EWMA_SPAN = 28  # Days; the EWMA forgets about half its weight in about three weeks
+MIN_HISTORY = 14  # Days of history before z-scores and week-over-week changes are reported
+
+
+class RollingSeries:
+    """EWMA mean/variance, z-score and week-over-week change of a daily series, for many stores at once.
+
+    ``update`` takes one new value per store and costs O(1) per store: the
+    two weekly sums are maintained from a 14-day ring instead of rescanned.
+    """
+
+    def __init__(self, n, span=EWMA_SPAN):
+        self.alpha = 2 / (span + 1)
+        self.days = 0
+        self.mean = np.zeros(n)
+        self.var = np.zeros(n)
+        self.z = np.full(n, np.nan)
+        self.wow = np.full(n, np.nan)
+        self.this_week = np.zeros(n)
+        self.last_week = np.zeros(n)
+        self._ring = np.zeros((2 * WEEK, n))
+
+    def update(self, values):
+        """Fold in the next day's value of every store (NaN counts as no change)"""
+        values = np.asarray(values, dtype=np.float64)
+        missing = np.isnan(values)
+        values = np.where(missing, self.mean, values)
+        pos = self.days % (2 * WEEK)
+        moving = self._ring[(self.days - WEEK) % (2 * WEEK)]  # Leaves this week, joins last week
+        dropped = self._ring[pos]  # Leaves last week
+        self.last_week += moving - dropped
+        self.this_week += values - moving
+        self._ring[pos] = values
+
+        if self.days == 0:
+            self.mean = values.copy()
+        std = np.sqrt(self.var)
+        # Score against the state before this value, so a spike does not dampen itself
+        z = np.divide(values - self.mean, std, out=np.zeros_like(values), where=std > 0)
+        delta = values - self.mean
+        self.mean = self.mean + self.alpha * delta
+        self.var = (1 - self.alpha) * (self.var + self.alpha * delta ** 2)
+        self.days += 1
+
+        ready = self.days >= MIN_HISTORY
+        self.z = np.where(ready & ~missing, z, np.nan)
+        self.wow = np.divide(self.this_week, self.last_week, out=np.full_like(values, np.nan),
+                             where=ready & (self.last_week > 0)) - 1
+
+
+# ---------- Alert Rules ----------
+# A rule fires for every store whose signal compares true against the threshold;
+# the message is formatted with that store's signals.
+AlertRule = collections.namedtuple('AlertRule', 'name type title signal op threshold message')
+
+FULFILLMENT_P95_TARGET = 25  # Minutes within which 95% of orders should be ready
+DEAD_ITEM_DAYS = 7
+TOP_ITEMS_SHARE = 0.35  # Top 3 items' share of weekly orders that suggests a bundle
+LAPSED_VIP_SHARE = 0.5  # Share of last fortnight's VIP regulars silent this week; a third or so is normal churn
+
+ALERT_RULES = (
+    AlertRule('fulfillment_spike', 'error', 'Fulfillment Time Spike', 'fulfillment_p95_z', '>', 3.0,
+              "The last full day's p95 fulfillment time of {fulfillment_p95:.1f} minutes is "
+              "{fulfillment_p95_z:.1f} standard deviations above the recent trend. Kitchen may be overwhelmed."),
+    AlertRule('fulfillment_target', 'error', 'Order Fulfillment Delays', 'fulfillment_p95', '>',
+              FULFILLMENT_P95_TARGET,
+              "95% of the last full day's orders took up to {fulfillment_p95:.1f} minutes "
+              f"(target: p95 <{FULFILLMENT_P95_TARGET} min). Kitchen may be overwhelmed."),
+    AlertRule('order_drop', 'error', 'Unusual Order Drop', 'orders_z', '<', -3.0,
+              "The last full day's {orders:.0f} orders were {orders_z:.1f} standard deviations below the trend."),
+    AlertRule('order_decline', 'warning', 'Declining Daily Orders', 'orders_wow', '<', -0.08,
+              "Orders down {orders_decline:.0%} compared to last week. Consider promotional campaigns."),
+    AlertRule('lapsed_vips', 'warning', 'VIP Customer Engagement', 'lapsed_vip_share', '>', LAPSED_VIP_SHARE,
+              "{lapsed_vips:.0f} VIP regulars ({lapsed_vip_share:.0%} of last fortnight's) haven't ordered this "
+              "week. Send personalized offers."),
+    AlertRule('dead_items', 'info', 'Menu Item Performance', 'dead_items', '>', 0,
+              f"{{dead_items:.0f}} items haven't been ordered in {DEAD_ITEM_DAYS} days. "
+              "Consider removing or promoting them."),
+    AlertRule('bundle_opportunity', 'success', 'Bundle Opportunity', 'top3_share', '>', TOP_ITEMS_SHARE,
+              "The top 3 items make up {top3_share:.0%} of this week's orders. "
+              "A bundle of them could lift the average order value."),
+)
+
+OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+
+# ---------- Alert Engine ----------
+class AlertEngine:
+    """Rolling alert state of many stores, advanced one closed day at a time.
+
+    Every ``close_day`` updates each store's state in O(1) (O(items) for the
+    menu signals) and re-evaluates the rules, so active alerts are always
+    ready to read and history is never rescanned.
+    """
+
+    def __init__(self, merchant_ids, n_items, rules=ALERT_RULES):
+        n = len(merchant_ids)
+        self.merchant_ids = list(merchant_ids)
+        self.rules = rules
+        self.day = None  # Last closed date
+        self.orders = RollingSeries(n)
+        self.fulfillment = RollingSeries(n)
+        self.item_week = np.zeros((n, n_items))
+        self.item_last_day = np.full((n, n_items), -DEAD_ITEM_DAYS - 1)
+        self._item_ring = np.zeros((WEEK, n, n_items))
+        self.signals = {}
+        self.alerts = []
+        self.lock = threading.Lock()
+
+    def close_day(self, date, orders, fulfillment_p95, item_orders, lapsed_vips=None):
+        """Fold one finished day of every store in and refresh the active alerts.
+
+        ``item_orders`` is (stores, items); ``lapsed_vips`` holds one
+        (lapsed, regulars) pair per store (see CustomerState.lapsed_vips) and
+        may be None when it is not known for this day (e.g. while replaying history).
+        """
+        item_orders = np.asarray(item_orders, dtype=np.float64)
+        day = (date - datetime.date(1970, 1, 1)).days
+        self.orders.update(orders)
+        self.fulfillment.update(fulfillment_p95)
+        pos = day % WEEK
+        self.item_week += item_orders - self._item_ring[pos]
+        self._item_ring[pos] = item_orders
+        self.item_last_day[item_orders > 0] = day
+        weekly = self.item_week.sum(axis=1)
+        top3 = -np.sort(-self.item_week, axis=1)[:, :3].sum(axis=1)
+        self.day = date
+        self.signals = {
+            'orders': np.asarray(orders, dtype=np.float64),
+            'orders_z': self.orders.z,
+            'orders_wow': self.orders.wow,
+            'orders_decline': -self.orders.wow,
+            'fulfillment_p95': np.asarray(fulfillment_p95, dtype=np.float64),
+            'fulfillment_p95_z': self.fulfillment.z,
+            'dead_items': np.count_nonzero(self.item_last_day <= day - DEAD_ITEM_DAYS, axis=1).astype(np.float64),
+            'top3_share': np.divide(top3, weekly, out=np.full(len(weekly), np.nan), where=weekly > 0),
+        }
+        lapsed, regulars = (np.full((2, len(weekly)), np.nan) if lapsed_vips is None
+                            else np.asarray(lapsed_vips, dtype=np.float64).reshape(-1, 2).T)
+        self.signals['lapsed_vips'] = lapsed
+        self.signals['lapsed_vip_share'] = np.divide(lapsed, regulars, out=np.full(len(weekly), np.nan),
+                                                     where=regulars > 0)
+        self.alerts = self.evaluate()
+
+    def evaluate(self):
+        """Alerts of the last closed day as dicts with merchant_id, rule, type, title and message"""
+        alerts = []
+        for rule in self.rules:
+            values = self.signals[rule.signal]
+            with np.errstate(invalid='ignore'):
+                firing = np.flatnonzero(OPERATORS[rule.op](values, rule.threshold) & ~np.isnan(values))
+            for i in firing:
+                alerts.append({
+                    'merchant_id': self.merchant_ids[i],
+                    'rule': rule.name,
+                    'type': rule.type,
+                    'title': rule.title,
+                    'message': rule.message.format(**{name: float(v[i]) for name, v in self.signals.items()})
+                })
+        return alerts
+
+    def active_alerts(self, merchant_id=None):
+        """Current alerts, optionally of one store"""
+        return [alert for alert in self.alerts if merchant_id is None or alert['merchant_id'] == merchant_id]
+
+
+# ---------- Feeding From Event Stores ----------
+def store_day_signals(store, date):
+    """(orders, p95 fulfillment minutes, orders per item) of one day of a store's raw tier"""
+    orders = store.orders.view(day_to_ts(date), day_to_ts(date) + DAY_SECONDS)
+    p95 = sketch_quantiles(store.sketches.window(date, date, 'fulfillment'), (0.95,))[0]
+    return (len(orders['ts']), p95 / 60 if p95 is not None else np.nan,
+            np.bincount(orders['item'], minlength=len(store.items)))
+
+
+def advance_alerts(engine, stores, until=None):
+    """Close every finished day the engine has not seen yet, for stores sharing one raw tier.
+
+    ``until`` defaults to the day before the stores' watermark (the last
+    complete day); lapsed VIPs are only counted for the final day closed.
+    """
+    with engine.lock:
+        until = until or ts_to_day(min(store.watermark for store in stores)) - datetime.timedelta(days=1)
+        first = engine.day + datetime.timedelta(days=1) if engine.day else max(store.raw_start for store in stores)
+        for offset in range((until - first).days + 1):
+            date = first + datetime.timedelta(days=offset)
+            orders, p95, item_orders = zip(*(store_day_signals(store, date) for store in stores))
+            lapsed = None
+            if date == until:
+                as_of = day_to_ts(date) + DAY_SECONDS
+                lapsed = [store.customers.lapsed_vips(as_of) for store in stores]
+            engine.close_day(date, orders, p95, np.stack(item_orders), lapsed)
+        return engine.active_alerts()
@@ -0,0 +1,346 @@
+import argparse
+import collections
+import datetime
+import hashlib
+import http.server
+import json
+import math
+import os
+import sys
+import threading
+import time
+import traceback
+import urllib.parse
+
+import numpy as np
+import pandas as pd
+
+from jbujb_chain import chain_merchant_ids
+from jbujb_config import CHAIN_STORES, EVENT_FEED_PATH, HISTORY_DAYS, SEED, SQL_PATH, STREAM_CAPACITY
+from jbujb_data import COMPARISON_BASELINES, DailyRollup
+from jbujb_events import LiveUpdater, SyntheticFeed, day_to_ts, now_ts
+from jbujb_reports import (customer_report, kpi_report, menu_report, open_chain, open_sql_backend, open_store,
+                           trend_report)
+from jbujb_trace import Tracer, activate, count, serve_metrics, span
+
+# ---------- Configuration ----------
+API_PORT = int(os.environ.get("JBUJB_API_PORT", "8502"))
+REFRESH_SECONDS = int(os.environ.get("JBUJB_API_REFRESH_SECONDS", "60"))  # Live refresh interval of today's windows
+RESPONSE_CACHE_MB = int(os.environ.get("JBUJB_API_CACHE_MB", "32"))  # Serialized responses kept across requests
+MAX_SOURCES = int(os.environ.get("JBUJB_API_MAX_SOURCES", "8"))  # Merchant stores kept open at once
+
+DEFAULT_DAYS = 7  # Window when neither start nor days is given
+MAX_TOP = 100  # Largest n of the top-items and top-customers lists
+
+
+# ---------- Request Parameters ----------
+def _param(params, name, default=None):
+    """Last value of a query parameter"""
+    values = params.get(name)
+    return values[-1] if values else default
+
+
+def _date_param(params, name):
+    value = _param(params, name)
+    try:
+        return datetime.date.fromisoformat(value) if value is not None else None
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date (YYYY-MM-DD), got {value!r}") from None
+
+
+def _int_param(params, name, default, lo, hi):
+    value = _param(params, name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {value!r}") from None
+    if not lo <= number <= hi:
+        raise ValueError(f"{name} must be between {lo} and {hi}")
+    return number
+
+
+def parse_range(params, today):
+    """(start, end) from start/end ISO dates, or from days=N ending at end (default today)"""
+    end = _date_param(params, 'end') or today
+    start = _date_param(params, 'start')
+    if start is not None and 'days' in params:
+        raise ValueError("pass either start or days, not both")
+    if start is None:
+        start = end - datetime.timedelta(days=_int_param(params, 'days', DEFAULT_DAYS, 1, HISTORY_DAYS) - 1)
+    earliest = today - datetime.timedelta(days=HISTORY_DAYS - 1)
+    if end > today:
+        raise ValueError(f"end must not be after today ({today})")
+    if start > end:
+        raise ValueError("start must not be after end")
+    if start < earliest:
+        raise ValueError(f"start must not be before the first day of history ({earliest})")
+    return start, end
+
+
+# ---------- JSON Encoding ----------
+def json_value(value):
+    """Plain JSON value of a report: numpy scalars unwrapped, dates as ISO strings, NaN and inf as null"""
+    if isinstance(value, dict):
+        return {str(key): json_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [json_value(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is pd.NaT:
+        return None
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+# ---------- Merchant Sources ----------
+class MerchantSource:
+    """Rollup, KPI source and section backend of one merchant for one day.
+
+    The flagship store ('default') is live: windows ending today fold in new
+    events (from the local feed when one is configured) at most every
+    REFRESH_SECONDS. Chain locations and the merged chain are built through
+    the day and do not change.
+    """
+
+    def __init__(self, merchant_id, as_of):
+        self.merchant_id = merchant_id
+        self.as_of = as_of
+        self.updater = self.ingestor = self.section = None
+        if merchant_id == 'chain':
+            self.source = open_chain(as_of)
+            self.rollup = self.source.rollup
+        elif merchant_id == 'default':
+            # As in the dashboard: with a live feed configured, today's events come from the stream
+            store = open_store(as_of, now=day_to_ts(as_of) if EVENT_FEED_PATH else now_ts())
+            self.source, self.rollup = store, DailyRollup(store.daily_frame())
+            self.section = open_sql_backend(SQL_PATH, store) if SQL_PATH else store
+            if EVENT_FEED_PATH:
+                from jbujb_stream import NDJSONTail, StreamIngestor
+                self.ingestor = StreamIngestor(NDJSONTail(EVENT_FEED_PATH), store, self.rollup, STREAM_CAPACITY)
+            else:
+                self.updater = LiveUpdater(store, self.rollup, SyntheticFeed(store, SEED))
+        else:
+            store = open_store(as_of, merchant_id)
+            self.source, self.rollup, self.section = store, DailyRollup(store.daily_frame()), store
+        self.refreshed = None
+        self._lock = threading.Lock()
+
+    def watermark(self, end_date):
+        """Data watermark of a window: windows ending before the live day never change"""
+        sealed = day_to_ts(end_date + datetime.timedelta(days=1))
+        if self.ingestor is not None and end_date >= self.as_of:
+            return sealed, self.ingestor.events_seen
+        return min(self.source.watermark, sealed), 0
+
+    def refresh(self, end_date):
+        """Fold in new events when the window ends today and the last refresh is old enough"""
+        if end_date < self.as_of or (self.updater is None and self.ingestor is None):
+            return
+        with self._lock:
+            if self.refreshed is not None and time.monotonic() - self.refreshed < REFRESH_SECONDS:
+                return
+            if self.ingestor is not None:
+                self.ingestor.pump()
+            else:
+                self.updater.refresh(now_ts())
+            if self.section is not self.source:
+                self.section.sync(self.source)  # Live events reach the SQL backend too
+            self.refreshed = time.monotonic()
+
+    def kpis(self, start_date, end_date, baseline):
+        today_metrics = None
+        if self.ingestor is not None and start_date == end_date == self.as_of:
+            # Today's event KPIs come from the stream's running sums
+            today_metrics = self.ingestor.today.metrics()
+        return kpi_report(self.rollup, self.source, start_date, end_date, baseline, today_metrics)
+
+    def trend(self, start_date, end_date):
+        return trend_report(self.source, start_date, end_date)
+
+    def menu(self, start_date, end_date, n):
+        return menu_report(self.section, start_date, end_date, n)
+
+    def customers(self, start_date, end_date, n):
+        return customer_report(self.section, self.source, start_date, end_date, n)
+
+
+# ---------- Response Cache ----------
+class ResponseCache:
+    """LRU cache of serialized responses, capped by total size"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        """Response body for key, calling build() (which returns bytes) only on a miss"""
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                return body, True
+        body = build()
+        with self._lock:
+            if key not in self._entries and len(body) <= self.max_bytes:
+                self._entries[key] = body
+                self._bytes += len(body)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted)
+        return body, False
+
+
+# ---------- Metrics Service ----------
+class MetricsService:
+    """KPI, trend, menu and customer reports per merchant and window, cached by data watermark.
+
+    A response is keyed on (report, merchant, window, options, watermark) and
+    its ETag is a hash of that key, so a client revalidating with
+    If-None-Match gets a 304 without the report being computed.
+    """
+
+    REPORTS = ('kpis', 'trend', 'menu', 'customers')
+
+    def __init__(self, chain_stores=CHAIN_STORES, cache_bytes=RESPONSE_CACHE_MB * 1024 * 1024,
+                 max_sources=MAX_SOURCES):
+        self.merchants = {'default', 'chain', *chain_merchant_ids(chain_stores)}
+        self.max_sources = max_sources
+        self.cache = ResponseCache(cache_bytes)
+        self.tracers = ()  # Request timings and counters go here (see --metrics-port)
+        self._sources = collections.OrderedDict()
+        self._build_locks = {}
+        self._lock = threading.Lock()
+
+    def source(self, merchant_id, as_of):
+        """Open (or reuse) a merchant's source; each is built once even under concurrent requests"""
+        key = merchant_id, as_of
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+        with build_lock:
+            with self._lock:
+                source = self._sources.get(key)
+                if source is not None:
+                    self._sources.move_to_end(key)
+                    return source
+            with span('open source', 'source', merchant=merchant_id):
+                source = MerchantSource(merchant_id, as_of)
+            with self._lock:
+                self._sources[key] = source
+                while len(self._sources) > self.max_sources:
+                    evicted, _ = self._sources.popitem(last=False)
+                    self._build_locks.pop(evicted, None)
+        return source
+
+    def handle(self, report, params, if_none_match=None):
+        """(status, body, ETag) of a report request; raises LookupError (404) or ValueError (400)"""
+        if report not in self.REPORTS:
+            raise LookupError(f"unknown report {report!r}; expected one of {', '.join(self.REPORTS)}")
+        merchant_id = _param(params, 'merchant', 'default')
+        if merchant_id not in self.merchants:
+            raise LookupError(f"unknown merchant {merchant_id!r}")
+        start_date, end_date = parse_range(params, datetime.date.today())
+        if report == 'kpis':
+            baseline = _param(params, 'baseline', 'previous_period')
+            if baseline not in COMPARISON_BASELINES and baseline != 'none':
+                raise ValueError(f"baseline must be one of {', '.join(COMPARISON_BASELINES)} or none")
+            options = (baseline if baseline != 'none' else None,)
+        elif report in ('menu', 'customers'):
+            if merchant_id == 'chain':
+                raise ValueError("menu and customer reports are per store; pass a location's merchant id")
+            options = (_int_param(params, 'n', 5, 1, MAX_TOP),)
+        else:
+            options = ()
+
+        source = self.source(merchant_id, datetime.date.today())
+        source.refresh(end_date)
+        key = (report, merchant_id, start_date, end_date, options, source.watermark(end_date))
+        etag = f'"{hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()}"'
+        if if_none_match and _etag_matches(if_none_match, etag):
+            return 304, b'', etag
+
+        def build():
+            with span(report, 'report', merchant=merchant_id):
+                body = getattr(source, report)(start_date, end_date, *options)
+            return json.dumps(json_value({'merchant': merchant_id, 'start': start_date, 'end': end_date, **body}),
+                              allow_nan=False).encode()
+
+        body, hit = self.cache.get_or_build(etag, build)
+        count('api_responses', report=report, result='hit' if hit else 'miss')
+        return 200, body, etag
+
+
+def _etag_matches(if_none_match, etag):
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
+
+# ---------- HTTP Server ----------
+def api_server(service, port=API_PORT, host='127.0.0.1'):
+    """Threaded HTTP server answering GET /v1/<report>?merchant=&start=&end=&days=&baseline=&n= with JSON"""
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            activate(*service.tracers)
+            url = urllib.parse.urlsplit(self.path)
+            prefix, _, report = url.path.rpartition('/')
+            try:
+                if prefix != '/v1':
+                    raise LookupError(f"unknown path {url.path!r}")
+                with span(report, 'request'):
+                    status, body, etag = service.handle(report, urllib.parse.parse_qs(url.query),
+                                                        self.headers.get('If-None-Match'))
+            except LookupError as exc:
+                status, body, etag = 404, json.dumps({'error': str(exc)}).encode(), None
+            except ValueError as exc:
+                status, body, etag = 400, json.dumps({'error': str(exc)}).encode(), None
+            except Exception:  # Any other failure still gets a response instead of a dropped connection
+                traceback.print_exc()
+                count('api_responses', report=report, result='error')
+                status, body, etag = 500, json.dumps({'error': 'internal error'}).encode(), None
+            self.send_response(status)
+            if etag is not None:
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', 'no-cache')  # Clients revalidate; unchanged data costs a 304
+            if status != 304:
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return http.server.ThreadingHTTPServer((host, port), Handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the dashboard's KPI, trend, menu and customer reports as JSON")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=API_PORT)
+    parser.add_argument('--chain-stores', type=int, default=CHAIN_STORES, help="Locations in the 'chain' merchant")
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help="Also serve Prometheus text of request timings and counters on this port")
+    args = parser.parse_args(argv)
+
+    service = MetricsService(args.chain_stores)
+    if args.metrics_port:
+        tracer = Tracer(max_spans=0)
+        serve_metrics(tracer, args.metrics_port, args.host)
+        service.tracers = (tracer,)
+    server = api_server(service, args.port, args.host)
+    print(f"Serving reports at http://{args.host}:{args.port}/v1/{{{','.join(MetricsService.REPORTS)}}}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+import base64
+import functools
+import os
+import re
+
+# ---------- Static Assets ----------
+# Paths are relative to this file, so the dashboard can be started from any directory
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+CSS_PATH = os.path.join(ASSET_DIR, 'jbujb_dashboard.css')
+LOGO_PATH = os.path.join(ASSET_DIR, 'jbujb_logo_1.svg')
+FONT_DIR = os.path.join(ASSET_DIR, 'fonts')  # Optional <Family>-<weight>.woff2 files, embedded into the CSS
+
+MIME_TYPES = {'.svg': 'image/svg+xml', '.woff2': 'font/woff2', '.woff': 'font/woff', '.ttf': 'font/ttf'}
+FONT_FORMATS = {'.woff2': 'woff2', '.woff': 'woff', '.ttf': 'truetype'}
+
+
+def data_uri(path):
+    """Base64 data URI of a file, typed by its extension"""
+    with open(path, 'rb') as f:
+        encoded = base64.b64encode(f.read()).decode('ascii')
+    return f"data:{MIME_TYPES[os.path.splitext(path)[1]]};base64,{encoded}"
+
+
+def minify_css(css):
+    """Drop comments and the whitespace around CSS punctuation"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    return re.sub(r':\s+', ':', css).replace(';}', '}').strip()  # "a :hover" keeps its descendant space
+
+
+@functools.cache
+def font_faces():
+    """@font-face rules for the fonts bundled in FONT_DIR (none bundled means system fonts)"""
+    if not os.path.isdir(FONT_DIR):
+        return ''
+    rules = []
+    for name in sorted(os.listdir(FONT_DIR)):
+        stem, ext = os.path.splitext(name)
+        family, _, weight = stem.rpartition('-')
+        if ext not in FONT_FORMATS or not family or not weight.isdigit():
+            continue
+        rules.append(f"@font-face{{font-family:'{family}';font-weight:{weight};font-display:swap;"
+                     f"src:url({data_uri(os.path.join(FONT_DIR, name))}) format('{FONT_FORMATS[ext]}')}}")
+    return ''.join(rules)
+
+
+@functools.cache
+def dashboard_style():
+    """The dashboard's <style> block: bundled fonts and the minified stylesheet, built once per process"""
+    with open(CSS_PATH) as f:
+        css = f.read()
+    return f"<style>{font_faces()}{minify_css(css)}</style>"
+
+
+@functools.cache
+def logo_data_uri():
+    """The logo as a data URI, or None when the file is missing"""
+    return data_uri(LOGO_PATH) if os.path.exists(LOGO_PATH) else None
@@ -0,0 +1,201 @@
+import argparse
+import concurrent.futures
+import datetime
+import json
+import math
+import multiprocessing
+import os
+import platform
+import sys
+import time
+
+from jbujb_charts import category_figure, hours_figure, segments_figure, trend_figure
+from jbujb_config import DATA_DIR
+from jbujb_data import DailyRollup, build_kpi_metrics, compare_periods, event_kpis, period_data
+from jbujb_events import now_ts
+from jbujb_export import export_stream
+from jbujb_reports import open_chain, open_store
+
+try:
+    import resource
+except ImportError:  # Peak RSS is only reported on Unix
+    resource = None
+
+# ---------- Benchmark Matrix ----------
+BENCH_DAYS = (1, 7, 30, 365, 3650)  # Window lengths, ending on the as-of date
+BENCH_MERCHANTS = (1, 100, 5000)  # 1 is the single-store view, more is a chain
+
+REPEAT = 3  # Each stage keeps its fastest run, so one-off lazy builds do not count
+REGRESSION_THRESHOLD = 0.2  # Relative growth of a metric that fails the comparison
+MIN_REGRESSION_SECONDS = 0.005  # Timing changes below this are noise
+
+STAGES = ('generate_enhanced_data', 'kpi_metrics', 'fig_trends', 'fig_hours', 'fig_category', 'fig_segments',
+          'export')
+
+BENCH_DATA_DIR = os.path.join(DATA_DIR, 'bench')  # Kept apart from the dashboard's stores
+
+
+def peak_rss_mb():
+    """High-water resident set size of this process, or None where unsupported"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024  # Bytes on macOS, KiB elsewhere
+
+
+# ---------- Pipeline ----------
+def load_sources(merchants, as_of, root):
+    """(rollup, KPI source, section store) as the dashboard builds them for a store count.
+
+    As in the dashboard, today's store holds events up to now; past days are complete.
+    """
+    store = open_store(as_of, now=now_ts() if as_of == datetime.date.today() else None, root=root)
+    if merchants == 1:
+        return DailyRollup(store.daily_frame()), store, store
+    chain = open_chain(as_of, merchants, root)
+    return chain.rollup, chain, store
+
+
+def run_pipeline(rollup, source, section, start_date, end_date):
+    """One headless pass over the dashboard: (seconds per stage, figure bytes, export bytes)"""
+    seconds, figure_bytes = {}, {}
+
+    def timed(stage, build):
+        started = time.perf_counter()
+        result = build()
+        seconds[stage] = time.perf_counter() - started
+        return result
+
+    data = timed('generate_enhanced_data', lambda: period_data(rollup, source, start_date, end_date))
+    kpis = timed('kpi_metrics', lambda: build_kpi_metrics(data, compare_periods(
+        rollup, start_date, end_date, extra_metrics=event_kpis(source))['previous_period']))
+    # Figures are timed through serialization, which is what reaches the browser
+    for stage, build in [
+        ('fig_trends', lambda: trend_figure(data['trend'], data['trend_level'])),
+        ('fig_hours', lambda: hours_figure(source.cube.hourly(start_date, end_date))),
+        ('fig_category', lambda: category_figure(section.category_metrics(start_date, end_date))),
+        ('fig_segments', lambda: segments_figure(section.customer_segments(start_date, end_date)))
+    ]:
+        figure_bytes[stage] = len(timed(stage, lambda: build().to_json()).encode())
+
+    def export():
+        report = json.dumps({'period': f"{start_date} to {end_date}", 'kpis': kpis}, indent=2).encode()
+        return len(report) + sum(len(block) for block in export_stream(section, rollup, 'orders', start_date, end_date))
+
+    return seconds, figure_bytes, timed('export', export)
+
+
+def bench_cell(merchants, n_days, as_of, root, repeat=REPEAT):
+    """Result of one (store count, window length) cell, run in a fresh process"""
+    started = time.perf_counter()
+    rollup, source, section = load_sources(merchants, as_of, root)
+    load_seconds = time.perf_counter() - started
+    load_rss = peak_rss_mb()
+
+    start_date = as_of - datetime.timedelta(days=n_days - 1)
+    seconds = dict.fromkeys(STAGES, math.inf)
+    for _ in range(repeat):
+        run, figure_bytes, export_bytes = run_pipeline(rollup, source, section, start_date, as_of)
+        seconds = {stage: min(seconds[stage], run[stage]) for stage in STAGES}
+    rss = peak_rss_mb()
+    return {
+        'merchants': merchants,
+        'days': n_days,
+        'wall_s': sum(seconds.values()),
+        'stages': seconds,
+        'figure_bytes': figure_bytes,
+        'payload_bytes': sum(figure_bytes.values()),
+        'export_bytes': export_bytes,
+        'load_s': load_seconds,
+        'peak_rss_mb': rss,
+        'pipeline_rss_mb': rss - load_rss if rss is not None else None  # Growth over the loaded sources
+    }
+
+
+def run_benchmarks(days=BENCH_DAYS, merchants=BENCH_MERCHANTS, as_of=None, root=BENCH_DATA_DIR, repeat=REPEAT):
+    """Benchmark every (merchants, days) cell, each in its own spawned process"""
+    as_of = as_of or datetime.date.today()
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for n in merchants:
+        for n_days in days:
+            # Peak RSS is a per-process high-water mark, so a fresh process keeps cells from inheriting it
+            with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+                results.append(pool.submit(bench_cell, n, n_days, as_of, root, repeat).result())
+    return {
+        'as_of': as_of.isoformat(),
+        'created_at': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'repeat': repeat,
+        'results': results
+    }
+
+
+# ---------- Regression Check ----------
+def find_regressions(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """Messages for every metric of a cell that grew by more than threshold over the baseline"""
+    previous = {(cell['merchants'], cell['days']): cell for cell in baseline['results']}
+    regressions = []
+    for cell in report['results']:
+        base = previous.get((cell['merchants'], cell['days']))
+        if base is None:
+            continue
+        metrics = [('wall_s', cell['wall_s'], base['wall_s'], MIN_REGRESSION_SECONDS),
+                   ('peak_rss_mb', cell['peak_rss_mb'], base['peak_rss_mb'], 0),
+                   ('payload_bytes', cell['payload_bytes'], base['payload_bytes'], 0)]
+        metrics += [(stage, cell['stages'][stage], base['stages'][stage], MIN_REGRESSION_SECONDS)
+                    for stage in STAGES if stage in base['stages']]
+        for name, value, base_value, floor in metrics:
+            if value is None or base_value is None:
+                continue
+            if value > base_value * (1 + threshold) and value - base_value > floor:
+                growth = f" (+{value / base_value - 1:.0%})" if base_value else ""
+                regressions.append(f"{cell['merchants']} stores × {cell['days']} days: "
+                                   f"{name} {base_value:.4g} -> {value:.4g}{growth}")
+    return regressions
+
+
+def format_report(report):
+    lines = [f"{'stores':>6} {'days':>5} {'wall ms':>9} {'peak MB':>8} {'figures KB':>11} {'export KB':>10}"]
+    for cell in report['results']:
+        rss = f"{cell['peak_rss_mb']:8.0f}" if cell['peak_rss_mb'] is not None else f"{'n/a':>8}"
+        lines.append(f"{cell['merchants']:>6} {cell['days']:>5} {cell['wall_s'] * 1000:9.1f} {rss} "
+                     f"{cell['payload_bytes'] / 1024:11.1f} {cell['export_bytes'] / 1024:10.1f}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard's data and rendering pipeline headlessly")
+    parser.add_argument('--days', type=int, nargs='+', default=BENCH_DAYS, help="Window lengths in days")
+    parser.add_argument('--merchants', type=int, nargs='+', default=BENCH_MERCHANTS, help="Store counts")
+    parser.add_argument('--as-of', type=datetime.date.fromisoformat, default=None,
+                        help="Last day of every window (default: today)")
+    parser.add_argument('--data-dir', default=BENCH_DATA_DIR,
+                        help="Persisted Arrow partitions of the benchmark's stores (keep apart from the dashboard's)")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="Runs per cell; the fastest is kept")
+    parser.add_argument('--output', default='bench_results.json', help="Where the JSON results are written")
+    parser.add_argument('--baseline', help="Earlier results to compare against")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="Relative growth of any metric that counts as a regression")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.days, args.merchants, args.as_of, args.data_dir, args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(format_report(report))
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(report, json.load(f), args.threshold)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+        print(f"No regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
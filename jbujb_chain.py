@@ -0,0 +1,111 @@
+import concurrent.futures
+import datetime
+import multiprocessing
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from jbujb_data import ROLLUP_COLUMNS, DailyRollup
+from jbujb_events import (CohortMatrix, DailyDistinct, HourCube, HourSketch, RollupPyramid, day_to_ts,
+                          kpis_from_partials, merge_partials)
+from jbujb_storage import open_or_build_event_store
+
+
+# ---------- Chain Members ----------
+def chain_merchant_ids(n_stores):
+    """Merchant IDs of the chain's locations"""
+    return [f"store-{i:04d}" for i in range(1, n_stores + 1)]
+
+
+def merchant_seed(merchant_id):
+    """Stable per-merchant seed so every location gets its own synthetic history"""
+    return zlib.crc32(merchant_id.encode())
+
+
+# ---------- Per-Store Work (runs in worker processes) ----------
+def _store_partials(store):
+    daily = store.daily_frame()
+    partials = store.daily_partials()
+    # Widen before merging so chain-wide sums cannot overflow the int32/float32 columns
+    partials.update({f"daily_{col}": daily[col].to_numpy().astype(np.float64 if col == 'revenue' else np.int64)
+                     for col in ROLLUP_COLUMNS})
+    # Registers and sketches of the days before the raw tier; every store of the chain has the same days
+    partials.update({f"{name}_history_hll": rows for name, rows in store.distinct.history.items()})
+    partials.update({f"{name}_history_sketch": rows for name, rows in store.sketches.history.items()})
+    return partials
+
+
+def _batch_partials(merchant_ids, as_of, history_days, raw_days, root):
+    """Merged partial aggregates of a batch of stores"""
+    merged = None
+    for merchant_id in merchant_ids:
+        store = open_or_build_event_store(merchant_id, as_of, merchant_seed(merchant_id),
+                                          history_days, raw_days, root)
+        partials = _store_partials(store)
+        merged = partials if merged is None else merge_partials(merged, partials)
+    return merged, store.raw_start, store.categories
+
+
+# ---------- Chain Aggregate ----------
+class ChainAggregate:
+    """Summed daily rollups and event partials of every store in the chain.
+
+    Offers the same rollup/kpis/covers_raw/cube/pyramid/cohorts/distinct/sketches surface as a single store, so
+    the KPI grid and charts read it unchanged.
+    """
+
+    def __init__(self, partials, raw_start, end, categories, n_stores):
+        self.n_stores = n_stores
+        self.raw_start = raw_start
+        self.end = end
+        self.watermark = day_to_ts(end + datetime.timedelta(days=1))  # Every store is built through end
+        self.categories = categories
+        daily = {col: partials.pop(f"daily_{col}") for col in ROLLUP_COLUMNS}
+        self.rollup = DailyRollup(pd.DataFrame(daily, index=pd.date_range(end=end, periods=len(daily['orders']),
+                                                                           freq='D')))
+        self.pyramid = RollupPyramid.from_daily(self.rollup.daily)
+        self.cohorts = CohortMatrix(raw_start, partials.pop('cohort_counts'))
+        self.distinct = DailyDistinct(raw_start, {name: partials.pop(f"{name}_hll") for name in ('scanners', 'buyers')},
+                                      history={name: partials.pop(f"{name}_history_hll")
+                                               for name in ('scanners', 'buyers')})
+        self.sketches = HourSketch(raw_start, {name: partials.pop(f"{name}_sketch")
+                                               for name in ('fulfillment', 'session_duration')},
+                                   history={name: partials.pop(f"{name}_history_sketch")
+                                            for name in ('fulfillment', 'session_duration')})
+        self.partials = partials
+        self.cube = HourCube(raw_start, {'orders': partials['hourly_orders'], 'qr_scans': partials['hourly_scans']})
+
+    def covers_raw(self, start_date, end_date):
+        return self.raw_start <= start_date and end_date <= self.end
+
+    def kpis(self, start_date, end_date):
+        """Chain-wide event KPIs for the part of the window covered by raw partials"""
+        lo = max((start_date - self.raw_start).days, 0)
+        hi = max((end_date - self.raw_start).days + 1, lo)
+        metrics = kpis_from_partials(self.partials, lo, hi, self.categories)
+        metrics.update(self.sketches.percentiles(start_date, end_date, 'fulfillment'))
+        metrics.update(self.sketches.percentiles(start_date, end_date, 'session_duration'))
+        metrics.update(self.distinct.metrics(start_date, end_date))
+        metrics.update(self.cohorts.metrics(start_date, end_date))
+        return metrics
+
+
+def build_chain_aggregate(merchant_ids, as_of, history_days, raw_days, root=None,
+                          max_workers=None, batch_size=25):
+    """Fan per-store aggregation out over a process pool and merge the partials.
+
+    Batches keep inter-process traffic to one merged partial per batch, and
+    results are folded in as they complete so memory stays at one partial.
+    """
+    batches = [merchant_ids[i:i + batch_size] for i in range(0, len(merchant_ids), batch_size)]
+    merged = raw_start = categories = None
+    # Spawned workers avoid forking the multi-threaded Streamlit server
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers, mp_context=context) as pool:
+        futures = [pool.submit(_batch_partials, batch, as_of, history_days, raw_days, root)
+                   for batch in batches]
+        for future in concurrent.futures.as_completed(futures):
+            partials, raw_start, categories = future.result()
+            merged = partials if merged is None else merge_partials(merged, partials)
+    return ChainAggregate(merged, raw_start, as_of, categories, len(merchant_ids))
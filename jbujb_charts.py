@@ -0,0 +1,322 @@
+import collections
+import hashlib
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from jbujb_trace import count, span
+
+# ---------- Downsampling ----------
+TREND_POINT_BUDGET = 800  # Points kept per trend chart, about one per horizontal pixel
+WEBGL_THRESHOLD = 1000  # Series longer than this are drawn with WebGL traces
+MARKER_THRESHOLD = 120  # Markers only while individual points are distinguishable
+
+
+def lttb_indices(x, y, n_out):
+    """Positions kept by Largest-Triangle-Three-Buckets downsampling of (x, y).
+
+    The first and last points are always kept; every bucket in between keeps
+    the point forming the largest triangle with the previously kept point and
+    the mean of the next bucket.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Bucket means from prefix sums; the last point stands in for the bucket after the last one
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = edges[1:] - edges[:-1]
+    mean_x = np.append((cx[edges[1:]] - cx[edges[:-1]]) / sizes, x[-1])
+    mean_y = np.append((cy[edges[1:]] - cy[edges[:-1]]) / sizes, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        ax, ay = mean_x[b + 1], mean_y[b + 1]
+        area = np.abs((x[a] - ax) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (ay - y[a]))
+        a = lo + int(area.argmax())
+        selected[b + 1] = a
+    return selected
+
+
+def minmax_indices(y, n_out):
+    """Positions of the minimum and maximum of each of n_out // 2 equal buckets"""
+    n = len(y)
+    buckets = n_out // 2
+    if n_out >= n or buckets < 1:
+        return np.arange(n)
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    rows = padded.reshape(buckets, size)
+    valid = ~np.isnan(rows).all(axis=1)
+    offsets = np.arange(buckets)[valid] * size
+    lows = offsets + np.nanargmin(rows[valid], axis=1)
+    highs = offsets + np.nanargmax(rows[valid], axis=1)
+    return np.unique(np.concatenate(([0, n - 1], lows, highs)))
+
+
+def downsample_frame(frame, columns, n_out=TREND_POINT_BUDGET, method='lttb'):
+    """Rows of a time-indexed frame that preserve the shape of every listed column.
+
+    Each column gets an equal share of the n_out budget, and the kept
+    positions are merged so the series still share one x axis (e.g. for
+    unified hover labels).
+    """
+    if len(frame) <= n_out:
+        return frame
+    per_column = n_out // len(columns)
+    x = frame.index.asi8 if hasattr(frame.index, 'asi8') else np.arange(len(frame))
+    keep = [lttb_indices(x, frame[col].to_numpy(), per_column) if method == 'lttb'
+            else minmax_indices(frame[col].to_numpy(dtype=np.float64), per_column)
+            for col in columns]
+    return frame.iloc[np.unique(np.concatenate(keep))]
+
+
+# ---------- Figure Cache ----------
+def content_key(*parts):
+    """Stable hash of a chart's inputs: frames, arrays and plain options"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            digest.update(repr(list(part.columns) if isinstance(part, pd.DataFrame) else part.name).encode())
+            digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+        elif isinstance(part, np.ndarray):
+            digest.update(f"{part.dtype}{part.shape}".encode())
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class FigureCache:
+    """LRU cache of serialized Plotly figures, capped by total JSON size.
+
+    Safe to share across sessions: entries are immutable JSON strings, and a
+    hit rebuilds the figure without re-running Plotly's property validation.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def get_or_build(self, key, build):
+        """Figure for key, calling build() (which returns a go.Figure) only on a miss"""
+        with self._lock:
+            spec = self._entries.get(key)
+            if spec is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        built = spec is None
+        if built:
+            with span('figure build', 'figure'):
+                spec = build().to_json()
+            with self._lock:
+                self.misses += 1
+                if key not in self._entries and len(spec) <= self.max_bytes:
+                    self._entries[key] = spec
+                    self._bytes += len(spec)
+                    while self._bytes > self.max_bytes:
+                        _, evicted = self._entries.popitem(last=False)
+                        self._bytes -= len(evicted)
+        count('figure_lookups', result='miss' if built else 'hit')
+        count('figure_payload_bytes', len(spec))
+        return go.Figure(json.loads(spec), _validate=False)
+
+
+# ---------- Dashboard Figures ----------
+TREND_AXIS_TITLES = {'minute': "Time", 'hour': "Time", 'day': "Date", 'week': "Week", 'month': "Month"}
+PEAK_HOURS = range(8, 23)  # Opening hours shown on the hourly charts
+AXIS_FONT = dict(color="#000000", size=12)
+
+
+def trend_figure(trend, level, forecast=None):
+    """QR scans and orders (×10) over the trend rows, with optional forecast bands"""
+    # Bound the payload: shape-preserving downsampling, WebGL for long series
+    points = downsample_frame(trend, ['qr_scans', 'orders'])
+    Trace = go.Scattergl if len(trend) > WEBGL_THRESHOLD else go.Scatter
+    mode = 'lines+markers' if len(points) <= MARKER_THRESHOLD else 'lines'
+
+    # Multi-line chart
+    fig_trends = go.Figure()
+
+    fig_trends.add_trace(Trace(
+        x=points.index, y=points['qr_scans'].to_numpy(),
+        mode=mode, name='QR Scans',
+        line=dict(color='#ff6a00', width=3),
+        marker=dict(size=6)
+    ))
+
+    fig_trends.add_trace(Trace(
+        x=points.index, y=points['orders'].to_numpy() * 10,  # Scale for visibility
+        mode=mode, name='Orders (×10)',
+        line=dict(color='#28a745', width=3),
+        marker=dict(size=6),
+        yaxis='y2'
+    ))
+
+    if forecast is not None:
+        # Forecast bands: the lower edge, then the upper edge filled down to it
+        for col, scale, color, fill, yaxis, name in [
+            ('qr_scans', 1, '#ff6a00', 'rgba(255, 106, 0, 0.15)', 'y', 'QR Scans Forecast'),
+            ('orders', 10, '#28a745', 'rgba(40, 167, 69, 0.15)', 'y2', 'Orders Forecast (×10)')
+        ]:
+            fig_trends.add_trace(go.Scatter(
+                x=forecast.index, y=forecast[f"{col}_lower"].to_numpy() * scale,
+                mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip', yaxis=yaxis
+            ))
+            fig_trends.add_trace(go.Scatter(
+                x=forecast.index, y=forecast[f"{col}_upper"].to_numpy() * scale,
+                mode='lines', line=dict(width=0), fill='tonexty', fillcolor=fill,
+                showlegend=False, hoverinfo='skip', yaxis=yaxis
+            ))
+            fig_trends.add_trace(go.Scatter(
+                x=forecast.index, y=forecast[col].to_numpy() * scale,
+                mode='lines', name=name, line=dict(color=color, width=2, dash='dash'), yaxis=yaxis
+            ))
+
+    fig_trends.update_layout(
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        height=400,
+        hovermode='x unified',
+        xaxis_title=TREND_AXIS_TITLES[level],
+        yaxis_title="QR Scans",
+        yaxis2=dict(title="Orders (×10)", side="right", overlaying="y"),
+        legend=dict(x=0, y=1.1, orientation="h"),
+        font=dict(size=14, color="#000000")
+    )
+
+    # Ensure axis text is visible
+    fig_trends.update_xaxes(tickfont=AXIS_FONT)
+    fig_trends.update_yaxes(tickfont=AXIS_FONT)
+    return fig_trends
+
+
+def hours_figure(hourly_orders):
+    """Orders per opening hour from a 24-hour array, the busiest hour highlighted"""
+    orders = np.asarray(hourly_orders)[PEAK_HOURS.start:PEAK_HOURS.stop].tolist()
+    fig_hours = go.Figure(data=[
+        go.Bar(
+            x=[f"{h:02d}:00" for h in PEAK_HOURS],
+            y=orders,
+            marker_color=['#ff6a00' if val == max(orders) else '#ff8533' for val in orders],
+            text=orders,
+            textposition='outside'
+        )
+    ])
+
+    fig_hours.update_layout(
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        height=400,
+        xaxis_title="Hour of Day",
+        yaxis_title="Orders",
+        showlegend=False,
+        font=dict(size=14, color="#000000")
+    )
+
+    fig_hours.update_xaxes(tickfont=AXIS_FONT)
+    fig_hours.update_yaxes(tickfont=AXIS_FONT)
+    return fig_hours
+
+
+def weekday_hour_figure(grid):
+    """Heatmap of a weekday × 24-hour order grid over the opening hours"""
+    fig_heatmap = go.Figure(data=go.Heatmap(
+        z=np.asarray(grid)[:, PEAK_HOURS.start:PEAK_HOURS.stop],
+        x=[f"{h:02d}:00" for h in PEAK_HOURS],
+        y=["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"],
+        colorscale=[[0, '#fff4ec'], [1, '#ff6a00']],
+        hovertemplate="%{y} %{x}<br>Orders: %{z}<extra></extra>"
+    ))
+
+    fig_heatmap.update_layout(
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        height=320,
+        xaxis_title="Hour of Day",
+        yaxis=dict(autorange='reversed'),
+        font=dict(size=14, color="#000000")
+    )
+
+    fig_heatmap.update_xaxes(tickfont=AXIS_FONT)
+    fig_heatmap.update_yaxes(tickfont=AXIS_FONT)
+    return fig_heatmap
+
+
+def category_figure(category_data):
+    """Treemap of revenue by category, colored by orders"""
+    import plotly.express as px  # About 0.2 s of imports, paid when the first menu chart renders
+    fig_category = px.treemap(
+        category_data,
+        path=['Category'],
+        values='Revenue (MAD)',
+        color='Orders',
+        color_continuous_scale='Oranges',
+        title="Revenue Distribution by Category"
+    )
+    fig_category.update_layout(
+        height=400,
+        font=dict(size=14, color="#000000"),
+        title_font=dict(size=16, color="#000000")
+    )
+    return fig_category
+
+
+def segments_figure(segments):
+    """Pie of customers per segment"""
+    import plotly.express as px
+    fig_segments = px.pie(segments, values='Count', names='Segment',
+                          color_discrete_sequence=['#ff6a00', '#ff8533', '#ffb366', '#ffcc99'])
+    fig_segments.update_layout(
+        height=300,
+        font=dict(size=14, color="#000000")
+    )
+    return fig_segments
+
+
+def cohort_figure(cohorts):
+    """Heatmap of weekly retention per acquisition cohort (see CohortMatrix.frame)"""
+    fig_cohorts = go.Figure(data=go.Heatmap(
+        z=cohorts.to_numpy(),
+        x=list(cohorts.columns),
+        y=list(cohorts.index),
+        colorscale=[[0, '#fff4ec'], [1, '#ff6a00']],
+        zmin=0,
+        zmax=min(100, max(float(np.nanmax(cohorts.iloc[:, 1:].to_numpy(), initial=0)), 1)),
+        hovertemplate="Cohort %{y}, %{x}<br>Retained: %{z:.1f}%<extra></extra>"
+    ))
+
+    fig_cohorts.update_layout(
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        height=360,
+        xaxis_title="Weeks Since First Order",
+        yaxis=dict(autorange='reversed'),
+        font=dict(size=14, color="#000000")
+    )
+
+    fig_cohorts.update_xaxes(tickfont=AXIS_FONT)
+    fig_cohorts.update_yaxes(tickfont=AXIS_FONT)
+    return fig_cohorts
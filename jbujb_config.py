@@ -0,0 +1,15 @@
+import os
+
+# ---------- Data Configuration ----------
+# Shared by the dashboard, the HTTP API and the benchmark so they read the same stores
+HISTORY_DAYS = 3650  # Ten years of daily history backing every date filter
+RAW_EVENT_DAYS = 90  # Individual scan/session/order events kept for recent days
+SEED = 42  # Seed of the single-store synthetic history
+
+DATA_DIR = os.environ.get("JBUJB_DATA_DIR", "data")  # Persisted Arrow partitions
+EVENT_FEED_PATH = os.environ.get("JBUJB_EVENT_FEED")  # Optional NDJSON feed tailed for today's events
+STREAM_CAPACITY = int(os.environ.get("JBUJB_STREAM_CAPACITY", "262144"))  # Events held in the ring buffer
+SQL_PATH = os.environ.get("JBUJB_SQL_PATH")  # Optional SQLite/DuckDB file for section queries
+
+CHAIN_STORES = int(os.environ.get("JBUJB_CHAIN_STORES", "100"))  # Locations in the chain view
+CHAIN_RAW_EVENT_DAYS = 35  # Event-level partials per store (covers "Last 30 Days")
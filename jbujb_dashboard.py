@@ -1,13 +1,12 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
 import datetime
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 from datetime import timedelta
-import base64
 import json
+import os
+
+from jbujb_assets import dashboard_style, logo_data_uri
+from jbujb_config import CHAIN_STORES, DATA_DIR, EVENT_FEED_PATH, HISTORY_DAYS, SEED, SQL_PATH, STREAM_CAPACITY
+from jbujb_trace import Tracer, activate, section, serve_metrics, traced, traced_cache
 
 # ---------- Configuration ----------
 st.set_page_config(
@@ -17,257 +16,104 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# ---------- Debug Timings ----------
+METRICS_PORT = int(os.environ.get("JBUJB_METRICS_PORT", "0"))  # Serves Prometheus text at /metrics when set
+
+@st.cache_resource
+def load_process_tracer():
+    """Span totals and counters of every session, behind the /metrics endpoint"""
+    tracer = Tracer(max_spans=0)
+    serve_metrics(tracer, METRICS_PORT)
+    return tracer
+
+def run_tracers():
+    """Tracers this run reports to: the session's (when debug timings are on) and the process-wide one"""
+    session_tracer = None
+    if st.session_state.get('debug_timings'):
+        session_tracer = st.session_state.setdefault('tracer', Tracer())
+    return session_tracer, load_process_tracer() if METRICS_PORT else None
+
+activate(*run_tracers())
+
 # ---------- Enhanced CSS Styling ----------
-st.markdown("""
-    <style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
-    
-    .main-header {
-        background: linear-gradient(135deg, #ff6a00 0%, #ff8533 100%);
-        padding: 2rem;
-        border-radius: 15px;
-        margin-bottom: 2rem;
-        box-shadow: 0 8px 32px rgba(255, 106, 0, 0.3);
-    }
-    
-    .main-header h1 {
-        color: white;
-        font-family: 'Inter', sans-serif;
-        font-weight: 700;
-        margin: 0;
-        font-size: 2.5rem;
-    }
-    
-    .main-header p {
-        color: rgba(255, 255, 255, 0.9);
-        font-size: 1.1rem;
-        margin: 0.5rem 0 0 0;
-    }
-    
-    .kpi-container {
-        display: grid;
-        grid-template-columns: repeat(auto-fit, minmax(280px, 1fr));
-        gap: 20px;
-        margin-bottom: 30px;
-    }
-    
-    .kpi-box {
-        background: linear-gradient(145deg, #ffffff 0%, #f8f9fa 100%);
-        border: 2px solid #e9ecef;
-        border-radius: 16px;
-        padding: 24px;
-        text-align: center;
-        font-family: 'Inter', sans-serif;
-        transition: all 0.3s ease;
-        box-shadow: 0 4px 20px rgba(0, 0, 0, 0.08);
-        position: relative;
-        overflow: hidden;
-    }
-    
-    .kpi-box::before {
-        content: '';
-        position: absolute;
-        top: 0;
-        left: 0;
-        right: 0;
-        height: 4px;
-        background: linear-gradient(90deg, #ff6a00, #ff8533);
-    }
-    
-    .kpi-box:hover {
-        transform: translateY(-4px);
-        box-shadow: 0 8px 30px rgba(255, 106, 0, 0.15);
-        border-color: #ff6a00;
-    }
-    
-    .kpi-label {
-        color: #6c757d;
-        font-weight: 500;
-        font-size: 14px;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-        margin-bottom: 8px;
-    }
-    
-    .kpi-value {
-        color: #212529;
-        font-size: 28px;
-        font-weight: 700;
-        margin-bottom: 4px;
-    }
-    
-    .kpi-change {
-        font-size: 12px;
-        font-weight: 500;
-        padding: 4px 8px;
-        border-radius: 12px;
-        display: inline-block;
-    }
-    
-    .positive-change {
-        background-color: #d4edda;
-        color: #155724;
-    }
-    
-    .negative-change {
-        background-color: #f8d7da;
-        color: #721c24;
-    }
-    
-    .section-header {
-        background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%);
-        padding: 1.5rem;
-        border-radius: 12px;
-        margin: 2rem 0 1rem 0;
-        border-left: 5px solid #ff6a00;
-    }
-    
-    .section-header h3 {
-        color: #495057;
-        margin: 0;
-        font-family: 'Inter', sans-serif;
-        font-weight: 600;
-    }
-    
-    .chart-container {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 12px;
-        box-shadow: 0 2px 15px rgba(0, 0, 0, 0.08);
-        margin-bottom: 1.5rem;
-    }
-    
-    .alert-box {
-        background: linear-gradient(135deg, #fff3cd 0%, #ffeaa7 100%);
-        border: 2px solid #ffeaa7;
-        border-radius: 12px;
-        padding: 20px;
-        margin: 20px 0;
-        border-left: 6px solid #ffc107;
-    }
-    
-    .alert-box h4 {
-        color: #856404;
-        margin: 0 0 10px 0;
-        font-weight: 600;
-    }
-    
-    .metric-positive {
-        color: #28a745 !important;
-    }
-    
-    .metric-negative {
-        color: #dc3545 !important;
-    }
-    
-    .sidebar-metric {
-        background: white;
-        padding: 15px;
-        border-radius: 8px;
-        margin: 10px 0;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.1);
-    }
-    
-    .data-table {
-        background: white;
-        border-radius: 12px;
-        overflow: hidden;
-        box-shadow: 0 2px 15px rgba(0, 0, 0, 0.08);
-    }
-    
-    .stDataFrame {
-        border: none !important;
-    }
-    
-    /* Custom scrollbar */
-    ::-webkit-scrollbar {
-        width: 8px;
-        height: 8px;
-    }
-    
-    ::-webkit-scrollbar-track {
-        background: #f1f3f4;
-        border-radius: 4px;
-    }
-    
-    ::-webkit-scrollbar-thumb {
-        background: #ff6a00;
-        border-radius: 4px;
-    }
-    
-    ::-webkit-scrollbar-thumb:hover {
-        background: #e55a00;
-    }
-    </style>
-""", unsafe_allow_html=True)
+section("css")
+st.markdown(dashboard_style(), unsafe_allow_html=True)
+
+# ---------- Event Store ----------
+@traced_cache('event_store', st.cache_resource(max_entries=1))
+def load_event_store(as_of, seed=SEED):
+    """Load the merchant's columnar event store once per process and day.
+    
+    Memory-maps the persisted partitions when they are up to date, rolls a
+    recent store forward to the new day (compacting the days that leave the
+    raw window), and otherwise builds the store and persists it for the next
+    cold start.
+    """
+    # With a live feed configured, today's events come from the stream instead
+    now = day_to_ts(as_of) if EVENT_FEED_PATH else now_ts()
+    return open_store(as_of, seed=seed, now=now)
+
+@traced_cache('daily_rollup', st.cache_resource(max_entries=1))
+def load_daily_rollup(as_of, seed=SEED):
+    """Build the prefix-sum rollup store from the event store's daily history"""
+    return DailyRollup(load_event_store(as_of, seed).daily_frame())
+
+REFRESH_SECONDS = int(os.environ.get("JBUJB_REFRESH_SECONDS", "300"))  # Live refresh interval
+
+@traced_cache('live_updater', st.cache_resource(max_entries=1))
+def load_live_updater(as_of, seed=SEED):
+    """Feed consumer shared by all sessions that keeps the store and rollup current"""
+    store = load_event_store(as_of, seed)
+    return LiveUpdater(store, load_daily_rollup(as_of, seed), SyntheticFeed(store, seed))
+
+@traced_cache('stream_ingestor', st.cache_resource(max_entries=1))
+def load_stream_ingestor(as_of, seed=SEED):
+    """Tail of the local event feed shared by all sessions; feeds today's ring buffer, the store and the rollup"""
+    from jbujb_stream import NDJSONTail, StreamIngestor
+    return StreamIngestor(NDJSONTail(EVENT_FEED_PATH), load_event_store(as_of, seed), load_daily_rollup(as_of, seed),
+                          STREAM_CAPACITY)
+
+# ---------- Multi-Merchant Chain ----------
+@traced_cache('chain_aggregate', st.cache_resource(max_entries=1, show_spinner="Aggregating chain locations..."))
+def load_chain_aggregate(as_of, n_stores):
+    """Merge every location's partial aggregates once per process and day"""
+    return open_chain(as_of, n_stores)
+
+def load_data_sources(as_of, seed=SEED, chain_stores=0):
+    """Daily rollup and event-KPI source for one store, or for the whole chain"""
+    if chain_stores:
+        chain = load_chain_aggregate(as_of, chain_stores)
+        return chain.rollup, chain
+    return load_daily_rollup(as_of, seed), load_event_store(as_of, seed)
+
+@traced_cache('sql_backend', st.cache_resource(max_entries=1))
+def load_sql_backend(as_of):
+    """Open the pooled SQL backend shared by all sessions, loading it when stale"""
+    return open_sql_backend(SQL_PATH, load_event_store(as_of, SEED))
+
+def load_section_backend(as_of):
+    """Backend answering the menu and customer sections"""
+    return load_sql_backend(as_of) if SQL_PATH else load_event_store(as_of, SEED)
+
+# ---------- Figure Cache ----------
+FIGURE_CACHE_MB = int(os.environ.get("JBUJB_FIGURE_CACHE_MB", "64"))  # Serialized figures kept across sessions
+
+@traced_cache('figure_cache', st.cache_resource)
+def load_figure_cache():
+    """Content-hash keyed figure JSON shared by every session"""
+    return FigureCache(FIGURE_CACHE_MB * 1024 * 1024)
 
 # ---------- Enhanced Data Generation ----------
-@st.cache_data
-def generate_enhanced_data(days, seed=42):
-    """Generate more realistic sample data with trends and patterns"""
-    np.random.seed(seed)
-    base_multiplier = max(1, days / 7)
-    
-    # Generate time series data
-    dates = pd.date_range(start=datetime.date.today() - timedelta(days=days-1), 
-                         end=datetime.date.today(), freq='D')
-    
-    # Create realistic patterns
-    qr_scans_daily = []
-    orders_daily = []
-    revenue_daily = []
-    
-    for i, date in enumerate(dates):
-        # Weekend boost
-        weekend_multiplier = 1.3 if date.weekday() >= 5 else 1.0
-        # Time trend (slight growth)
-        trend_multiplier = 1 + (i * 0.02)
-        
-        daily_scans = int(np.random.normal(150, 30) * weekend_multiplier * trend_multiplier)
-        daily_scans = max(daily_scans, 50)  # Minimum scans
-        
-        # Conversion rate varies
-        conversion_rate = np.random.normal(0.12, 0.03)
-        conversion_rate = max(0.05, min(0.25, conversion_rate))
-        
-        daily_orders = int(daily_scans * conversion_rate)
-        daily_revenue = daily_orders * np.random.normal(28, 8)
-        
-        qr_scans_daily.append(daily_scans)
-        orders_daily.append(daily_orders)
-        revenue_daily.append(max(daily_revenue, 0))
-    
-    # Aggregate data
-    total_qr_scans = sum(qr_scans_daily)
-    total_orders = sum(orders_daily)
-    total_revenue = sum(revenue_daily)
-    
-    # Calculate metrics
-    data = {
-        'total_qr_scans': total_qr_scans,
-        'total_orders': total_orders,
-        'total_revenue': total_revenue,
-        'conversion_rate': (total_orders / total_qr_scans * 100) if total_qr_scans > 0 else 0,
-        'avg_order_value': total_revenue / max(total_orders, 1),
-        'avg_time_scan_to_order': np.random.uniform(4, 8),
-        'canceled_orders': int(total_orders * np.random.uniform(0.05, 0.12)),
-        'repeat_visitors_pct': np.random.uniform(20, 35),
-        'avg_session_duration': np.random.uniform(4, 10),
-        'bounce_rate': np.random.uniform(20, 40),
-        'coupon_redemption_rate': np.random.uniform(12, 25),
-        'customer_retention_rate': np.random.uniform(25, 45),
-        'avg_fulfillment_time': np.random.uniform(8, 15),
-        'peak_hour': np.random.choice(['12:00', '13:00', '19:00', '20:00']),
-        'top_category': 'Burgers',
-        'qr_scans_daily': qr_scans_daily,
-        'orders_daily': orders_daily,
-        'revenue_daily': revenue_daily,
-        'dates': dates
-    }
-    
-    return data
+def generate_enhanced_data(days, seed=SEED, end=None, chain_stores=0):
+    """Dashboard metrics for the `days` days ending at `end`, read from the event store"""
+    today = datetime.date.today()
+    end = end or today
+    start = end - timedelta(days=days-1)
+    rollup, source = load_data_sources(today, seed, chain_stores)
+    return period_data(rollup, source, start, end)
 
 # ---------- Logo at Top Left ----------
+section("logo")
 # Create a container for the logo at the top
 logo_container = st.container()
 with logo_container:
@@ -275,31 +121,9 @@ with logo_container:
     logo_col, spacer_col = st.columns([1, 5])
     
     with logo_col:
-        import os
-        if os.path.exists("jbujb_logo_1.svg"):
-            try:
-                # Try direct SVG display first
-                st.image("jbujb_logo_1.svg", width=150)
-            except:
-                try:
-                    # Fallback: Embed SVG as HTML
-                    with open("jbujb_logo_1.svg", "r") as f:
-                        svg_content = f.read()
-                    
-                    st.markdown(f"""
-                        <div style="width: 150px; height: auto;">
-                            {svg_content}
-                        </div>
-                    """, unsafe_allow_html=True)
-                except:
-                    # Final fallback: Text logo
-                    st.markdown("""
-                        <div style="width: 150px; height: 60px; background: #ff6a00; color: white; 
-                                    display: flex; align-items: center; justify-content: center; 
-                                    font-weight: bold; font-size: 24px; border-radius: 8px;">
-                            JBUJB
-                        </div>
-                    """, unsafe_allow_html=True)
+        logo = logo_data_uri()
+        if logo:
+            st.markdown(f'<img src="{logo}" width="150" alt="JBUJB">', unsafe_allow_html=True)
         else:
             # Show fallback if file not found
             st.markdown("""
@@ -314,6 +138,7 @@ with logo_container:
         st.write("")  # Empty spacer
 
 # ---------- Header ----------
+section("header")
 st.markdown("""
     <div class="main-header">
         <h1> JBUJB Merchant Analytics</h1>
@@ -321,9 +146,30 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
+# ---------- Compute Layer ----------
+# Imported once the header has painted: pandas, numpy and pyarrow dominate a cold start.
+# Modules of optional sections (chain, SQL, live feed, forecast, export) load when those sections run.
+section("imports")
+import pandas as pd
+
+from jbujb_charts import (FigureCache, category_figure, cohort_figure, content_key, hours_figure, segments_figure,
+                          trend_figure, weekday_hour_figure)
+from jbujb_data import ITEM_SORT_COLUMNS, DailyRollup, build_kpi_metrics, compare_periods, event_kpis, period_data
+from jbujb_events import LiveUpdater, SyntheticFeed, day_to_ts, now_ts
+from jbujb_reports import open_chain, open_sql_backend, open_store
+
 # ---------- Enhanced Sidebar ----------
+section("sidebar filters")
 st.sidebar.markdown("### 📊 Dashboard Filters")
 
+# Merchant scope
+merchant_view = st.sidebar.radio(
+    "Merchant View",
+    ["Single Store", "Chain"],
+    format_func=lambda view: view if view == "Single Store" else f"Chain ({CHAIN_STORES:,} locations)",
+    horizontal=True
+)
+
 # Time period selection
 filter_option = st.sidebar.selectbox(
     "Select Time Period",
@@ -351,6 +197,7 @@ else:
     date_range = st.sidebar.date_input(
         "Select custom date range", 
         [today - timedelta(days=7), today],
+        min_value=today - timedelta(days=HISTORY_DAYS-1),
         max_value=today
     )
     if len(date_range) == 2:
@@ -361,11 +208,68 @@ else:
 # Additional filters
 st.sidebar.markdown("### 🎯 Additional Filters")
 show_comparison = st.sidebar.checkbox("Show Period Comparison", value=True)
+comparison_labels = {
+    'previous_period': "Previous Period",
+    'last_week': "Same Period Last Week",
+    'last_year': "Same Period Last Year"
+}
+comparison_baseline = 'previous_period'
+if show_comparison:
+    comparison_baseline = st.sidebar.selectbox(
+        "Compare Against",
+        list(comparison_labels),
+        format_func=comparison_labels.get
+    )
 show_predictions = st.sidebar.checkbox("Show Trend Predictions", value=False)
 
+# ---------- Live Refresh ----------
+chain_stores = CHAIN_STORES if merchant_view == "Chain" else 0
+# Only windows that end today receive new events, so only they refresh
+live_view = end_date == today and not chain_stores
+refresh_every = REFRESH_SECONDS if live_view else None
+streaming_today = live_view and EVENT_FEED_PATH and start_date == today
+
+def refresh_live_data():
+    """Fold events that arrived since the last watermark into the shared store"""
+    if live_view and EVENT_FEED_PATH:
+        load_stream_ingestor(today, SEED).pump()
+    elif live_view:
+        load_live_updater(today, SEED).refresh(now_ts())
+    if live_view and SQL_PATH:
+        load_sql_backend(today).sync(load_event_store(today, SEED))
+
+def load_period_data():
+    """Metrics for the selected window and the selected comparison baseline"""
+    data = generate_enhanced_data(days_in_range, end=end_date, chain_stores=chain_stores)
+    if streaming_today:
+        # Today's event KPIs come from the stream's running sums
+        data.update(load_stream_ingestor(today, SEED).today.metrics())
+    rollup, kpi_source = load_data_sources(today, SEED, chain_stores)
+    comparisons = compare_periods(rollup, start_date, end_date, extra_metrics=event_kpis(kpi_source))
+    # Comparison baselines from the same rollup store (one vectorized pass)
+    comparison_data = comparisons.get(comparison_baseline) if show_comparison else None
+    return data, comparison_data
+
+def fragment_refresh(run_state):
+    """Refresh the live store on a fragment's own rerun; a full run refreshed it once at the top"""
+    if not run_state:
+        refresh_live_data()
+
+def fragment_period(run_state):
+    """This full run's period data, or freshly computed data on a fragment's own rerun"""
+    if run_state:
+        return run_state['period']
+    refresh_live_data()
+    return load_period_data()
+
 # Quick stats in sidebar
+section("sidebar stats")
 days_in_range = (end_date - start_date).days + 1
-data = generate_enhanced_data(days_in_range)
+refresh_live_data()
+data, comparison_data = load_period_data()
+# Fragments get this run's state as an argument; their own timed reruns replay that argument after the
+# run has emptied it (see the end of the script), which is how they know to refresh and recompute
+run_state = {'period': (data, comparison_data)}
 
 st.sidebar.markdown("### 📈 Quick Stats")
 st.sidebar.metric("Period", f"{days_in_range} days")
@@ -373,327 +277,363 @@ st.sidebar.metric("Avg Daily Scans", f"{data['total_qr_scans']/days_in_range:.0f
 st.sidebar.metric("Avg Daily Revenue", f"{data['total_revenue']/days_in_range:.0f} MAD")
 st.sidebar.metric("Total QR Scans", f"{data['total_qr_scans']:,}")
 st.sidebar.metric("Total Revenue", f"{data['total_revenue']:.0f} MAD")
+# Distinct counts come from per-day registers, which may not reach back as far as the daily totals
+distinct_first = load_data_sources(today, SEED, chain_stores)[1].distinct.first
+distinct_help = f"HyperLogLog estimate over {max(start_date, distinct_first)} to {end_date}" \
+    if start_date < distinct_first else None
+st.sidebar.metric("Unique Scanners", f"~{data['unique_scanners']:,}", help=distinct_help)
+st.sidebar.metric("Unique Buyers", f"~{data['unique_buyers']:,}", help=distinct_help)
+repeat_visitors = data['repeat_visitors_pct']
+st.sidebar.metric("Repeat Visitors", f"{repeat_visitors:.1f}%" if repeat_visitors is not None else "n/a",
+                  help="Scanners of the period who also scanned earlier (HyperLogLog estimate)")
 
 # ---------- Enhanced KPI Section ----------
+section("kpis")
 st.markdown('<div class="section-header"><h3>📊 Key Performance Indicators</h3></div>', unsafe_allow_html=True)
 
-# Generate comparison data if enabled
-comparison_data = None
-if show_comparison and days_in_range > 1:
-    comparison_data = generate_enhanced_data(days_in_range, seed=24)
-
-# KPI calculations with comparisons
-kpi_metrics = [
-    {
-        'label': 'Total QR Scans',
-        'value': f"{data['total_qr_scans']:,}",
-        'change': f"+{((data['total_qr_scans'] - comparison_data['total_qr_scans']) / comparison_data['total_qr_scans'] * 100):.1f}%" if comparison_data else None,
-        'positive': data['total_qr_scans'] > (comparison_data['total_qr_scans'] if comparison_data else 0)
-    },
-    {
-        'label': 'Conversion Rate',
-        'value': f"{data['conversion_rate']:.1f}%",
-        'change': f"{data['conversion_rate'] - (comparison_data['conversion_rate'] if comparison_data else 0):+.1f}%" if comparison_data else None,
-        'positive': data['conversion_rate'] > (comparison_data['conversion_rate'] if comparison_data else 0)
-    },
-    {
-        'label': 'Average Order Value',
-        'value': f"{data['avg_order_value']:.0f} MAD",
-        'change': f"{data['avg_order_value'] - (comparison_data['avg_order_value'] if comparison_data else 0):+.0f} MAD" if comparison_data else None,
-        'positive': data['avg_order_value'] > (comparison_data['avg_order_value'] if comparison_data else 0)
-    },
-    {
-        'label': 'Total Revenue',
-        'value': f"{data['total_revenue']:,.0f} MAD",
-        'change': f"+{((data['total_revenue'] - comparison_data['total_revenue']) / comparison_data['total_revenue'] * 100):.1f}%" if comparison_data else None,
-        'positive': data['total_revenue'] > (comparison_data['total_revenue'] if comparison_data else 0)
-    },
-    {
-        'label': 'Total Orders',
-        'value': f"{data['total_orders']:,}",
-        'change': f"{data['total_orders'] - (comparison_data['total_orders'] if comparison_data else 0):+}" if comparison_data else None,
-        'positive': data['total_orders'] > (comparison_data['total_orders'] if comparison_data else 0)
-    },
-    {
-        'label': 'Avg Session Duration',
-        'value': f"{data['avg_session_duration']:.1f} min",
-        'change': f"{data['avg_session_duration'] - (comparison_data['avg_session_duration'] if comparison_data else 0):+.1f} min" if comparison_data else None,
-        'positive': data['avg_session_duration'] > (comparison_data['avg_session_duration'] if comparison_data else 0)
-    },
-    {
-        'label': 'Bounce Rate',
-        'value': f"{data['bounce_rate']:.1f}%",
-        'change': f"{data['bounce_rate'] - (comparison_data['bounce_rate'] if comparison_data else 0):+.1f}%" if comparison_data else None,
-        'positive': data['bounce_rate'] < (comparison_data['bounce_rate'] if comparison_data else 100)
-    },
-    {
-        'label': 'Fulfillment Time',
-        'value': f"{data['avg_fulfillment_time']:.1f} min",
-        'change': f"{data['avg_fulfillment_time'] - (comparison_data['avg_fulfillment_time'] if comparison_data else 0):+.1f} min" if comparison_data else None,
-        'positive': data['avg_fulfillment_time'] < (comparison_data['avg_fulfillment_time'] if comparison_data else 100)
-    }
-]
-
-# Display KPIs using Streamlit columns (more reliable than custom HTML)
-num_cols = 4
-for i in range(0, len(kpi_metrics), num_cols):
-    cols = st.columns(num_cols)
-    for j, col in enumerate(cols):
-        if i + j < len(kpi_metrics):
-            kpi = kpi_metrics[i + j]
-            with col:
-                # Create custom metric display
-                delta = kpi['change'] if kpi['change'] else None
-                delta_color = "normal" if kpi['positive'] else "inverse"
-                
-                st.metric(
-                    label=kpi['label'],
-                    value=kpi['value'],
-                    delta=delta,
-                    delta_color=delta_color
-                )
+kpi_metrics = build_kpi_metrics(data, comparison_data)
+
+@st.fragment(run_every=refresh_every)
+@traced('kpi_grid', resume=run_tracers)
+def kpi_grid(run_state):
+    """KPI grid; reruns on its own when the live window refreshes"""
+    kpi_metrics = build_kpi_metrics(*fragment_period(run_state))
+    
+    # Display KPIs using Streamlit columns (more reliable than custom HTML)
+    num_cols = 4
+    for i in range(0, len(kpi_metrics), num_cols):
+        cols = st.columns(num_cols)
+        for j, col in enumerate(cols):
+            if i + j < len(kpi_metrics):
+                kpi = kpi_metrics[i + j]
+                with col:
+                    # Create custom metric display
+                    delta = kpi['change'] if kpi['change'] else None
+                    delta_color = "normal" if kpi['positive'] else "inverse"
+                    
+                    st.metric(
+                        label=kpi['label'],
+                        value=kpi['value'],
+                        delta=delta,
+                        delta_color=delta_color
+                    )
+
+kpi_grid(run_state)
 
 # ---------- Enhanced Charts Section ----------
+section("charts")
 st.markdown('<div class="section-header"><h3>📊 Performance Analytics</h3></div>', unsafe_allow_html=True)
 
 # Create subplot dashboard
 col_left, col_right = st.columns(2)
 
-with col_left:
-    st.subheader("📈 Daily Performance Trends")
-    
-    # Multi-line chart
-    fig_trends = go.Figure()
-    
-    fig_trends.add_trace(go.Scatter(
-        x=data['dates'], y=data['qr_scans_daily'],
-        mode='lines+markers', name='QR Scans',
-        line=dict(color='#ff6a00', width=3),
-        marker=dict(size=6)
-    ))
-    
-    fig_trends.add_trace(go.Scatter(
-        x=data['dates'], y=[x*10 for x in data['orders_daily']],  # Scale for visibility
-        mode='lines+markers', name='Orders (×10)',
-        line=dict(color='#28a745', width=3),
-        marker=dict(size=6),
-        yaxis='y2'
-    ))
-    
-    fig_trends.update_layout(
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        height=400,
-        hovermode='x unified',
-        xaxis_title="Date",
-        yaxis_title="QR Scans",
-        yaxis2=dict(title="Orders (×10)", side="right", overlaying="y"),
-        legend=dict(x=0, y=1.1, orientation="h"),
-        font=dict(size=14, color="#000000")
-    )
+@traced_cache('forecaster', st.cache_resource(max_entries=2))
+def load_forecaster(seed=SEED, chain_stores=0):
+    """Daily Holt-Winters forecaster, fitted once in the background and advanced as days complete"""
+    from jbujb_forecast import RollupForecaster
+    rollup, _ = load_data_sources(today, seed, chain_stores)
+    return RollupForecaster().start(rollup, today - timedelta(days=1))
+
+def trend_forecast(trend_level):
+    """Forecast rows to overlay on the trend chart, or None (with a caption saying why)"""
+    forecaster = load_forecaster(SEED, chain_stores)
+    rollup, _ = load_data_sources(today, SEED, chain_stores)
+    forecaster.advance(rollup, today - timedelta(days=1))
+    if forecaster.error is not None:
+        st.caption(f"Forecast unavailable: {forecaster.error}")
+    elif not forecaster.ready:
+        st.caption("⏳ Fitting the forecast in the background...")
+    elif trend_level != 'day' or end_date < forecaster.through:
+        st.caption("Forecasts are drawn on daily views that reach the latest full day.")
+    else:
+        return forecaster.frame()
+    return None
+
+@st.fragment(run_every=refresh_every)
+@traced('trend_chart', resume=run_tracers)
+def trend_chart(run_state):
+    """Trend chart at the window's rollup level; reruns on its own when the live window refreshes"""
+    data, _ = fragment_period(run_state)
     
-    # Ensure axis text is visible
-    fig_trends.update_xaxes(tickfont=dict(color="#000000", size=12))
-    fig_trends.update_yaxes(tickfont=dict(color="#000000", size=12))
+    forecast = trend_forecast(data['trend_level']) if show_predictions else None
+    fig_trends = load_figure_cache().get_or_build(
+        content_key('trends', data['trend'], data['trend_level'], forecast),
+        lambda: trend_figure(data['trend'], data['trend_level'], forecast))
     
     st.plotly_chart(fig_trends, use_container_width=True)
 
+with col_left:
+    st.subheader("📈 Performance Trends")
+    trend_chart(run_state)
+
+@st.fragment(run_every=refresh_every)
+@traced('peak_hours_chart', resume=run_tracers)
+def peak_hours_chart(run_state):
+    """Hourly orders of the window, sliced from the day × hour cube"""
+    fragment_refresh(run_state)
+    _, kpi_source = load_data_sources(today, SEED, chain_stores)
+    cube = kpi_source.cube
+    
+    # Today's hours come from the stream's ring buffer of recent events
+    hourly_orders = load_stream_ingestor(today, SEED).hourly() if streaming_today else cube.hourly(start_date, end_date)
+    fig_hours = load_figure_cache().get_or_build(content_key('hours', hourly_orders),
+                                                 lambda: hours_figure(hourly_orders))
+    
+    st.plotly_chart(fig_hours, use_container_width=True)
+    if hourly_orders.any():
+        st.caption(f"Busiest hour: {int(hourly_orders.argmax()):02d}:00")
+    if not cube.covers(start_date, end_date):
+        st.caption(f"Hourly detail is available from {cube.start:%b %d, %Y}.")
+
 with col_right:
     st.subheader("⏰ Peak Usage Hours")
+    peak_hours_chart(run_state)
+
+@st.fragment(run_every=refresh_every)
+@traced('weekday_hour_heatmap', resume=run_tracers)
+def weekday_hour_heatmap(run_state):
+    """Orders per weekday and hour of the window, sliced from the day × hour cube"""
+    fragment_refresh(run_state)
+    _, kpi_source = load_data_sources(today, SEED, chain_stores)
+    grid = kpi_source.cube.weekday_hour(start_date, end_date)
+    fig_heatmap = load_figure_cache().get_or_build(content_key('weekday_hour', grid),
+                                                   lambda: weekday_hour_figure(grid))
     
-    # Enhanced hourly data
-    hours = list(range(8, 23))
-    hourly_base = [10, 15, 25, 45, 80, 120, 95, 85, 70, 90, 110, 85, 60, 40, 25]
-    hourly_orders = [max(5, int(base * np.random.uniform(0.8, 1.2))) 
-                    for base in hourly_base]
-    
-    fig_hours = go.Figure(data=[
-        go.Bar(
-            x=[f"{h:02d}:00" for h in hours],
-            y=hourly_orders,
-            marker_color=['#ff6a00' if val == max(hourly_orders) else '#ff8533' 
-                         for val in hourly_orders],
-            text=hourly_orders,
-            textposition='outside'
-        )
-    ])
-    
-    fig_hours.update_layout(
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        height=400,
-        xaxis_title="Hour of Day",
-        yaxis_title="Orders",
-        showlegend=False,
-        font=dict(size=14, color="#000000")
-    )
-    
-    # Ensure axis text is visible
-    fig_hours.update_xaxes(tickfont=dict(color="#000000", size=12))
-    fig_hours.update_yaxes(tickfont=dict(color="#000000", size=12))
-    
-    st.plotly_chart(fig_hours, use_container_width=True)
+    st.plotly_chart(fig_heatmap, use_container_width=True)
+
+st.subheader("🗓️ Orders by Weekday and Hour")
+weekday_hour_heatmap(run_state)
 
 # ---------- Menu Performance Dashboard ----------
+section("menu")
 st.markdown('<div class="section-header"><h3>🍽️ Menu Performance Analytics</h3></div>', unsafe_allow_html=True)
+section_backend = load_section_backend(today)
+if chain_stores:
+    st.caption("Menu and customer analytics show the flagship store.")
 
 col_menu1, col_menu2 = st.columns(2)
 
 with col_menu1:
     st.write("**🏆 Top Performing Items**")
-    top_items = pd.DataFrame({
-        "Item": ["Big Bite", "Super Filet", "Maxi Grill", "Zinker", "Chicken Wings"],
-        "Views": [485, 420, 385, 350, 320],
-        "Orders": [118, 105, 92, 84, 78],
-        "Revenue (MAD)": [2950, 2625, 2300, 1260, 1950],
-        "Conversion %": [24.3, 25.0, 23.9, 24.0, 24.4]
-    })
+    top_items = section_backend.top_items(start_date, end_date)
     
     st.dataframe(top_items, use_container_width=True)
 
 with col_menu2:
     st.write("**📊 Category Performance**")
-    category_data = pd.DataFrame({
-        "Category": ["Burgers", "Sandwiches", "Fried Items", "Beverages", "Desserts"],
-        "Orders": [285, 180, 95, 140, 85],
-        "Revenue (MAD)": [7125, 2700, 1425, 1120, 2125],
-        "Avg Order Value": [25.0, 15.0, 15.0, 8.0, 25.0]
-    })
+    category_data = section_backend.category_metrics(start_date, end_date)
     
     st.dataframe(category_data, use_container_width=True)
 
+@st.fragment
+@traced('menu_items_table', resume=run_tracers)
+def menu_items_table():
+    """Every menu item, sorted and paginated by the backend; paging reruns only this table"""
+    col_sort, col_order, col_size, col_page = st.columns(4)
+    sort_by = col_sort.selectbox("Sort Items By", ITEM_SORT_COLUMNS)
+    descending = col_order.selectbox("Order", ("Descending", "Ascending")) == "Descending"
+    page_size = col_size.selectbox("Rows per Page", (10, 25, 50, 100))
+    n_items = section_backend.item_count()
+    n_pages = max(-(-n_items // page_size), 1)
+    page = col_page.number_input("Page", min_value=1, max_value=n_pages, value=1) - 1
+    
+    items_page = section_backend.item_page(start_date, end_date, sort_by, descending, page, page_size)
+    st.dataframe(items_page, hide_index=True, use_container_width=True)
+    st.caption(f"Page {page + 1} of {n_pages} · {n_items:,} menu items")
+
+st.write("**📋 All Menu Items**")
+menu_items_table()
+
 # Category performance chart
-fig_category = px.treemap(
-    category_data, 
-    path=['Category'], 
-    values='Revenue (MAD)',
-    color='Orders',
-    color_continuous_scale='Oranges',
-    title="Revenue Distribution by Category"
-)
-fig_category.update_layout(
-    height=400,
-    font=dict(size=14, color="#000000"),
-    title_font=dict(size=16, color="#000000")
-)
+fig_category = load_figure_cache().get_or_build(content_key('category', category_data),
+                                                lambda: category_figure(category_data))
 st.plotly_chart(fig_category, use_container_width=True)
 
 # ---------- Alerts and Recommendations ----------
+section("alerts")
 st.markdown('<div class="section-header"><h3>⚠️ Smart Alerts & Recommendations</h3></div>', unsafe_allow_html=True)
+from jbujb_alerts import AlertEngine, advance_alerts
+
+@traced_cache('alert_engine', st.cache_resource(max_entries=1))
+def load_alert_engine(as_of, seed=SEED):
+    """Rolling alert state of the merchant, shared across sessions and advanced as days close"""
+    store = load_event_store(as_of, seed)
+    return AlertEngine([store.merchant_id], len(store.items))
+
+@st.fragment(run_every=refresh_every)
+@traced('smart_alerts', resume=run_tracers)
+def smart_alerts(run_state):
+    """Active alerts of the rule engine; rerun on their own when the live window refreshes"""
+    fragment_refresh(run_state)
+    engine = load_alert_engine(today, SEED)
+    alerts = advance_alerts(engine, [load_event_store(today, SEED)])
+    if engine.day is not None:
+        st.caption(f"Rules evaluated on the last full day, {engine.day:%b %d, %Y}.")
+    if not alerts:
+        st.success("🟢 **All Clear** - No alert rules are firing.")
+
+    # Display alerts using Streamlit's native components with enhanced styling
+    for alert in alerts:
+        if alert['type'] == 'error':
+            st.error(f"🔴 **{alert['title']}** - {alert['message']}")
+        elif alert['type'] == 'warning':
+            st.warning(f"🟠 **{alert['title']}** - {alert['message']}")
+        elif alert['type'] == 'success':
+            st.success(f"🟢 **{alert['title']}** - {alert['message']}")
+        else:
+            st.info(f"🟡 **{alert['title']}** - {alert['message']}")
 
-# Generate smart alerts based on data
-alerts = []
-
-# Bundle Suggestions Alert
-alerts.append({
-    'type': 'success',
-    'title': 'Bundle Opportunity',
-    'message': "Create 'Family Pack' combining top 3 items - potential 15% revenue increase."
-})
-
-# High-Value Customers Alert
-alerts.append({
-    'type': 'warning',
-    'title': 'VIP Customer Engagement',
-    'message': "5 VIP customers haven't ordered this week. Send personalized offers."
-})
-
-# Order Fulfillment Delays Alert
-if data['avg_fulfillment_time'] > 12:
-    alerts.append({
-        'type': 'error',
-        'title': 'Order Fulfillment Delays',
-        'message': f"Average fulfillment time is {data['avg_fulfillment_time']:.1f} minutes (target: <12 min). Kitchen may be overwhelmed."
-    })
-
-# Declining Daily Orders Alert (simulated comparison)
-import random
-weekly_decline = random.uniform(8, 15)  # Simulate 8-15% decline
-alerts.append({
-    'type': 'warning',
-    'title': 'Declining Daily Orders',
-    'message': f"Orders down {weekly_decline:.0f}% compared to last week. Consider promotional campaigns."
-})
-
-# Menu Item Performance Alert
-alerts.append({
-    'type': 'info',
-    'title': 'Menu Item Performance',
-    'message': "3 items haven't been ordered in 7 days. Consider removing or promoting them."
-})
-
-# Display alerts using Streamlit's native components with enhanced styling
-for alert in alerts:
-    if alert['type'] == 'error':
-        st.error(f"🔴 **{alert['title']}** - {alert['message']}")
-    elif alert['type'] == 'warning':
-        st.warning(f"🟠 **{alert['title']}** - {alert['message']}")
-    elif alert['type'] == 'success':
-        st.success(f"🟢 **{alert['title']}** - {alert['message']}")
-    else:
-        st.info(f"🟡 **{alert['title']}** - {alert['message']}")
+smart_alerts(run_state)
 
 # ---------- Customer Analytics ----------
+section("customers")
 st.markdown('<div class="section-header"><h3>👥 Customer Analytics</h3></div>', unsafe_allow_html=True)
 
 col_cust1, col_cust2, col_cust3 = st.columns(3)
 
 with col_cust1:
     st.write("**💰 Top Customers**")
-    top_customers = pd.DataFrame({
-        "Customer": ["VIP-001", "VIP-002", "VIP-003", "REG-004", "REG-005"],
-        "Spend (MAD)": [1450, 1200, 980, 750, 650],
-        "Orders": [12, 10, 8, 6, 5],
-        "Frequency": ["Weekly", "Weekly", "Bi-weekly", "Monthly", "Monthly"]
-    })
+    top_customers = section_backend.top_customers(start_date, end_date)
     st.dataframe(top_customers, use_container_width=True)
+    st.caption("RFM: recency, frequency and spend scores (1-5) over each customer's full history")
 
 with col_cust2:
     st.write("**📊 Customer Segments**")
-    segments = pd.DataFrame({
-        "Segment": ["VIP", "Regular", "New", "At Risk"],
-        "Count": [15, 45, 25, 8],
-        "Avg Spend": [1200, 400, 150, 200]
-    })
-    
-    fig_segments = px.pie(segments, values='Count', names='Segment', 
-                         color_discrete_sequence=['#ff6a00', '#ff8533', '#ffb366', '#ffcc99'])
-    fig_segments.update_layout(
-        height=300,
-        font=dict(size=14, color="#000000")
-    )
+    segments = section_backend.customer_segments(start_date, end_date)
+    fig_segments = load_figure_cache().get_or_build(content_key('segments', segments),
+                                                    lambda: segments_figure(segments))
     st.plotly_chart(fig_segments, use_container_width=True)
 
 with col_cust3:
     st.write("**🎯 Retention Metrics**")
-    st.metric("Customer Retention", f"{data['customer_retention_rate']:.1f}%")
-    st.metric("Repeat Visitors", f"{data['repeat_visitors_pct']:.1f}%")
-    st.metric("Avg Customer Lifetime", "4.2 months")
-    st.metric("Churn Rate", f"{100-data['customer_retention_rate']:.1f}%")
+    retention = data['customer_retention_rate']
+    repeat = data['repeat_customer_pct']
+    repeat_visitors = data['repeat_visitors_pct']
+    churn = data['churn_rate']
+    lifetime = data['avg_customer_lifetime_weeks']
+    st.metric("Customer Retention", f"{retention:.1f}%" if retention is not None else "n/a")
+    st.metric("Repeat Customers", f"{repeat:.1f}%" if repeat is not None else "n/a")
+    st.metric("Repeat Visitors", f"{repeat_visitors:.1f}%" if repeat_visitors is not None else "n/a")
+    st.metric("Avg Customer Lifetime", f"{lifetime:.1f} weeks" if lifetime is not None else "n/a")
+    st.metric("Churn Rate", f"{churn:.1f}%" if churn is not None else "n/a")
+    st.caption("Week-1 retention of customers acquired in the period, from the weekly cohort matrix")
+
+@st.fragment(run_every=refresh_every)
+@traced('cohort_heatmap', resume=run_tracers)
+def cohort_heatmap(run_state):
+    """Weekly retention of the latest acquisition cohorts, read from the cohort matrix"""
+    fragment_refresh(run_state)
+    _, kpi_source = load_data_sources(today, SEED, chain_stores)
+    cohorts = kpi_source.cohorts.frame(end_date)
+    if cohorts.empty:
+        st.info("No cohorts before the end of the selected period.")
+        return
+    
+    fig_cohorts = load_figure_cache().get_or_build(content_key('cohorts', cohorts), lambda: cohort_figure(cohorts))
+    st.plotly_chart(fig_cohorts, use_container_width=True)
+
+st.subheader("📅 Weekly Cohort Retention")
+cohort_heatmap(run_state)
 
 # ---------- Export and Footer ----------
+section("export")
 st.markdown("---")
 
 col_export, col_info = st.columns([3, 1])
 
-with col_export:
+from jbujb_export import EXPORT_COMPRESSIONS, EXPORT_DATASETS, EXPORT_FORMATS, ExportJob
+
+EXPORT_DIR = os.environ.get("JBUJB_EXPORT_DIR", os.path.join(DATA_DIR, "exports"))  # Finished export files
+EXPORT_JOBS_KEPT = 20  # Finished jobs (and files) kept before the oldest are removed
+
+@traced_cache('export_jobs', st.cache_resource)
+def load_export_jobs():
+    """Export jobs by id, shared across reruns and sessions"""
+    return {}
+
+def start_export_job(dataset, fmt, compression):
+    """Start a background export of the selected window and prune old finished jobs"""
+    jobs = load_export_jobs()
+    finished = [job_id for job_id, job in jobs.items() if job.done]
+    for job_id in finished[:max(len(finished) - EXPORT_JOBS_KEPT + 1, 0)]:
+        job = jobs.pop(job_id)
+        if os.path.exists(job.path):
+            os.remove(job.path)
+    # Only the daily rollup is merged across the chain; the other datasets are the flagship store's
+    scope = None
+    if chain_stores:
+        scope = 'chain' if dataset == 'daily' else 'flagship'
+    rollup, _ = load_data_sources(today, SEED, chain_stores)
+    job = ExportJob(load_event_store(today, SEED), rollup, dataset, start_date, end_date, fmt, compression,
+                    EXPORT_DIR, scope).start()
+    jobs[job.id] = job
+    return job
+
+def read_export(path):
+    """Bytes of a finished export file (the file is closed before Streamlit serves them)"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+def export_status(job_id):
+    """Progress of an export job, then its download button"""
+    job = load_export_jobs().get(job_id)
+    if job is None:
+        return
+    if not job.done:
+        st.caption(f"Exporting {job.file_name}... {job.bytes_written / 1e6:.1f} MB written")
+    elif job.error is not None:
+        st.error(f"Export failed: {job.error}")
+    else:
+        st.download_button(
+            label=f"Download {job.file_name} ({job.bytes_written / 1e6:.1f} MB)",
+            data=lambda: read_export(job.path),
+            file_name=job.file_name,
+            on_click="ignore"
+        )
+
+@st.fragment
+@traced('export_panel', resume=run_tracers)
+def export_panel():
+    """Export controls; using them reruns only this fragment, never the whole dashboard"""
+    col_dataset, col_format, col_compression = st.columns(3)
+    dataset = col_dataset.selectbox("Dataset", EXPORT_DATASETS,
+                                    format_func=lambda name: name.capitalize())
+    fmt = col_format.selectbox("Format", EXPORT_FORMATS, format_func=str.upper)
+    compression = col_compression.selectbox("Compression", EXPORT_COMPRESSIONS,
+                                            format_func=lambda name: name or "None")
+    
+    if chain_stores:
+        st.caption("Chain view: the daily dataset covers every location; hourly and event-level datasets are "
+                   "the flagship store's and are named accordingly.")
+    
     if st.button("📊 Export Dashboard Data", type="primary"):
-        # Create export data
-        export_data = {
+        st.session_state['export_job'] = start_export_job(dataset, fmt, compression).id
+    
+    job = load_export_jobs().get(st.session_state.get('export_job'))
+    if job is not None:
+        # Poll the running job from a nested fragment instead of rerunning the page
+        st.fragment(export_status, run_every=None if job.done else 1)(job.id)
+    
+    st.download_button(
+        label="Download KPI Report (JSON)",
+        data=lambda: json.dumps({
             'period': f"{start_date} to {end_date}",
             'kpis': kpi_metrics,
-            'menu_performance': top_items.to_dict(),
             'generated_at': datetime.datetime.now().isoformat()
-        }
-        st.download_button(
-            label="Download JSON Report",
-            data=json.dumps(export_data, indent=2),
-            file_name=f"jbujb_report_{start_date}_{end_date}.json",
-            mime="application/json"
-        )
+        }, indent=2),
+        file_name=f"jbujb_report_{start_date}_{end_date}.json",
+        mime="application/json",
+        on_click="ignore"
+    )
+
+with col_export:
+    export_panel()
 
 with col_info:
-    st.info("💡 Dashboard auto-refreshes every 5 minutes")
+    if live_view:
+        st.info(f"💡 Dashboard auto-refreshes every {REFRESH_SECONDS // 60} minutes")
+    else:
+        st.info("💡 Auto-refresh applies to ranges ending today")
 
 st.markdown("""
 <div style="text-align: center; padding: 2rem; background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%); border-radius: 12px; margin-top: 2rem;">
@@ -701,3 +641,38 @@ st.markdown("""
     <p style="color: #6c757d; margin: 0.5rem 0 0 0;">Version 4.0 - Powered by Advanced Analytics & Real-time Insights</p>
 </div>
 """, unsafe_allow_html=True)
+
+# ---------- Debug Panel ----------
+section(None)
+
+def debug_panel(tracer):
+    """Section, fragment and cache timings of this run, with Chrome trace and Prometheus downloads"""
+    spans = pd.DataFrame(tracer.run_spans(), columns=['Name', 'Kind', 'Seconds', 'Args'])
+    spans['ms'] = spans.pop('Seconds') * 1000
+    spans['Result'] = [args.get('result', '') if args else '' for args in spans.pop('Args')]
+    sections = spans[spans['Kind'] == 'section']
+    st.write("**Sections**")
+    st.dataframe(sections[['Name', 'ms']].round(1), hide_index=True, use_container_width=True)
+    st.caption(f"Run total: {sections['ms'].sum():.0f} ms")
+    st.write("**Fragments, Figures & Cache Lookups**")
+    st.dataframe(spans[spans['Kind'] != 'section'].groupby(['Kind', 'Name', 'Result'], as_index=False)
+                 .agg(Calls=('ms', 'size'), ms=('ms', 'sum')).round(1),
+                 hide_index=True, use_container_width=True)
+    st.write("**Counters**")
+    st.dataframe(pd.DataFrame([(name, ', '.join(f"{k}={v}" for k, v in labels), value)
+                               for (name, labels), value in sorted(tracer.run_counters.items())],
+                              columns=['Counter', 'Labels', 'Value']),
+                 hide_index=True, use_container_width=True)
+    st.download_button("Download Chrome Trace (JSON)", data=lambda: json.dumps(tracer.chrome_trace()),
+                       file_name="jbujb_trace.json", mime="application/json", on_click="ignore")
+    st.download_button("Download Metrics (Prometheus)", data=tracer.prometheus_text,
+                       file_name="jbujb_metrics.txt", mime="text/plain", on_click="ignore")
+
+run_state.clear()  # Later reruns of single fragments compute their own data
+
+st.sidebar.markdown("### 🐞 Debug")
+st.sidebar.checkbox("Debug Timings", key='debug_timings',
+                    help="Time every section, fragment and cache lookup of your session (off by default)")
+if st.session_state.get('tracer') is not None and st.session_state.get('debug_timings'):
+    with st.sidebar.expander("Run Timings", expanded=True):
+        debug_panel(st.session_state['tracer'])
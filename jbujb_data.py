@@ -0,0 +1,358 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# ---------- Daily Rollup Store ----------
+ROLLUP_COLUMNS = ('qr_scans', 'orders', 'revenue')
+
+
+class DailyRollup:
+    """Daily scans/orders/revenue with prefix-sum indexes for O(1) range totals"""
+
+    def __init__(self, daily):
+        self.daily = daily
+        self.start = daily.index[0].date()
+        self.end = daily.index[-1].date()
+        # cum[k] holds the total of the first k days, so any window is cum[hi] - cum[lo]
+        self._cum = {}
+        for col in ROLLUP_COLUMNS:
+            values = daily[col].to_numpy()
+            acc_dtype = np.int64 if np.issubdtype(values.dtype, np.integer) else np.float64
+            cum = np.zeros(len(values) + 1, dtype=acc_dtype)
+            np.cumsum(values, dtype=acc_dtype, out=cum[1:])
+            self._cum[col] = cum
+
+    def __len__(self):
+        return len(self.daily)
+
+    def bounds(self, start_date, end_date):
+        """Map an inclusive date window to half-open row positions, clipped to the store"""
+        lo = (start_date - self.start).days
+        hi = (end_date - self.start).days + 1
+        lo = min(max(lo, 0), len(self))
+        hi = min(max(hi, lo), len(self))
+        return lo, hi
+
+    def totals(self, start_date, end_date):
+        """Sum every rollup column over the window with two index lookups each"""
+        lo, hi = self.bounds(start_date, end_date)
+        return {col: (cum[hi] - cum[lo]).item() for col, cum in self._cum.items()}
+
+    def window(self, start_date, end_date):
+        """Daily rows inside the window (a positional slice, no aggregation)"""
+        lo, hi = self.bounds(start_date, end_date)
+        return self.daily.iloc[lo:hi]
+
+    def period_metrics(self, start_date, end_date):
+        """Range totals plus the ratios derived from them"""
+        return period_metrics(self.totals(start_date, end_date))
+
+    def add(self, dates, totals):
+        """Fold new per-day totals in, patching only the prefix sums after the earliest day"""
+        for k, date in enumerate(dates):
+            pos = (date - self.start).days
+            if not 0 <= pos < len(self):
+                continue
+            for col, cum in self._cum.items():
+                delta = totals[col][k]
+                j = self.daily.columns.get_loc(col)
+                self.daily.iat[pos, j] = self.daily.dtypes.iloc[j].type(self.daily.iat[pos, j] + delta)
+                cum[pos + 1:] += delta
+
+    def totals_many(self, windows):
+        """Totals for many (start_date, end_date) windows in one vectorized gather"""
+        lo, hi = np.array([self.bounds(start, end) for start, end in windows], dtype=np.int64).reshape(-1, 2).T
+        sums = {col: cum[hi] - cum[lo] for col, cum in self._cum.items()}
+        return [{col: sums[col][k].item() for col in ROLLUP_COLUMNS} for k in range(len(lo))]
+
+    def covers(self, start_date, end_date):
+        """True when the whole window lies inside the stored history"""
+        return self.start <= start_date and end_date <= self.end
+
+
+# ---------- Period Comparison ----------
+# Baseline name -> days to shift the window back (None = by its own length)
+COMPARISON_BASELINES = {
+    'previous_period': None,
+    'last_week': 7,
+    'last_year': 364,  # 52 weeks keeps weekdays aligned
+}
+
+
+def period_metrics(totals):
+    """Range totals plus the ratios derived from them"""
+    total_qr_scans = totals['qr_scans']
+    total_orders = totals['orders']
+    total_revenue = totals['revenue']
+    return {
+        'total_qr_scans': total_qr_scans,
+        'total_orders': total_orders,
+        'total_revenue': total_revenue,
+        'conversion_rate': (total_orders / total_qr_scans * 100) if total_qr_scans > 0 else 0,
+        'avg_order_value': total_revenue / max(total_orders, 1),
+    }
+
+
+def compare_periods(rollup, start_date, end_date, baselines=COMPARISON_BASELINES, extra_metrics=None):
+    """Metrics for the window and every baseline window, gathered in one pass.
+
+    Returns a dict with a 'current' entry and one entry per baseline name;
+    baselines that fall outside the stored history map to None. When given,
+    ``extra_metrics(start_date, end_date)`` is merged into every window.
+    """
+    span = (end_date - start_date).days + 1
+    windows = {'current': (start_date, end_date)}
+    for name, shift in baselines.items():
+        offset = datetime.timedelta(days=span if shift is None else shift)
+        windows[name] = (start_date - offset, end_date - offset)
+
+    names = ['current'] + [name for name in baselines if rollup.covers(*windows[name])]
+    totals = rollup.totals_many([windows[name] for name in names])
+    result = dict.fromkeys(windows)
+    result.update({name: period_metrics(t) for name, t in zip(names, totals)})
+    if extra_metrics is not None:
+        for name in names:
+            result[name].update(extra_metrics(*windows[name]))
+    return result
+
+
+def period_data(rollup, source, start_date, end_date):
+    """Dashboard metrics of a window: event KPIs, rollup totals and the trend rows"""
+    data = {
+        **source.kpis(start_date, end_date),
+        **rollup.period_metrics(start_date, end_date)
+    }
+    # Trend rows from the coarsest rollup level that still gives enough points
+    data['trend_level'], data['trend'] = source.pyramid.trend(start_date, end_date)
+    return data
+
+
+def event_kpis(source):
+    """Event-level KPIs for windows fully covered by raw events"""
+    return lambda start, end: source.kpis(start, end) if source.covers_raw(start, end) else {}
+
+
+# ---------- KPI Grid ----------
+# (label, key, value format, change format, relative change, higher is better)
+KPI_DEFINITIONS = (
+    ('Total QR Scans', 'total_qr_scans', "{:,}", "{:+.1f}%", True, True),
+    ('Conversion Rate', 'conversion_rate', "{:.1f}%", "{:+.1f}%", False, True),
+    ('Average Order Value', 'avg_order_value', "{:.0f} MAD", "{:+.0f} MAD", False, True),
+    ('Total Revenue', 'total_revenue', "{:,.0f} MAD", "{:+.1f}%", True, True),
+    ('Total Orders', 'total_orders', "{:,}", "{:+,}", False, True),
+    ('Session Duration (p50)', 'session_duration_p50', "{:.1f} min", "{:+.1f} min", False, True),
+    ('Bounce Rate', 'bounce_rate', "{:.1f}%", "{:+.1f}%", False, False),
+    ('Fulfillment Time (p50)', 'fulfillment_p50', "{:.1f} min", "{:+.1f} min", False, False),
+    ('Session Duration (p95)', 'session_duration_p95', "{:.1f} min", "{:+.1f} min", False, True),
+    ('Session Duration (p99)', 'session_duration_p99', "{:.1f} min", "{:+.1f} min", False, True),
+    ('Fulfillment Time (p95)', 'fulfillment_p95', "{:.1f} min", "{:+.1f} min", False, False),
+    ('Fulfillment Time (p99)', 'fulfillment_p99', "{:.1f} min", "{:+.1f} min", False, False)
+)
+
+
+def build_kpi_metrics(data, comparison_data):
+    """KPI values and their change against the comparison baseline"""
+    def kpi_change(key, fmt, relative=False, higher_is_better=True):
+        """Format the change of one KPI against the selected baseline"""
+        if not comparison_data or data[key] is None or comparison_data.get(key) is None:
+            return None, True
+        current, previous = data[key], comparison_data[key]
+        if relative and not previous:
+            return None, True  # No percentage change against a zero baseline
+        diff = (current - previous) / previous * 100 if relative else current - previous
+        positive = current > previous if higher_is_better else current < previous
+        return fmt.format(diff), positive
+
+    kpi_metrics = []
+    for label, key, value_fmt, change_fmt, relative, higher_is_better in KPI_DEFINITIONS:
+        change, positive = kpi_change(key, change_fmt, relative, higher_is_better)
+        kpi_metrics.append({
+            'label': label,
+            'value': value_fmt.format(data[key]) if data[key] is not None else "n/a",
+            'change': change,
+            'positive': positive
+        })
+    return kpi_metrics
+
+
+# ---------- Menu Items ----------
+ITEM_COLUMNS = ("Item", "Category", "Views", "Orders", "Conversion %", "Revenue (MAD)", "Avg Price")
+ITEM_SORT_COLUMNS = ("Orders", "Revenue (MAD)", "Views", "Conversion %", "Avg Price")
+
+
+def item_metrics(views, orders, revenue):
+    """Unrounded numeric item columns from per-item views, orders and revenue"""
+    return {
+        "Views": views,
+        "Orders": orders,
+        "Conversion %": np.divide(orders * 100.0, views, out=np.zeros(len(views)), where=views > 0),
+        "Revenue (MAD)": revenue,
+        "Avg Price": np.divide(revenue, orders, out=np.zeros(len(orders)), where=orders > 0)
+    }
+
+
+def item_frame(names, categories, views, orders, revenue):
+    """Display rows of the menu item table"""
+    metrics = item_metrics(views, orders, revenue)
+    return pd.DataFrame({
+        "Item": names,
+        "Category": categories,
+        "Views": views,
+        "Orders": orders,
+        "Conversion %": metrics["Conversion %"].round(1),
+        "Revenue (MAD)": revenue.round(0),
+        "Avg Price": metrics["Avg Price"].round(1)
+    }, columns=ITEM_COLUMNS)
+
+
+def top_positions(values, k):
+    """Positions of the k largest values, largest first and ties by position.
+
+    Uses argpartition to find the k-th largest value, so only the selected
+    positions are sorted, never the whole array.
+    """
+    n = len(values)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        kth = values[np.argpartition(values, n - k)[n - k]]
+        above = np.flatnonzero(values > kth)
+        tied = np.flatnonzero(values == kth)[:k - len(above)]
+        positions = np.concatenate((above, tied))
+    else:
+        positions = np.arange(n)
+    return positions[np.lexsort((positions, -values[positions]))]
+
+
+# ---------- Customer Segments ----------
+SEGMENTS = ('VIP', 'Regular', 'New', 'At Risk')
+RFM_BINS = 5  # Recency, frequency and monetary scores run from 1 to RFM_BINS
+VIP_MIN_SCORE = 4  # A VIP scores at least this on recency, frequency and monetary value
+AT_RISK_MAX_RECENCY = 2  # Returning customers scoring this or less on recency are at risk
+
+
+def quantile_scores(values, bins=RFM_BINS):
+    """Score values 1..bins by the share of values strictly below them (equal values share a score)"""
+    if not len(values):
+        return np.empty(0, dtype=np.int8)
+    below = np.searchsorted(np.sort(values), values, 'left')
+    return (1 + below * bins // len(values)).astype(np.int8)
+
+
+def rfm_segments(is_new, recency, frequency, monetary):
+    """Segment codes (positions in SEGMENTS) from RFM scores; first-time buyers are New"""
+    vip = (recency >= VIP_MIN_SCORE) & (frequency >= VIP_MIN_SCORE) & (monetary >= VIP_MIN_SCORE)
+    return np.select(
+        [is_new, vip, recency <= AT_RISK_MAX_RECENCY],
+        [SEGMENTS.index('New'), SEGMENTS.index('VIP'), SEGMENTS.index('At Risk')],
+        SEGMENTS.index('Regular')
+    )
+
+
+def frequency_label(orders, days):
+    """Describe how often a customer ordered during a window of `days` days"""
+    per_week = orders / max(days / 7, 1)
+    if per_week >= 1:
+        return "Weekly"
+    if per_week >= 0.5:
+        return "Bi-weekly"
+    return "Monthly"
+
+
+# ---------- Quantile Sketches ----------
+# Log-bucketed histograms (DDSketch-style): every quantile is within
+# SKETCH_ACCURACY of the true value, and sketches merge by adding counts.
+SKETCH_ACCURACY = 0.01
+SKETCH_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+SKETCH_MAX_VALUE = 65535  # Durations are uint16 seconds
+SKETCH_BINS = int(np.ceil(np.log(SKETCH_MAX_VALUE) / np.log(SKETCH_GAMMA))) + 2  # Bin 0 holds zeros
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def sketch_bins(values):
+    """Sketch bin of each non-negative value; bin i >= 1 covers (gamma^(i-2), gamma^(i-1)]"""
+    values = np.minimum(np.asarray(values, dtype=np.float64), SKETCH_MAX_VALUE)
+    bins = np.ceil(np.log(np.maximum(values, 1.0)) / np.log(SKETCH_GAMMA)).astype(np.int64) + 1
+    return np.where(values > 0, bins, 0)
+
+
+def sketch_counts(values):
+    """A sketch (counts per bin) of a batch of values"""
+    return np.bincount(sketch_bins(values), minlength=SKETCH_BINS)
+
+
+def sketch_quantiles(counts, quantiles=QUANTILES):
+    """Approximate quantiles of a sketch, or None for each quantile of an empty sketch"""
+    counts = np.asarray(counts).reshape(-1, SKETCH_BINS).sum(axis=0)
+    n = int(counts.sum())
+    if not n:
+        return [None] * len(quantiles)
+    ranks = np.asarray(quantiles) * (n - 1)
+    bins = np.searchsorted(np.cumsum(counts), ranks, 'right')
+    # Bin midpoint in relative terms, so the estimate is within SKETCH_ACCURACY of any value in the bin
+    values = 2 * SKETCH_GAMMA ** (bins - 1.0) / (SKETCH_GAMMA + 1)
+    return [float(v) if b else 0.0 for b, v in zip(bins, values)]
+
+
+def percentile_metrics(prefix, counts, quantiles=QUANTILES):
+    """KPI entries such as '<prefix>_p95', in minutes, from a sketch of seconds"""
+    return {f"{prefix}_p{round(q * 100)}": value / 60 if value is not None else None
+            for q, value in zip(quantiles, sketch_quantiles(counts, quantiles))}
+
+
+# ---------- Distinct Counts ----------
+# HyperLogLog registers: 2^12 one-byte registers (4 KB) give about 1.6% standard
+# error; unions of days or stores are the element-wise maximum of their registers.
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+_HLL_ALPHA = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+
+
+def hll_hash(keys, seed=0):
+    """64-bit splitmix64 hashes of integer keys; the seed keeps different key spaces apart"""
+    with np.errstate(over='ignore'):
+        h = np.asarray(keys).astype(np.uint64) + np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15)
+        h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return h ^ (h >> np.uint64(31))
+
+
+def hll_positions(keys, seed=0):
+    """(register, rank) of each key: the top bits pick the register, the rest give the rank"""
+    h = hll_hash(keys, seed)
+    register = (h >> np.uint64(64 - HLL_PRECISION)).astype(np.int64)
+    rest = (h & np.uint64((1 << (64 - HLL_PRECISION)) - 1)).astype(np.float64)  # Exact below 2^53
+    rank = 64 - HLL_PRECISION + 1 - np.frexp(rest)[1]
+    return register, rank.astype(np.uint8)
+
+
+def hll_estimate(registers):
+    """Approximate number of distinct keys behind a set of registers"""
+    registers = np.asarray(registers)
+    zeros = int(np.count_nonzero(registers == 0))
+    estimate = _HLL_ALPHA * HLL_REGISTERS ** 2 / float(np.ldexp(1.0, -registers.astype(np.int64)).sum())
+    if estimate <= 2.5 * HLL_REGISTERS and zeros:
+        # Small-range correction: linear counting over the empty registers
+        estimate = HLL_REGISTERS * np.log(HLL_REGISTERS / zeros)
+    return float(estimate)
+
+
+def distinct_metrics(scanners, prior_scanners, buyers):
+    """Unique scanners/buyers and the share of scanners seen before, from unioned registers.
+
+    Returning scanners come from inclusion-exclusion over the window and the
+    days before it; the share is None when nothing precedes the window.
+    """
+    unique_scanners = hll_estimate(scanners)
+    prior = hll_estimate(prior_scanners)
+    metrics = {
+        'unique_scanners': round(unique_scanners),
+        'unique_buyers': round(hll_estimate(buyers)),
+        'repeat_visitors_pct': None
+    }
+    if unique_scanners and prior:
+        returning = unique_scanners + prior - hll_estimate(np.maximum(scanners, prior_scanners))
+        metrics['repeat_visitors_pct'] = min(max(returning / unique_scanners, 0.0), 1.0) * 100
+    return metrics
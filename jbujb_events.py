@@ -0,0 +1,1431 @@
+import collections
+import datetime
+import threading
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from jbujb_data import (HLL_REGISTERS, SEGMENTS, SKETCH_BINS, VIP_MIN_SCORE, distinct_metrics, frequency_label,
+                        hll_positions, item_frame, item_metrics, percentile_metrics, quantile_scores, rfm_segments,
+                        sketch_bins, sketch_counts, top_positions)
+from jbujb_trace import count
+
+# ---------- Time Helpers ----------
+# Timestamps are int64 seconds since the epoch in merchant local time
+EPOCH = datetime.date(1970, 1, 1)
+DAY_SECONDS = 86400
+WEEK_SECONDS = 7 * DAY_SECONDS
+
+
+def day_to_ts(date):
+    """Epoch seconds at local midnight of a date"""
+    return (date - EPOCH).days * DAY_SECONDS
+
+
+def ts_to_day(ts):
+    """Date of an epoch-seconds timestamp"""
+    return EPOCH + datetime.timedelta(days=int(ts) // DAY_SECONDS)
+
+
+def week_start(date):
+    """Monday of the week containing date"""
+    return date - datetime.timedelta(days=date.weekday())
+
+
+def now_ts():
+    """Current local wall-clock time as epoch seconds"""
+    now = datetime.datetime.now()
+    return day_to_ts(now.date()) + now.hour * 3600 + now.minute * 60 + now.second
+
+
+# ---------- Columnar Event Tables ----------
+class EventTable:
+    """Time-sorted columnar table of one event type (one numpy array per column).
+
+    Rows live in consecutive parts (column dicts) that are never written to,
+    such as the monthly partitions of a reopened store, which stay read-only
+    memory maps. Appends go to a writable tail part whose backing arrays grow
+    by doubling, so appending a batch costs O(batch) amortized and never
+    copies an earlier part.
+    """
+
+    def __init__(self, **columns):
+        lengths = {len(values) for values in columns.values()}
+        if 'ts' not in columns or len(lengths) != 1:
+            raise ValueError("EventTable needs a 'ts' column and equal-length columns")
+        self._parts = [columns]
+        self._tail = None  # Backing arrays of the last part once it is the writable tail
+
+    @classmethod
+    def from_parts(cls, parts):
+        """Table over consecutive, time-sorted parts with the same columns (at least one part)"""
+        table = cls(**parts[0])
+        table._parts += [part for part in parts[1:] if len(part['ts'])]
+        return table
+
+    def __len__(self):
+        return sum(len(part['ts']) for part in self._parts)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def columns(self):
+        """Whole columns; rows of several parts are copied into one array each"""
+        return self.rows(0, len(self))
+
+    @property
+    def dtypes(self):
+        return {name: values.dtype for name, values in self._parts[0].items()}
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for part in self._parts for values in part.values())
+
+    def parts(self):
+        """Column dicts of the parts, oldest first, for passes that need no single array"""
+        return list(self._parts)
+
+    def span(self, start_ts, end_ts):
+        """Row positions [lo, hi) of events with start_ts <= ts < end_ts"""
+        lo = hi = 0
+        for part in self._parts:
+            lo += np.searchsorted(part['ts'], start_ts, 'left')
+            hi += np.searchsorted(part['ts'], end_ts, 'left')
+        return lo, hi
+
+    def rows(self, lo, hi):
+        """Columns of rows [lo, hi): zero-copy slices within one part, copied together across parts"""
+        pieces, offset = [], 0
+        for part in self._parts:
+            n = len(part['ts'])
+            if max(lo - offset, 0) < min(hi - offset, n):
+                pieces.append({name: values[max(lo - offset, 0):min(hi - offset, n)] for name, values in part.items()})
+            offset += n
+        if len(pieces) <= 1:
+            return pieces[0] if pieces else {name: values[:0] for name, values in self._parts[0].items()}
+        return {name: np.concatenate([piece[name] for piece in pieces]) for name in pieces[0]}
+
+    def view(self, start_ts, end_ts):
+        """Column slices for a time window (zero-copy unless the window spans parts)"""
+        return self.rows(*self.span(start_ts, end_ts))
+
+    def extend(self, **columns):
+        """Append a batch of events that are not older than the current last event"""
+        added = len(columns['ts'])
+        if not added:
+            return
+        if self._tail is None:
+            # Earlier parts may be read-only memory maps: start a writable tail instead of copying them
+            self._parts.append({name: np.empty(0, dtype=dtype) for name, dtype in self.dtypes.items()})
+        tail = self._parts[-1]
+        n = len(tail['ts'])
+        if self._tail is None or n + added > len(self._tail['ts']):
+            capacity = max(2 * (n + added), 1024)
+            buffers = {}
+            for name, values in tail.items():
+                buffers[name] = np.empty(capacity, dtype=values.dtype)
+                buffers[name][:n] = values
+            self._tail = buffers
+        for name, buffer in self._tail.items():
+            buffer[n:n + added] = columns[name]
+        # Rows below n never change, so views handed out earlier stay valid
+        self._parts[-1] = {name: buffer[:n + added] for name, buffer in self._tail.items()}
+
+    def drop_before(self, ts):
+        """Forget every event older than ts (mapped parts are sliced, the writable tail is copied)"""
+        parts = []
+        for k, part in enumerate(self._parts):
+            lo = np.searchsorted(part['ts'], ts, 'left')
+            if lo == len(part['ts']) and (parts or k < len(self._parts) - 1):
+                continue
+            if lo and self._tail is not None and k == len(self._parts) - 1:
+                part = {name: values[lo:].copy() for name, values in part.items()}
+                self._tail = None
+            elif lo:
+                part = {name: values[lo:] for name, values in part.items()}
+            parts.append(part)
+        self._parts = parts
+
+
+# ---------- Day × Hour Cube ----------
+class HourCube:
+    """Event counts per (day, hour of day), so hourly breakdowns of any window are a slice-and-sum.
+
+    With a ``history`` (measure -> one row per day before start), days that
+    are dropped are first rolled into it, so windows reaching before start
+    still get per-day summaries.
+    """
+
+    def __init__(self, start, counts, history=None):
+        self.start = start
+        self.counts = counts  # measure -> (days, 24) int64 array
+        self.history = history  # measure -> per-day rows ending the day before start, or None to keep none
+
+    @classmethod
+    def from_events(cls, start, days, **timestamps):
+        """Build the cube with one bincount per measure over its event timestamps"""
+        cube = cls(start, {name: np.zeros((days, 24), dtype=np.int64) for name in timestamps})
+        for name, ts in timestamps.items():
+            cube.add(name, ts)
+        return cube
+
+    @property
+    def end(self):
+        return self.start + datetime.timedelta(days=len(next(iter(self.counts.values()))) - 1)
+
+    @property
+    def first(self):
+        """First day with a summary: the oldest history row, or start"""
+        history_days = len(next(iter(self.history.values()))) if self.history else 0
+        return self.start - datetime.timedelta(days=history_days)
+
+    @staticmethod
+    def day_rows(rows):
+        """Per-day summaries of (day, hour, ...) rows, as kept in the history"""
+        return rows.sum(axis=1, dtype=rows.dtype)
+
+    def add(self, name, ts):
+        """Fold new event timestamps into one measure; events outside the cube are ignored"""
+        cells = self.counts[name].reshape(-1)
+        # Whole days are whole multiples of 3600s, so ts offset // 3600 is day * 24 + hour
+        index = (np.asarray(ts, dtype=np.int64) - day_to_ts(self.start)) // 3600
+        index = index[(index >= 0) & (index < len(cells))]
+        cells += np.bincount(index, minlength=len(cells))
+
+    def extend_to(self, end):
+        """Add empty days through end"""
+        extra = (end - self.end).days
+        if extra > 0:
+            self.counts = {name: np.concatenate((values, np.zeros((extra,) + values.shape[1:], dtype=values.dtype)))
+                           for name, values in self.counts.items()}
+
+    def drop_before(self, date):
+        """Forget days older than date, rolling them into the history when one is kept"""
+        lo = max((date - self.start).days, 0)
+        if self.history is not None:
+            self.history = {name: np.concatenate((self.history[name], self.day_rows(values[:lo])))
+                            for name, values in self.counts.items()}
+        self.counts = {name: values[lo:].copy() for name, values in self.counts.items()}
+        self.start += datetime.timedelta(days=lo)
+
+    def covers(self, start_date, end_date):
+        return self.start <= start_date and end_date <= self.end
+
+    def window(self, start_date, end_date, name='orders'):
+        """(day, hour) rows of a measure for the part of the window inside the cube"""
+        lo = max((start_date - self.start).days, 0)
+        hi = max((end_date - self.start).days + 1, lo)
+        return self.counts[name][lo:hi]
+
+    def daily(self, name):
+        """Per-day rows of a measure from first through end"""
+        rows = self.day_rows(self.counts[name])
+        return np.concatenate((self.history[name], rows)) if self.history else rows
+
+    def history_window(self, start_date, end_date, name):
+        """Per-day history rows of a measure for the part of the window before start"""
+        if not self.history:
+            return self.day_rows(self.counts[name][:0])
+        rows = self.history[name]
+        lo = max((start_date - self.first).days, 0)
+        hi = min(max((end_date - self.first).days + 1, lo), len(rows))
+        return rows[lo:hi]
+
+    def hourly(self, start_date, end_date, name='orders'):
+        """Totals per hour of day over the window"""
+        return self.window(start_date, end_date, name).sum(axis=0)
+
+    def weekday_hour(self, start_date, end_date, name='orders'):
+        """7 × 24 totals per (weekday, hour of day) over the window, Monday first"""
+        rows = self.window(start_date, end_date, name)
+        first = max(start_date, self.start)
+        weekday = (first.weekday() + np.arange(len(rows))) % 7
+        grid = np.zeros((7, 24), dtype=np.int64)
+        np.add.at(grid, weekday, rows)
+        return grid
+
+    def peak_hour(self, start_date, end_date, name='orders'):
+        """Busiest hour of the window as "HH:00", or None without events"""
+        hourly = self.hourly(start_date, end_date, name)
+        return f"{int(hourly.argmax()):02d}:00" if hourly.any() else None
+
+
+class HourSketch(HourCube):
+    """Quantile sketches of duration measures per (day, hour of day).
+
+    Counts are (days, 24, SKETCH_BINS); percentiles of any window, or of any
+    set of stores, come from summing the cells and one cumulative search.
+    Days before start keep one (SKETCH_BINS,) sketch each in the history.
+    """
+
+    @classmethod
+    def from_values(cls, start, days, history=None, **measures):
+        """Build from name=(timestamps, values) pairs"""
+        sketch = cls(start, {name: np.zeros((days, 24, SKETCH_BINS), dtype=np.int32) for name in measures}, history)
+        for name, (ts, values) in measures.items():
+            sketch.add(name, ts, values)
+        return sketch
+
+    def add(self, name, ts, values):
+        """Fold new (timestamp, value) pairs into one measure; pairs outside the sketch are ignored"""
+        cells = self.counts[name].reshape(-1)
+        hour = (np.asarray(ts, dtype=np.int64) - day_to_ts(self.start)) // 3600
+        index = hour * SKETCH_BINS + sketch_bins(values)
+        np.add.at(cells, index[(hour >= 0) & (index < len(cells))], 1)
+
+    def percentiles(self, start_date, end_date, name, prefix=None):
+        """p50/p95/p99 KPI entries (minutes) of a measure over the window, history days included"""
+        counts = self.window(start_date, end_date, name).sum(axis=(0, 1))
+        counts += self.history_window(start_date, end_date, name).sum(axis=0, dtype=counts.dtype)
+        return percentile_metrics(prefix or name, counts)
+
+
+class DailyDistinct(HourCube):
+    """HyperLogLog registers per day for distinct customer counts.
+
+    Registers are (days, HLL_REGISTERS) uint8; the union of any days, or of
+    the same days at other stores, is their element-wise maximum. Days
+    before start keep their registers in the history.
+    """
+
+    def __init__(self, start, counts, seed=0, history=None):
+        super().__init__(start, counts, history)
+        self.seed = seed  # Keeps customer codes of different merchants apart
+
+    @classmethod
+    def from_keys(cls, start, days, seed=0, history=None, **measures):
+        """Build from name=(timestamps, keys) pairs"""
+        distinct = cls(start, {name: np.zeros((days, HLL_REGISTERS), dtype=np.uint8) for name in measures}, seed,
+                       history)
+        for name, (ts, keys) in measures.items():
+            distinct.add(name, ts, keys)
+        return distinct
+
+    def add(self, name, ts, keys):
+        """Fold new (timestamp, key) pairs into one measure; pairs outside the registers are ignored"""
+        registers = self.counts[name].reshape(-1)
+        day = (np.asarray(ts, dtype=np.int64) - day_to_ts(self.start)) // DAY_SECONDS
+        register, rank = hll_positions(keys, self.seed)
+        index = day * HLL_REGISTERS + register
+        keep = (day >= 0) & (index < len(registers))
+        np.maximum.at(registers, index[keep], rank[keep])
+
+    @staticmethod
+    def day_rows(rows):
+        return rows
+
+    def union(self, start_date, end_date, name):
+        """Registers of every key seen in the window, history days included"""
+        registers = np.zeros(HLL_REGISTERS, dtype=np.uint8)
+        for rows in (self.history_window(start_date, end_date, name), self.window(start_date, end_date, name)):
+            if len(rows):
+                np.maximum(registers, rows.max(axis=0), out=registers)
+        return registers
+
+    def metrics(self, start_date, end_date):
+        """Unique scanners and buyers of the window, and the share of scanners seen before it"""
+        prior_end = max(start_date, self.first) - datetime.timedelta(days=1)
+        return distinct_metrics(self.union(start_date, end_date, 'scanners'),
+                                self.union(self.first, prior_end, 'scanners'),
+                                self.union(start_date, end_date, 'buyers'))
+
+
+# ---------- Cohort Matrix ----------
+COHORT_HEATMAP_WEEKS = 12  # Cohorts (and weeks since acquisition) shown in the heatmap
+
+
+class CohortMatrix:
+    """Distinct ordering customers per (acquisition week, weeks since acquisition).
+
+    Weeks count from the Monday of ``start``; row c holds the customers first
+    seen in week c and column k how many of them ordered k weeks later.
+    Customers first seen in week 0 include everyone acquired before ``start``.
+    Matrices of stores with the same start add up cell by cell.
+    """
+
+    def __init__(self, start, counts, first_week=None, last_week=None):
+        self.start = week_start(start)
+        self.counts = counts  # (weeks, weeks) int64 array
+        # Per-customer first and last active week (-1 = never seen); None for merged, read-only matrices
+        self.first_week = first_week
+        self.last_week = last_week
+
+    @classmethod
+    def from_orders(cls, start, end, customer, ts, n_customers=0):
+        weeks = (week_start(end) - week_start(start)).days // 7 + 1
+        matrix = cls(start, np.zeros((weeks, weeks), dtype=np.int64),
+                     np.full(n_customers, -1, dtype=np.int64), np.full(n_customers, -1, dtype=np.int64))
+        matrix.add(customer, ts)
+        return matrix
+
+    def __len__(self):
+        return len(self.counts)
+
+    def week_of(self, date):
+        """Week index of a date (negative before start)"""
+        return (date - self.start).days // 7
+
+    def _grow(self, weeks, customers):
+        if weeks > len(self):
+            counts = np.zeros((weeks, weeks), dtype=np.int64)
+            counts[:len(self), :len(self)] = self.counts
+            self.counts = counts
+        extra = customers - len(self.first_week)
+        if extra > 0:
+            self.first_week = np.concatenate((self.first_week, np.full(extra, -1, dtype=np.int64)))
+            self.last_week = np.concatenate((self.last_week, np.full(extra, -1, dtype=np.int64)))
+
+    def add(self, customer, ts):
+        """Fold orders in time order into the matrix with one 2-D bincount.
+
+        Each customer counts once per active week: (customer, week) pairs are
+        deduplicated and pairs not later than the customer's last seen week
+        are skipped, so orders can arrive in any number of batches.
+        """
+        week = (np.asarray(ts, dtype=np.int64) - day_to_ts(self.start)) // WEEK_SECONDS
+        keep = week >= 0
+        customer = np.asarray(customer, dtype=np.int64)[keep]
+        week = week[keep]
+        if not len(week):
+            return
+        self._grow(int(week.max()) + 1, int(customer.max()) + 1)
+        pairs = np.sort(customer << 32 | week)  # By customer, then week
+        pairs = pairs[np.diff(pairs, prepend=-1) != 0]
+        customer, week = pairs >> 32, pairs & 0xFFFFFFFF
+        first = np.flatnonzero(np.diff(customer, prepend=-1))
+        last = np.append(first[1:] - 1, len(pairs) - 1)
+        unseen = self.first_week[customer[first]] < 0
+        self.first_week[customer[first][unseen]] = week[first][unseen]
+        fresh = week > self.last_week[customer]
+        self.last_week[customer[last]] = np.maximum(self.last_week[customer[last]], week[last])
+        cohort = self.first_week[customer[fresh]]
+        n = len(self)
+        self.counts += np.bincount(cohort * n + week[fresh] - cohort, minlength=n * n).reshape(n, n)
+
+    def _observed(self, last):
+        """(cohort, weeks since) mask of cells observable by week index last"""
+        index = np.arange(len(self))
+        return index[:, None] + index[None, :] <= last
+
+    def retention_curve(self, end_date):
+        """Share of new customers still ordering k weeks after acquisition, pooled over every
+        cohort observed for k weeks by end_date"""
+        last = min(self.week_of(end_date), len(self) - 1)
+        observed = self._observed(last)
+        retained = np.where(observed, self.counts, 0).sum(axis=0)
+        acquired = np.where(observed, self.counts[:, :1], 0).sum(axis=0)
+        return np.divide(retained, acquired, out=np.zeros(len(self)), where=acquired > 0)[:last + 1]
+
+    def metrics(self, start_date, end_date):
+        """Retention, repeat, churn and lifetime KPIs of the window (week granular).
+
+        Retention is the week-1 retention of customers acquired in the window
+        (or, for windows shorter than two weeks, in the week before its last);
+        repeat share counts returning customers among everyone active in it.
+        """
+        metrics = dict.fromkeys(['customer_retention_rate', 'churn_rate', 'repeat_customer_pct',
+                                 'avg_customer_lifetime_weeks'])
+        lo = max(self.week_of(start_date), 0)
+        hi = min(self.week_of(end_date), len(self) - 1)
+        if hi < lo:
+            return metrics
+        cohorts = slice(min(lo, hi - 1), hi) if hi >= 1 else slice(0, 0)
+        acquired = int(self.counts[cohorts, 0].sum())
+        if acquired:
+            retention = int(self.counts[cohorts, 1].sum()) / acquired * 100
+            metrics['customer_retention_rate'] = retention
+            metrics['churn_rate'] = 100 - retention
+        # Active customers of week w from cohort c sit at cell (c, w - c)
+        cohort = np.arange(hi + 1)[:, None]
+        since = np.arange(lo, hi + 1)[None, :] - cohort
+        active = np.where(since >= 0, self.counts[cohort, np.clip(since, 0, None)], 0)
+        total = int(active.sum())
+        if total:
+            metrics['repeat_customer_pct'] = int(active[since > 0].sum()) / total * 100
+        curve = self.retention_curve(end_date)
+        if len(curve) and curve[0] > 0:
+            metrics['avg_customer_lifetime_weeks'] = float(curve.sum())
+        return metrics
+
+    def frame(self, end_date, weeks=COHORT_HEATMAP_WEEKS):
+        """Retention % of the latest cohorts by weeks since acquisition (NaN where not yet observed or for
+        weeks that acquired nobody)"""
+        last = min(self.week_of(end_date), len(self) - 1)
+        if last < 0:
+            return pd.DataFrame()
+        first = max(last - weeks + 1, 0)
+        counts = self.counts[first:last + 1, :weeks].astype(np.float64)
+        observed = self._observed(last)[first:last + 1, :weeks]
+        sizes = counts[:, :1]
+        share = np.divide(counts * 100, sizes, out=np.full_like(counts, np.nan), where=sizes > 0)
+        labels = [str(self.start + datetime.timedelta(weeks=c)) for c in range(first, last + 1)]
+        return pd.DataFrame(np.where(observed, share, np.nan), index=pd.Index(labels, name="Cohort"),
+                            columns=[f"W{k}" for k in range(counts.shape[1])])
+
+
+# ---------- Rollup Pyramid ----------
+PYRAMID_LEVELS = ('minute', 'hour', 'day', 'week', 'month')  # Finest first
+MIN_TREND_POINTS = 30  # A trend view uses the coarsest level with at least this many buckets
+
+
+def level_starts(level, start_date, end_date):
+    """Start timestamps of one level's buckets covering an inclusive date window.
+
+    Week (Monday) and month buckets are clipped to start_date, so the first
+    bucket may be partial.
+    """
+    if level in ('minute', 'hour'):
+        step = 60 if level == 'minute' else 3600
+        return np.arange(day_to_ts(start_date), day_to_ts(end_date + datetime.timedelta(days=1)), step)
+    days = np.arange(np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D') + 1)
+    if level == 'week':
+        days = days - (days.astype(np.int64) - 4) % 7  # 1970-01-05 was a Monday
+    elif level == 'month':
+        days = days.astype('datetime64[M]').astype('datetime64[D]')
+    days = np.unique(np.maximum(days, np.datetime64(start_date, 'D')))
+    return days.astype(np.int64) * DAY_SECONDS
+
+
+class RollupLevel:
+    """Scans/orders/revenue per bucket of one resolution, indexed by bucket start time"""
+
+    def __init__(self, name, starts, stop, values):
+        self.name = name
+        self.starts = starts
+        self.stop = stop  # Exclusive end of the last bucket
+        self.values = values
+
+    @classmethod
+    def empty(cls, name, start_date, end_date):
+        starts = level_starts(name, start_date, end_date)
+        values = {'qr_scans': np.zeros(len(starts), dtype=np.int64),
+                  'orders': np.zeros(len(starts), dtype=np.int64),
+                  'revenue': np.zeros(len(starts), dtype=np.float64)}
+        return cls(name, starts, day_to_ts(end_date + datetime.timedelta(days=1)), values)
+
+    @classmethod
+    def from_daily(cls, name, daily):
+        """Roll a daily frame up into this level's buckets with one bincount per column"""
+        level = cls.empty(name, daily.index[0].date(), daily.index[-1].date())
+        bucket = level._buckets(daily.index.values.astype('datetime64[D]').astype(np.int64) * DAY_SECONDS)
+        for col, values in level.values.items():
+            values += np.bincount(bucket, weights=daily[col].to_numpy(), minlength=len(values)).astype(values.dtype)
+        return level
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _buckets(self, ts):
+        return np.searchsorted(self.starts, ts, 'right') - 1
+
+    def add(self, scan_ts, order_ts, amount):
+        """Fold new events in; events outside the level's range are ignored"""
+        for col, ts, weights in (('qr_scans', scan_ts, None), ('orders', order_ts, None),
+                                 ('revenue', order_ts, amount)):
+            inside = (ts >= self.starts[0]) & (ts < self.stop) if len(self) else np.zeros(len(ts), dtype=bool)
+            bucket = self._buckets(ts[inside])
+            weights = weights[inside] if weights is not None else None
+            values = self.values[col]
+            values += np.bincount(bucket, weights=weights, minlength=len(values)).astype(values.dtype)
+
+    def drop_before(self, ts):
+        """Forget buckets that start before ts"""
+        lo = np.searchsorted(self.starts, ts, 'left')
+        self.starts = self.starts[lo:].copy()
+        self.values = {col: values[lo:].copy() for col, values in self.values.items()}
+
+    def covers(self, start_ts, end_ts):
+        return len(self) > 0 and self.starts[0] <= start_ts and end_ts <= self.stop
+
+    def span(self, start_ts, end_ts):
+        """Positions [lo, hi) of the buckets overlapping [start_ts, end_ts)"""
+        return max(self._buckets(start_ts), 0), np.searchsorted(self.starts, end_ts, 'left')
+
+    def frame(self, start_ts, end_ts):
+        """Bucket rows overlapping the window"""
+        lo, hi = self.span(start_ts, end_ts)
+        return pd.DataFrame({col: values[lo:hi] for col, values in self.values.items()},
+                            index=pd.to_datetime(self.starts[lo:hi], unit='s'))
+
+
+class RollupPyramid:
+    """Materialized minute/hour/day/week/month rollups, maintained incrementally.
+
+    Minute and hour levels span the raw event tier; day, week and month span
+    the full daily history.
+    """
+
+    def __init__(self, levels):
+        self.levels = levels  # name -> RollupLevel, finest first
+
+    @classmethod
+    def from_daily(cls, daily):
+        return cls({name: RollupLevel.from_daily(name, daily) for name in ('day', 'week', 'month')})
+
+    @classmethod
+    def from_store(cls, store):
+        pyramid = cls.from_daily(store.daily_frame())
+        fine = {name: RollupLevel.empty(name, store.raw_start, store.end) for name in ('minute', 'hour')}
+        empty = np.empty(0, dtype=np.int64)
+        for level in fine.values():
+            for part in store.scans.parts():
+                level.add(part['ts'], empty, empty)
+            for part in store.orders.parts():
+                level.add(empty, part['ts'], part['amount'])
+        pyramid.levels = {**fine, **pyramid.levels}
+        return pyramid
+
+    def add(self, scan_ts, order_ts, amount):
+        """Fold new events into every level"""
+        for level in self.levels.values():
+            level.add(scan_ts, order_ts, amount)
+
+    def drop_before(self, date):
+        """Forget minute and hour buckets older than date (compacted days keep their coarse rows)"""
+        for name in ('minute', 'hour'):
+            if name in self.levels:
+                self.levels[name].drop_before(day_to_ts(date))
+
+    def choose_level(self, start_date, end_date, min_points=MIN_TREND_POINTS):
+        """Coarsest level covering the window with at least min_points buckets (else the finest covering)"""
+        start_ts, end_ts = day_to_ts(start_date), day_to_ts(end_date + datetime.timedelta(days=1))
+        covering = [level for level in self.levels.values() if level.covers(start_ts, end_ts)]
+        if not covering:
+            return self.levels['day']
+        for level in reversed(covering):
+            lo, hi = level.span(start_ts, end_ts)
+            if hi - lo >= min_points:
+                return level
+        return covering[0]
+
+    def trend(self, start_date, end_date, min_points=MIN_TREND_POINTS):
+        """(level name, bucket rows) for a trend view of the window.
+
+        Edge buckets reaching outside the window are re-summed from the day
+        level, so every row only counts days inside the window.
+        """
+        level = self.choose_level(start_date, end_date, min_points)
+        start_ts, end_ts = day_to_ts(start_date), day_to_ts(end_date + datetime.timedelta(days=1))
+        frame = level.frame(start_ts, end_ts)
+        if level.name in ('week', 'month') and len(frame):
+            lo, hi = level.span(start_ts, end_ts)
+            starts = level.starts[lo:hi]
+            ends = np.append(level.starts, level.stop)[lo + 1:hi + 1]
+            for row in {0, len(frame) - 1}:
+                if starts[row] < start_ts or ends[row] > end_ts:
+                    edge = self.levels['day'].frame(max(int(starts[row]), start_ts), min(int(ends[row]), end_ts))
+                    for col in frame.columns:
+                        frame.iat[row, frame.columns.get_loc(col)] = edge[col].sum()
+            frame.index = pd.DatetimeIndex(np.maximum(frame.index.values, np.datetime64(start_date, 'ns')))
+        return level.name, frame
+
+
+# ---------- Menu Catalog ----------
+# (item, category, base price in MAD, relative popularity)
+CATALOG = [
+    ("Big Bite", "Burgers", 25.0, 10),
+    ("Super Filet", "Burgers", 25.0, 9),
+    ("Maxi Grill", "Burgers", 25.0, 8),
+    ("Double Cheese", "Burgers", 30.0, 5),
+    ("Zinker", "Sandwiches", 15.0, 7),
+    ("Club Sandwich", "Sandwiches", 15.0, 5),
+    ("Tacos Poulet", "Sandwiches", 18.0, 4),
+    ("Chicken Wings", "Fried Items", 25.0, 7),
+    ("Nuggets", "Fried Items", 15.0, 4),
+    ("Fries", "Fried Items", 10.0, 6),
+    ("Soda", "Beverages", 8.0, 6),
+    ("Fresh Juice", "Beverages", 12.0, 3),
+    ("Mint Tea", "Beverages", 8.0, 2),
+    ("Sundae", "Desserts", 20.0, 3),
+    ("Brownie", "Desserts", 25.0, 2),
+]
+
+# Share of daily scans per hour of day (lunch and dinner peaks)
+HOURLY_PROFILE = np.zeros(24)
+HOURLY_PROFILE[8:23] = [10, 15, 25, 45, 80, 120, 95, 85, 70, 90, 110, 85, 60, 40, 25]
+HOURLY_PROFILE /= HOURLY_PROFILE.sum()
+
+
+# ---------- Customer State ----------
+RFM_WINDOWS = 4  # RFM score sets of different windows memoized per customer state
+
+
+class CustomerState:
+    """Lifetime first/last order time, order count and spend per customer code.
+
+    Batches of orders are reduced per customer with one stable sort and a
+    reduceat per column, then merged into the running arrays, so keeping the
+    state current never rescans the order history.
+    """
+
+    def __init__(self, size=0):
+        self.first_ts = np.full(size, np.iinfo(np.int64).max, dtype=np.int64)
+        self.last_ts = np.full(size, np.iinfo(np.int64).min, dtype=np.int64)
+        self.orders = np.zeros(size, dtype=np.int64)
+        self.spend = np.zeros(size, dtype=np.float64)
+        self._rfm = collections.OrderedDict()  # (start_ts, as_of_ts) -> scores of recent rfm calls
+
+    @classmethod
+    def from_orders(cls, customer, ts, amount, size=0):
+        state = cls(size)
+        state.add(customer, ts, amount)
+        return state
+
+    @classmethod
+    def from_totals(cls, customer, first_ts, last_ts, orders, spend, size=0):
+        """State from per-customer aggregates computed elsewhere (e.g. a GROUP BY)"""
+        state = cls(size)
+        state._grow(int(customer.max()) + 1 if len(customer) else 0)
+        state.first_ts[customer] = first_ts
+        state.last_ts[customer] = last_ts
+        state.orders[customer] = orders
+        state.spend[customer] = spend
+        return state
+
+    def copy(self):
+        """Independent state with the same totals (the RFM memo is not shared)"""
+        state = CustomerState()
+        state.first_ts, state.last_ts = self.first_ts.copy(), self.last_ts.copy()
+        state.orders, state.spend = self.orders.copy(), self.spend.copy()
+        return state
+
+    def __len__(self):
+        return len(self.orders)
+
+    def _grow(self, size):
+        if size <= len(self):
+            return
+        extra = max(size, 2 * len(self)) - len(self)
+        self.first_ts = np.concatenate((self.first_ts, np.full(extra, np.iinfo(np.int64).max)))
+        self.last_ts = np.concatenate((self.last_ts, np.full(extra, np.iinfo(np.int64).min)))
+        self.orders = np.concatenate((self.orders, np.zeros(extra, dtype=np.int64)))
+        self.spend = np.concatenate((self.spend, np.zeros(extra)))
+
+    def add(self, customer, ts, amount):
+        """Fold a batch of orders into the per-customer totals"""
+        if not len(customer):
+            return
+        order = np.argsort(customer, kind='stable')
+        customer = customer[order]
+        starts = np.flatnonzero(np.diff(customer, prepend=-1))
+        codes = customer[starts]
+        self._grow(int(codes[-1]) + 1)
+        ts = ts[order]
+        self.first_ts[codes] = np.minimum(self.first_ts[codes], np.minimum.reduceat(ts, starts))
+        self.last_ts[codes] = np.maximum(self.last_ts[codes], np.maximum.reduceat(ts, starts))
+        self.orders[codes] += np.diff(np.append(starts, len(customer)))
+        self.spend[codes] += np.add.reduceat(amount[order].astype(np.float64), starts)
+        self._rfm = collections.OrderedDict()
+
+    def rfm(self, start_ts, as_of_ts):
+        """Codes of every customer with orders, with their R, F and M scores and segment codes.
+
+        Results of the last few windows are reused until new orders arrive: a
+        rerun asks for the same window's scores once per customer table and
+        chart, and the lapsed-VIP alert asks for its own window in between.
+        """
+        key = (start_ts, as_of_ts)
+        scores = self._rfm.get(key)
+        if scores is None:
+            active = np.flatnonzero(self.orders)
+            recency = quantile_scores(self.last_ts[active] - as_of_ts)
+            frequency = quantile_scores(self.orders[active])
+            monetary = quantile_scores(self.spend[active])
+            segment = rfm_segments(self.first_ts[active] >= start_ts, recency, frequency, monetary)
+            scores = active, recency, frequency, monetary, segment
+            self._rfm[key] = scores
+            while len(self._rfm) > RFM_WINDOWS:
+                self._rfm.popitem(last=False)
+        return scores
+
+    def lapsed_vips(self, as_of_ts, days=7):
+        """(lapsed, regulars): VIP regulars whose last order fell in the previous `days` days, not the latest
+        ones, and every VIP regular who ordered within the last 2 × `days` days.
+
+        Regulars have more than two orders, at least one every `days` days.
+        Customers gone for longer already lapsed in an earlier week.
+        """
+        active, _, frequency, monetary, _ = self.rfm(as_of_ts, as_of_ts)
+        orders, first_ts, last_ts = self.orders[active], self.first_ts[active], self.last_ts[active]
+        loyal = (frequency >= VIP_MIN_SCORE) & (monetary >= VIP_MIN_SCORE) & (orders > 2)
+        habitual = last_ts - first_ts <= (orders - 1) * days * DAY_SECONDS
+        regulars = loyal & habitual & (last_ts >= as_of_ts - 2 * days * DAY_SECONDS)
+        lapsed = regulars & (last_ts < as_of_ts - days * DAY_SECONDS)
+        return int(np.count_nonzero(lapsed)), int(np.count_nonzero(regulars))
+
+    def segments(self, start_ts, as_of_ts):
+        """Customer counts and average lifetime spend per RFM segment"""
+        active, _, _, _, segment = self.rfm(start_ts, as_of_ts)
+        counts = np.bincount(segment, minlength=len(SEGMENTS))
+        totals = np.bincount(segment, weights=self.spend[active], minlength=len(SEGMENTS))
+        return pd.DataFrame({
+            "Segment": SEGMENTS,
+            "Count": counts,
+            "Avg Spend": np.divide(totals, counts, out=np.zeros(len(SEGMENTS)), where=counts > 0).round(0)
+        })
+
+    def top_customers(self, start_ts, as_of_ts, n=5):
+        """Highest lifetime spenders among customers who ordered since start_ts"""
+        active, recency, frequency, monetary, segment = self.rfm(start_ts, as_of_ts)
+        recent = np.flatnonzero(self.last_ts[active] >= start_ts)
+        top = recent[top_positions(self.spend[active[recent]], n)]
+        codes = active[top]
+        tenure_days = (as_of_ts - self.first_ts[codes]) / DAY_SECONDS
+        return pd.DataFrame({
+            "Customer": [EventStore.customer_label(code) for code in codes],
+            "Spend (MAD)": self.spend[codes].round(0),
+            "Orders": self.orders[codes],
+            "Frequency": [frequency_label(count, days) for count, days in zip(self.orders[codes], tenure_days)],
+            "RFM": [f"{r}{f}{m}" for r, f, m in zip(recency[top], frequency[top], monetary[top])],
+            "Segment": [SEGMENTS[code] for code in segment[top]]
+        })
+
+
+# ---------- Event Store ----------
+PAST_CUSTOMER_STATES = 4  # Customer states of past end dates kept per store (Yesterday, Last Week, ...)
+
+
+class EventStore:
+    """Scan, session and order events for one merchant.
+
+    Raw events are kept from ``raw_start`` onwards; older days only survive
+    as rows of the ``compacted`` daily frame, as per-day summaries in
+    ``history`` (HyperLogLog registers of scanners and buyers, and duration
+    sketches) and in ``customer_base``, the lifetime totals of each customer
+    as of raw_start. This bounds memory no matter how long the history is.
+    """
+
+    def __init__(self, scans, sessions, orders, compacted, raw_start, end, items, item_category, categories,
+                 n_customers, merchant_id='default', watermark=None, history=None, customer_base=None):
+        self.merchant_id = merchant_id
+        # Exclusive upper bound of ingested event time
+        self.watermark = watermark if watermark is not None else day_to_ts(end + datetime.timedelta(days=1))
+        self.scans = scans
+        self.sessions = sessions
+        self.orders = orders
+        self.compacted = compacted
+        self.raw_start = raw_start
+        self.end = end
+        self.items = items
+        self.item_category = item_category
+        self.categories = categories
+        self.n_customers = n_customers
+        self.customer_base = customer_base if customer_base is not None else CustomerState(n_customers)
+        days, empty = (end - raw_start).days + 1, np.empty(0, dtype=np.int64)
+        history = history or {}
+        self.cube = HourCube.from_events(raw_start, days, orders=empty, qr_scans=empty)
+        self.sketches = HourSketch.from_values(
+            raw_start, days, fulfillment=(empty, empty), session_duration=(empty, empty),
+            history={name: history.get(name, np.zeros((0, SKETCH_BINS), dtype=np.int32))
+                     for name in ('fulfillment', 'session_duration')})
+        self.distinct = DailyDistinct.from_keys(
+            raw_start, days, zlib.crc32(merchant_id.encode()), scanners=(empty, empty), buyers=(empty, empty),
+            history={name: history.get(name, np.zeros((0, HLL_REGISTERS), dtype=np.uint8))
+                     for name in ('scanners', 'buyers')})
+        # One pass per part, so mapped partitions are read in place rather than copied together
+        for name in ('scans', 'sessions', 'orders'):
+            for part in getattr(self, name).parts():
+                self._fold_events(**{name: part})
+        self._pyramid = None
+        self._customers = None
+        self._cohorts = None
+        self._past_customers = collections.OrderedDict()  # end date -> CustomerState, for past windows
+        self._past_lock = threading.Lock()
+
+    @property
+    def pyramid(self):
+        """Minute-to-month rollups, built on first use and kept current by append"""
+        if self._pyramid is None:
+            self._pyramid = RollupPyramid.from_store(self)
+        return self._pyramid
+
+    @property
+    def customers(self):
+        """Lifetime RFM inputs of every customer, built on first use and kept current by append"""
+        if self._customers is None:
+            customers = self.customer_base.copy()
+            for part in self.orders.parts():
+                customers.add(part['customer'], part['ts'], part['amount'])
+            self._customers = customers
+        return self._customers
+
+    @property
+    def cohorts(self):
+        """Weekly cohort matrix of the raw tier, built on first use and kept current by append"""
+        if self._cohorts is None:
+            empty = np.empty(0, dtype=np.int64)
+            cohorts = CohortMatrix.from_orders(self.raw_start, self.end, empty, empty, self.n_customers)
+            for part in self.orders.parts():
+                cohorts.add(part['customer'], part['ts'])
+            self._cohorts = cohorts
+        return self._cohorts
+
+    @property
+    def start(self):
+        return self.compacted.index[0].date() if len(self.compacted) else self.raw_start
+
+    @property
+    def nbytes(self):
+        return self.scans.nbytes + self.sessions.nbytes + self.orders.nbytes
+
+    def covers_raw(self, start_date, end_date):
+        """True when raw events exist for the whole window"""
+        return self.raw_start <= start_date and end_date <= self.end
+
+    @staticmethod
+    def customer_label(code):
+        return f"CUST-{code:06d}"
+
+    def _raw_daily(self):
+        """Daily scans/orders/revenue of the raw tier via one bincount per column and part"""
+        origin = day_to_ts(self.raw_start)
+        days = (self.end - self.raw_start).days + 1
+        scans, orders, revenue = np.zeros(days, dtype=np.int64), np.zeros(days, dtype=np.int64), np.zeros(days)
+        for part in self.scans.parts():
+            scans += np.bincount((part['ts'] - origin) // DAY_SECONDS, minlength=days)
+        for part in self.orders.parts():
+            order_day = (part['ts'] - origin) // DAY_SECONDS
+            orders += np.bincount(order_day, minlength=days)
+            revenue += np.bincount(order_day, weights=part['amount'], minlength=days)
+        return pd.DataFrame({
+            'qr_scans': scans.astype(np.int32),
+            'orders': orders.astype(np.int32),
+            'revenue': revenue.astype(np.float32)
+        }, index=pd.date_range(self.raw_start, periods=days, freq='D'))
+
+    def daily_frame(self):
+        """Full daily history: compacted rows followed by rolled-up raw events"""
+        return pd.concat([self.compacted, self._raw_daily()])
+
+    def _fold_events(self, scans=None, sessions=None, orders=None):
+        """Fold event columns into the hour cube, duration sketches and distinct counts"""
+        if scans is not None:
+            self.cube.add('qr_scans', scans['ts'])
+            self.distinct.add('scanners', scans['ts'], scans['customer'])
+        if sessions is not None:
+            self.sketches.add('session_duration', sessions['ts'], sessions['duration_s'])
+        if orders is not None:
+            self.cube.add('orders', orders['ts'])
+            fulfilled = ~orders['canceled']
+            self.sketches.add('fulfillment', orders['ts'][fulfilled], orders['fulfillment_s'][fulfilled])
+            self.distinct.add('buyers', orders['ts'], orders['customer'])
+
+    def append(self, batch):
+        """Ingest a feed batch and return its per-day totals as (dates, totals).
+
+        Batches must not overlap already ingested time; ``batch['watermark']``
+        becomes the store's new watermark.
+        """
+        for name in ('scans', 'sessions', 'orders'):
+            getattr(self, name).extend(**batch[name])
+        self.watermark = batch['watermark']
+        self._fold_events(batch['scans'], batch['sessions'], batch['orders'])
+        if self._pyramid is not None:
+            self._pyramid.add(batch['scans']['ts'], batch['orders']['ts'], batch['orders']['amount'])
+        if self._customers is not None:
+            self._customers.add(batch['orders']['customer'], batch['orders']['ts'], batch['orders']['amount'])
+        if len(batch['orders']['ts']):
+            # Memoized past states from the first new order's day on no longer hold
+            first = ts_to_day(batch['orders']['ts'][0])
+            with self._past_lock:
+                for end_date in [end_date for end_date in self._past_customers if end_date >= first]:
+                    del self._past_customers[end_date]
+        if self._cohorts is not None:
+            self._cohorts.add(batch['orders']['customer'], batch['orders']['ts'])
+        origin = day_to_ts(self.raw_start)
+        scan_day = (batch['scans']['ts'] - origin) // DAY_SECONDS
+        order_day = (batch['orders']['ts'] - origin) // DAY_SECONDS
+        days = np.union1d(scan_day, order_day)
+        totals = {
+            'qr_scans': np.bincount(np.searchsorted(days, scan_day), minlength=len(days)),
+            'orders': np.bincount(np.searchsorted(days, order_day), minlength=len(days)),
+            'revenue': np.bincount(np.searchsorted(days, order_day), weights=batch['orders']['amount'],
+                                   minlength=len(days))
+        }
+        dates = [self.raw_start + datetime.timedelta(days=int(day)) for day in days]
+        return dates, totals
+
+    def daily_partials(self):
+        """Additive per-day aggregates of the raw tier.
+
+        Every entry is a sum or count indexed by raw day, so partials of many
+        stores merge by plain addition (see merge_partials).
+        """
+        days = (self.end - self.raw_start).days + 1
+        origin = day_to_ts(self.raw_start)
+        sessions, orders = self.sessions.columns, self.orders.columns
+        session_day = (sessions['ts'] - origin) // DAY_SECONDS
+        order_day = (orders['ts'] - origin) // DAY_SECONDS
+        fulfilled = ~orders['canceled']
+        category = self.item_category[orders['item']]
+        n_categories = len(self.categories)
+        return {
+            'sessions': np.bincount(session_day, minlength=days),
+            'session_seconds': np.bincount(session_day, weights=sessions['duration_s'], minlength=days),
+            'bounces': np.bincount(session_day[sessions['pages'] <= 1], minlength=days),
+            'orders': np.bincount(order_day, minlength=days),
+            'scan_to_order_seconds': np.bincount(order_day, weights=orders['scan_to_order_s'], minlength=days),
+            'canceled': np.bincount(order_day[orders['canceled']], minlength=days),
+            'coupons': np.bincount(order_day[orders['coupon']], minlength=days),
+            'fulfilled': np.bincount(order_day[fulfilled], minlength=days),
+            'fulfillment_seconds': np.bincount(order_day[fulfilled], weights=orders['fulfillment_s'][fulfilled],
+                                               minlength=days),
+            'hourly_orders': self.cube.counts['orders'].copy(),
+            'hourly_scans': self.cube.counts['qr_scans'].copy(),
+            'fulfillment_sketch': self.sketches.counts['fulfillment'].copy(),
+            'session_duration_sketch': self.sketches.counts['session_duration'].copy(),
+            'scanners_hll': self.distinct.counts['scanners'].copy(),
+            'buyers_hll': self.distinct.counts['buyers'].copy(),
+            'cohort_counts': self.cohorts.counts.copy(),
+            'category_revenue': np.bincount(order_day * n_categories + category, weights=orders['amount'],
+                                            minlength=days * n_categories).reshape(days, n_categories)
+        }
+
+    def extend_to(self, end):
+        """Move the last day forward to end; the new days fill up through append"""
+        if end <= self.end:
+            return
+        for cube in (self.cube, self.sketches, self.distinct):
+            cube.extend_to(end)
+        self.end = end
+        # Pyramid levels and cohort weeks are laid out through end: rebuild them on next use
+        self._pyramid = None
+        self._cohorts = None
+
+    def compact(self, before):
+        """Roll raw events older than ``before`` into the daily frame, summaries and customer base, and drop them"""
+        if before <= self.raw_start:
+            return
+        before = min(before, self.end + datetime.timedelta(days=1))
+        rolled = self._raw_daily().loc[:pd.Timestamp(before) - pd.Timedelta(days=1)]
+        self.compacted = pd.concat([self.compacted, rolled])
+        cutoff = day_to_ts(before)
+        dropped = self.orders.view(day_to_ts(self.raw_start), cutoff)
+        self.customer_base.add(dropped['customer'], dropped['ts'], dropped['amount'])
+        for table in (self.scans, self.sessions, self.orders):
+            table.drop_before(cutoff)
+        self.cube.drop_before(before)
+        self.sketches.drop_before(before)
+        self.distinct.drop_before(before)
+        if self._pyramid is not None:
+            self._pyramid.drop_before(before)
+        with self._past_lock:
+            self._past_customers.clear()
+        self.raw_start = before
+
+    def window_ts(self, start_date, end_date):
+        """Half-open epoch-second bounds of a date window, clipped to the raw tier"""
+        return day_to_ts(max(start_date, self.raw_start)), day_to_ts(end_date + datetime.timedelta(days=1))
+
+    def kpis(self, start_date, end_date):
+        """Event-level KPIs for the part of the window covered by raw events.
+
+        Metrics that have no events to be computed from are None.
+        """
+        start_ts, end_ts = self.window_ts(start_date, end_date)
+        sessions = self.sessions.view(start_ts, end_ts)
+        orders = self.orders.view(start_ts, end_ts)
+        count('rows_processed', len(sessions['ts']) + len(orders['ts']), source='kpis')
+
+        metrics = dict.fromkeys([
+            'avg_session_duration', 'bounce_rate',
+            'avg_time_scan_to_order', 'canceled_orders', 'coupon_redemption_rate',
+            'avg_fulfillment_time', 'peak_hour', 'top_category'
+        ])
+
+        if len(sessions['ts']):
+            metrics['avg_session_duration'] = float(sessions['duration_s'].mean(dtype=np.float64)) / 60
+            metrics['bounce_rate'] = float((sessions['pages'] <= 1).mean()) * 100
+
+        if len(orders['ts']):
+            fulfilled = ~orders['canceled']
+            metrics['avg_time_scan_to_order'] = float(orders['scan_to_order_s'].mean(dtype=np.float64)) / 60
+            metrics['canceled_orders'] = int(np.count_nonzero(orders['canceled']))
+            metrics['coupon_redemption_rate'] = float(orders['coupon'].mean()) * 100
+            if fulfilled.any():
+                metrics['avg_fulfillment_time'] = float(orders['fulfillment_s'][fulfilled].mean(dtype=np.float64)) / 60
+            metrics['peak_hour'] = self.cube.peak_hour(start_date, end_date)
+            category_revenue = np.bincount(self.item_category[orders['item']], weights=orders['amount'],
+                                           minlength=len(self.categories))
+            metrics['top_category'] = str(self.categories[category_revenue.argmax()])
+
+        metrics.update(self.sketches.percentiles(start_date, end_date, 'fulfillment'))
+        metrics.update(self.sketches.percentiles(start_date, end_date, 'session_duration'))
+        metrics.update(self.distinct.metrics(start_date, end_date))
+        metrics.update(self.cohorts.metrics(start_date, end_date))
+        return metrics
+
+    # ---------- Menu & Customer Sections ----------
+    def item_totals(self, start_date, end_date):
+        """Per-item views, orders and revenue of the window, one bincount each"""
+        start_ts, end_ts = self.window_ts(start_date, end_date)
+        orders = self.orders.view(start_ts, end_ts)
+        viewed = self.sessions.view(start_ts, end_ts)['item']
+        n_items = len(self.items)
+        count('rows_processed', len(orders['ts']) + len(viewed), source='items')
+        return (
+            np.bincount(viewed[viewed >= 0], minlength=n_items),
+            np.bincount(orders['item'], minlength=n_items),
+            np.bincount(orders['item'], weights=orders['amount'], minlength=n_items)
+        )
+
+    def _item_rows(self, totals, positions):
+        views, orders, revenue = (values[positions] for values in totals)
+        return item_frame(self.items[positions], self.categories[self.item_category[positions]],
+                          views, orders, revenue)
+
+    def item_count(self):
+        return len(self.items)
+
+    def top_items(self, start_date, end_date, n=5):
+        """Best-selling items of the window"""
+        totals = self.item_totals(start_date, end_date)
+        top = top_positions(totals[1], n)
+        return self._item_rows(totals, top[totals[1][top] > 0])
+
+    def item_page(self, start_date, end_date, sort_by="Orders", descending=True, page=0, page_size=20):
+        """One page of every menu item, sorted by an item column (ties by catalog order)"""
+        totals = self.item_totals(start_date, end_date)
+        key = item_metrics(*totals)[sort_by].astype(np.float64)
+        ranked = top_positions(key if descending else -key, (page + 1) * page_size)
+        return self._item_rows(totals, ranked[page * page_size:])
+
+    def category_metrics(self, start_date, end_date):
+        """Orders and revenue per menu category for the window, grouped from the item totals"""
+        _, orders, revenue = self.item_totals(start_date, end_date)
+        counts = np.bincount(self.item_category, weights=orders, minlength=len(self.categories)).astype(np.int64)
+        revenue = np.bincount(self.item_category, weights=revenue, minlength=len(self.categories))
+        sold = counts > 0
+        return pd.DataFrame({
+            "Category": self.categories[sold],
+            "Orders": counts[sold],
+            "Revenue (MAD)": revenue[sold].round(0),
+            "Avg Order Value": (revenue[sold] / counts[sold]).round(1)
+        })
+
+    def customer_state(self, end_date):
+        """Customer state as of the end of end_date; built from the base and raw orders for past dates and memoized"""
+        if end_date >= self.end:
+            return self.customers
+        with self._past_lock:
+            state = self._past_customers.get(end_date)
+            if state is not None:
+                self._past_customers.move_to_end(end_date)
+                return state
+        orders = self.orders.view(day_to_ts(self.raw_start), day_to_ts(end_date + datetime.timedelta(days=1)))
+        count('rows_processed', len(orders['ts']), source='customers')
+        state = self.customer_base.copy()
+        state.add(orders['customer'], orders['ts'], orders['amount'])
+        with self._past_lock:
+            self._past_customers[end_date] = state
+            while len(self._past_customers) > PAST_CUSTOMER_STATES:
+                self._past_customers.popitem(last=False)
+        return state
+
+    def top_customers(self, start_date, end_date, n=5):
+        """Highest lifetime spenders active in the window, with their RFM scores"""
+        start_ts, end_ts = self.window_ts(start_date, end_date)
+        return self.customer_state(end_date).top_customers(start_ts, end_ts, n)
+
+    def customer_segments(self, start_date, end_date):
+        """Customer counts and average lifetime spend per RFM segment"""
+        start_ts, end_ts = self.window_ts(start_date, end_date)
+        return self.customer_state(end_date).segments(start_ts, end_ts)
+
+
+# ---------- Mergeable Partials ----------
+def merge_partials(a, b):
+    """Combine two partial aggregates of the same shape (HyperLogLog registers by maximum)"""
+    return {key: np.maximum(a[key], b[key]) if key.endswith('_hll') else a[key] + b[key] for key in a}
+
+
+def kpis_from_partials(partials, lo, hi, categories):
+    """Event-level KPIs from summed partial rows [lo, hi).
+
+    Distinct counts, duration percentiles and cohort KPIs are not sums over
+    raw days; they come from the merged HyperLogLog registers, sketches
+    (history included) and cohort matrix instead.
+    """
+    totals = {key: values[lo:hi].sum(axis=0) for key, values in partials.items()}
+    metrics = dict.fromkeys([
+        'avg_session_duration', 'bounce_rate',
+        'avg_time_scan_to_order', 'canceled_orders', 'coupon_redemption_rate',
+        'avg_fulfillment_time', 'peak_hour', 'top_category'
+    ])
+    if totals['sessions'] > 0:
+        metrics['avg_session_duration'] = float(totals['session_seconds'] / totals['sessions']) / 60
+        metrics['bounce_rate'] = float(totals['bounces'] / totals['sessions']) * 100
+    if totals['orders'] > 0:
+        metrics['avg_time_scan_to_order'] = float(totals['scan_to_order_seconds'] / totals['orders']) / 60
+        metrics['canceled_orders'] = int(totals['canceled'])
+        metrics['coupon_redemption_rate'] = float(totals['coupons'] / totals['orders']) * 100
+        if totals['fulfilled'] > 0:
+            metrics['avg_fulfillment_time'] = float(totals['fulfillment_seconds'] / totals['fulfilled']) / 60
+        metrics['peak_hour'] = f"{int(totals['hourly_orders'].argmax()):02d}:00"
+        metrics['top_category'] = str(categories[totals['category_revenue'].argmax()])
+    return metrics
+
+
+# ---------- Synthetic Event Feed ----------
+def simulate_daily_plan(days, rng, end):
+    """Daily scan/order/revenue totals with weekend, trend and conversion patterns"""
+    dates = pd.date_range(end=end, periods=days, freq='D')
+
+    # Weekend boost
+    weekend_multiplier = np.where(dates.weekday >= 5, 1.3, 1.0)
+    # Time trend (slight growth)
+    trend_multiplier = 1 + np.arange(days) * 0.02
+
+    daily_scans = (rng.normal(150, 30, days) * weekend_multiplier * trend_multiplier).astype(np.int32)
+    daily_scans = np.maximum(daily_scans, 50)  # Minimum scans
+
+    # Conversion rate varies
+    conversion_rate = np.clip(rng.normal(0.12, 0.03, days), 0.05, 0.25)
+
+    daily_orders = (daily_scans * conversion_rate).astype(np.int32)
+    daily_revenue = np.maximum(daily_orders * rng.normal(28, 8, days), 0).astype(np.float32)
+
+    return pd.DataFrame({
+        'qr_scans': daily_scans,
+        'orders': daily_orders,
+        'revenue': daily_revenue
+    }, index=dates)
+
+
+def _draw_items(rng, n_orders):
+    """Menu item codes by popularity and their unscaled order amounts"""
+    prices, popularity = np.array([entry[2:] for entry in CATALOG]).T
+    item = rng.choice(len(CATALOG), size=n_orders, p=popularity / popularity.sum())
+    return item, prices[item] * rng.lognormal(0.3, 0.35, n_orders)
+
+
+def _session_columns(rng, scan_ts, customer):
+    """Scan and session columns for a batch of scans (one session per scan).
+
+    Sessions that get past the menu page open one item (``item``, -1 for
+    bounces); callers overwrite it with the ordered item for converted sessions.
+    """
+    n_scans = len(scan_ts)
+    pages = np.minimum(rng.geometric(0.3, n_scans), 255).astype(np.uint8)
+    duration_s = np.where(pages <= 1, rng.gamma(2.0, 20.0, n_scans), rng.gamma(4.0, 100.0, n_scans))
+    viewed, _ = _draw_items(rng, n_scans)
+    return (
+        {'ts': scan_ts, 'customer': customer},
+        {'ts': scan_ts, 'customer': customer,
+         'duration_s': np.minimum(duration_s, 65535).astype(np.uint16), 'pages': pages,
+         'item': np.where(pages > 1, viewed, -1).astype(np.int16)}
+    )
+
+
+def _order_columns(rng, order_ts, customer, item, amount, scan_to_order_s):
+    """Time-sorted order columns with fulfillment, cancellation and coupon draws"""
+    n_orders = len(order_ts)
+    rush = np.isin(order_ts % DAY_SECONDS // 3600, [12, 13, 19, 20])
+    fulfillment_s = rng.gamma(6.0, 100.0, n_orders) * np.where(rush, 1.35, 1.0)
+    order_sort = np.argsort(order_ts, kind='stable')
+    return {
+        'ts': order_ts[order_sort],
+        'customer': customer[order_sort],
+        'item': item[order_sort].astype(np.int16),
+        'amount': amount[order_sort].astype(np.float32),
+        'scan_to_order_s': np.minimum(scan_to_order_s[order_sort], 65535).astype(np.uint16),
+        'fulfillment_s': np.minimum(fulfillment_s[order_sort], 65535).astype(np.uint16),
+        'canceled': rng.random(n_orders) < 0.08,
+        'coupon': rng.random(n_orders) < 0.18
+    }
+
+
+def _history_customers(rng, compacted, n_customers, seed):
+    """Per-day scanner and buyer registers, and the customer base, of days that only survive as totals.
+
+    Each day's scans draw customers like the raw tier does, and the day's
+    first ``orders`` draws stand in for the scans that converted, each
+    placed at an hour of the usual profile and worth the day's average order.
+    """
+    register, rank = hll_positions(np.arange(n_customers), seed)
+    scans, orders = compacted['qr_scans'].to_numpy(), compacted['orders'].to_numpy()
+    order_value = np.divide(compacted['revenue'].to_numpy(dtype=np.float64), orders, out=np.zeros(len(orders)),
+                            where=orders > 0)
+    origin = day_to_ts(compacted.index[0].date()) if len(compacted) else 0
+    history = {name: np.zeros((len(compacted), HLL_REGISTERS), dtype=np.uint8) for name in ('scanners', 'buyers')}
+    base = CustomerState(n_customers)
+    for lo in range(0, len(compacted), 365):  # A year of draws at a time bounds the temporary arrays
+        day_scans = scans[lo:lo + 365]
+        day = np.repeat(np.arange(lo, lo + len(day_scans)), day_scans)
+        customer = (n_customers * rng.random(len(day)) ** 2).astype(np.int64)
+        index = day * HLL_REGISTERS + register[customer]
+        np.maximum.at(history['scanners'].reshape(-1), index, rank[customer])
+        position = np.arange(len(day)) - np.repeat(np.cumsum(day_scans) - day_scans, day_scans)
+        bought = np.flatnonzero(position < orders[day])
+        np.maximum.at(history['buyers'].reshape(-1), index[bought], rank[customer[bought]])
+        hour = rng.choice(24, size=len(bought), p=HOURLY_PROFILE)
+        order_ts = origin + day[bought] * DAY_SECONDS + hour * 3600 + rng.integers(0, 3600, len(bought))
+        base.add(customer[bought], order_ts, order_value[day[bought]])
+    return history, base
+
+
+def _history_sketches(rng, compacted, sessions, orders):
+    """Per-day duration sketches for days that only survive as totals, drawn from the raw tier's durations"""
+    fulfilled = ~orders['canceled']
+    measures = {
+        'session_duration': (sessions['duration_s'], compacted['qr_scans'].to_numpy()),  # One session per scan
+        'fulfillment': (orders['fulfillment_s'][fulfilled],
+                        rng.binomial(compacted['orders'].to_numpy(), fulfilled.mean() if len(fulfilled) else 0.0))
+    }
+    history = {}
+    for name, (values, per_day) in measures.items():
+        if len(values):
+            history[name] = rng.multinomial(per_day, sketch_counts(values) / len(values)).astype(np.int32)
+        else:
+            history[name] = np.zeros((len(compacted), SKETCH_BINS), dtype=np.int32)
+    return history
+
+
+def simulate_event_store(days, seed=42, end=None, raw_days=90, n_customers=None, merchant_id='default',
+                         now=None):
+    """Build an EventStore whose last ``raw_days`` days are individual events.
+
+    Events reproduce the daily plan exactly (scan and order counts, revenue),
+    so rollups computed from events agree with the compacted history, whose
+    days get per-day distinct-count registers, duration sketches and
+    customer orders drawn the same way. The
+    customer base defaults to one customer per three raw scans. When ``now``
+    (epoch seconds) is given, events from then on are left to the live feed.
+    """
+    rng = np.random.default_rng(seed)
+    end = end or datetime.date.today()
+    plan = simulate_daily_plan(days, rng, end)
+    raw_days = min(raw_days, days)
+    compacted, recent = plan.iloc[:days - raw_days], plan.iloc[days - raw_days:]
+    raw_start = recent.index[0].date()
+    origin = day_to_ts(raw_start)
+
+    # Scans: spread each day's count over the hourly profile, one session per scan
+    scans_per_day = recent['qr_scans'].to_numpy()
+    n_scans = int(scans_per_day.sum())
+    scan_day = np.repeat(np.arange(raw_days), scans_per_day)
+    hour = rng.choice(24, size=n_scans, p=HOURLY_PROFILE)
+    scan_ts = np.sort(origin + scan_day * DAY_SECONDS + hour * 3600 + rng.integers(0, 3600, n_scans))
+    n_customers = n_customers or max(1000, n_scans // 3)
+    # Squaring a uniform draw skews visits towards a core of regulars
+    customer = (n_customers * rng.random(n_scans) ** 2).astype(np.int32)
+    scans, sessions = _session_columns(rng, scan_ts, customer)
+
+    # Orders: convert exactly the planned number of each day's sessions
+    orders_per_day = recent['orders'].to_numpy()
+    day_first = np.concatenate(([0], np.cumsum(scans_per_day)[:-1]))
+    by_day = np.lexsort((rng.random(n_scans), scan_day))
+    rank = np.arange(n_scans) - day_first[scan_day[by_day]]
+    converted = np.sort(by_day[rank < orders_per_day[scan_day[by_day]]])
+    n_orders = len(converted)
+
+    order_day = scan_day[converted]
+    scan_to_order_s = rng.gamma(3.0, 120.0, n_orders)
+    day_end = origin + (order_day + 1) * DAY_SECONDS - 1
+    order_ts = np.minimum(scan_ts[converted] + scan_to_order_s.astype(np.int64), day_end)
+
+    item, amount = _draw_items(rng, n_orders)
+    sessions['item'][converted] = item
+    # Rescale each day's orders so they add up to the planned revenue
+    planned = recent['revenue'].to_numpy()
+    simulated = np.bincount(order_day, weights=amount, minlength=raw_days)
+    amount *= np.divide(planned, simulated, out=np.zeros(raw_days), where=simulated > 0)[order_day]
+    orders = _order_columns(rng, order_ts, customer[converted], item, amount, scan_to_order_s)
+    history, customer_base = _history_customers(rng, compacted, n_customers, zlib.crc32(merchant_id.encode()))
+    history.update(_history_sketches(rng, compacted, sessions, orders))
+
+    watermark = day_to_ts(end + datetime.timedelta(days=1))
+    if now is not None and now < watermark:
+        watermark = now
+        scans, sessions, orders = (
+            {name: values[:np.searchsorted(columns['ts'], now)] for name, values in columns.items()}
+            for columns in (scans, sessions, orders)
+        )
+
+    item_category, categories = pd.factorize(np.array([entry[1] for entry in CATALOG]))
+    return EventStore(
+        scans=EventTable(**scans),
+        sessions=EventTable(**sessions),
+        orders=EventTable(**orders),
+        compacted=compacted,
+        raw_start=raw_start,
+        end=end,
+        items=np.array([entry[0] for entry in CATALOG]),
+        item_category=item_category.astype(np.int16),
+        categories=np.asarray(categories),
+        n_customers=n_customers,
+        merchant_id=merchant_id,
+        watermark=watermark,
+        history=history,
+        customer_base=customer_base
+    )
+
+
+class SyntheticFeed:
+    """Local stand-in for the POS and QR services.
+
+    ``poll(since_ts, until_ts)`` returns the events that happened in that
+    interval, drawn at the store's recent daily rate and conversion.
+    """
+
+    def __init__(self, store, seed=None):
+        self.rng = np.random.default_rng(seed)
+        recent = store.daily_frame().iloc[-8:-1]
+        self.daily_scans = float(recent['qr_scans'].mean())
+        self.conversion = float(recent['orders'].sum() / max(recent['qr_scans'].sum(), 1))
+        self.order_value = float(recent['revenue'].sum() / max(recent['orders'].sum(), 1))
+        self.n_customers = store.n_customers
+        _, base_amount = _draw_items(np.random.default_rng(0), 10000)
+        self.amount_scale = self.order_value / base_amount.mean()
+
+    def poll(self, since_ts, until_ts):
+        """Events with since_ts <= ts < until_ts, as columns per table"""
+        rng = self.rng
+        # Expected scans: the daily rate weighted by the hourly profile over the interval
+        seconds = np.arange(since_ts, until_ts)
+        weights = HOURLY_PROFILE[seconds % DAY_SECONDS // 3600] / 3600
+        n_scans = rng.poisson(self.daily_scans * weights.sum()) if len(seconds) else 0
+        scan_ts = np.sort(rng.choice(seconds, size=n_scans, p=weights / weights.sum())) if n_scans else \
+            np.empty(0, dtype=np.int64)
+        customer = (self.n_customers * rng.random(n_scans) ** 2).astype(np.int32)
+        scans, sessions = _session_columns(rng, scan_ts, customer)
+
+        # Keep only orders placed inside the interval so batches never overlap
+        converted = np.flatnonzero(rng.random(n_scans) < self.conversion)
+        scan_to_order_s = rng.gamma(3.0, 120.0, len(converted))
+        order_ts = scan_ts[converted] + scan_to_order_s.astype(np.int64)
+        placed = order_ts < until_ts
+        converted, scan_to_order_s, order_ts = converted[placed], scan_to_order_s[placed], order_ts[placed]
+        item, amount = _draw_items(rng, len(converted))
+        sessions['item'][converted] = item
+        orders = _order_columns(rng, order_ts, customer[converted], item, amount * self.amount_scale,
+                                scan_to_order_s)
+        return {'scans': scans, 'sessions': sessions, 'orders': orders, 'watermark': until_ts}
+
+
+# ---------- Live Updates ----------
+class LiveUpdater:
+    """Pulls feed batches past the store's watermark into the store and its rollup.
+
+    Shared by every session; the lock makes sure each interval is fetched
+    and folded in exactly once.
+    """
+
+    def __init__(self, store, rollup, feed):
+        self.store = store
+        self.rollup = rollup
+        self.feed = feed
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def refresh(self, now):
+        """Ingest events up to ``now`` and return the data version"""
+        with self._lock:
+            until = min(now, day_to_ts(self.store.end + datetime.timedelta(days=1)))
+            if until > self.store.watermark:
+                dates, totals = self.store.append(self.feed.poll(self.store.watermark, until))
+                self.rollup.add(dates, totals)
+                self.version += 1
+            return self.version
@@ -0,0 +1,184 @@
+import datetime
+import io
+import os
+import threading
+import uuid
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from jbujb_events import day_to_ts
+from jbujb_trace import count
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+# ---------- Export Options ----------
+EXPORT_DATASETS = ('orders', 'sessions', 'scans', 'hourly', 'daily')
+EXPORT_FORMATS = ('csv', 'ndjson') + (('parquet',) if pq is not None else ())
+EXPORT_COMPRESSIONS = (None, 'gzip') + (('zstd',) if zstandard is not None else ())
+CHUNK_ROWS = 65536  # Rows encoded at a time; bounds export memory
+
+EXTENSIONS = {'csv': '.csv', 'ndjson': '.ndjson', 'parquet': '.parquet', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+# ---------- Row Chunks ----------
+def _timestamps(ts):
+    return ts.astype('datetime64[s]')
+
+
+def iter_event_chunks(store, dataset, start_date, end_date, chunk_rows=CHUNK_ROWS):
+    """Readable frames of one raw event table for the window, chunk_rows at a time"""
+    table = getattr(store, dataset)
+    lo, hi = table.span(*store.window_ts(start_date, end_date))
+    count('rows_processed', hi - lo, source='export')
+    for offset in range(lo, hi, chunk_rows):
+        columns = dict(table.rows(offset, min(offset + chunk_rows, hi)))
+        chunk = {'time': _timestamps(columns.pop('ts'))}
+        chunk['customer'] = np.char.add('CUST-', np.char.zfill(columns.pop('customer').astype(str), 6))
+        if 'item' in columns:
+            # Sessions that bounced before opening an item have item -1 and get empty labels
+            item = columns.pop('item')
+            opened, code = item >= 0, np.maximum(item, 0)
+            chunk['item'] = np.where(opened, store.items[code], '')
+            chunk['category'] = np.where(opened, store.categories[store.item_category[code]], '')
+        if 'amount' in columns:
+            columns['amount'] = columns['amount'].astype(np.float64).round(2)
+        chunk.update(columns)
+        yield pd.DataFrame(chunk)
+
+
+def iter_frame_chunks(frame, chunk_rows=CHUNK_ROWS):
+    """Positional slices of a rollup frame, with its time index as a column"""
+    for offset in range(0, len(frame), chunk_rows):
+        yield frame.iloc[offset:offset + chunk_rows].rename_axis('time').reset_index()
+
+
+def iter_dataset_chunks(store, rollup, dataset, start_date, end_date, chunk_rows=CHUNK_ROWS):
+    if dataset == 'daily':
+        return iter_frame_chunks(rollup.window(start_date, end_date), chunk_rows)
+    if dataset == 'hourly':
+        hourly = store.pyramid.levels['hour']
+        return iter_frame_chunks(hourly.frame(day_to_ts(max(start_date, store.raw_start)),
+                                              day_to_ts(end_date + datetime.timedelta(days=1))), chunk_rows)
+    return iter_event_chunks(store, dataset, start_date, end_date, chunk_rows)
+
+
+# ---------- Encoders ----------
+def encode_csv(chunks):
+    for k, chunk in enumerate(chunks):
+        yield chunk.to_csv(index=False, header=k == 0).encode()
+
+
+def encode_ndjson(chunks):
+    for chunk in chunks:
+        yield chunk.to_json(orient='records', lines=True, date_format='iso', date_unit='s').encode()
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose buffered bytes are handed out after each row group"""
+
+    def __init__(self):
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data, self._parts = b''.join(self._parts), []
+        return data
+
+
+def encode_parquet(chunks):
+    """One Parquet row group per chunk, yielded as soon as it is written"""
+    sink = _DrainableSink()
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+ENCODERS = {'csv': encode_csv, 'ndjson': encode_ndjson, 'parquet': encode_parquet}
+
+
+def compress(blocks, compression):
+    """Stream-compress byte blocks with gzip or zstd (None passes them through)"""
+    if compression is None:
+        yield from blocks
+        return
+    if compression == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    else:
+        compressor = zstandard.ZstdCompressor().compressobj()
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(store, rollup, dataset, start_date, end_date, fmt='csv', compression=None,
+                  chunk_rows=CHUNK_ROWS):
+    """Encoded, compressed export of one dataset for the window, as a generator of byte blocks"""
+    chunks = iter_dataset_chunks(store, rollup, dataset, start_date, end_date, chunk_rows)
+    return compress(ENCODERS[fmt](chunks), compression)
+
+
+def export_file_name(dataset, start_date, end_date, fmt, compression=None, scope=None):
+    """File name of an export; ``scope`` (e.g. 'chain' or 'flagship') says whose data it holds"""
+    prefix = f"jbujb_{scope}" if scope else "jbujb"
+    return f"{prefix}_{dataset}_{start_date}_{end_date}{EXTENSIONS[fmt]}{EXTENSIONS.get(compression, '')}"
+
+
+# ---------- Export Jobs ----------
+class ExportJob:
+    """Background export of one dataset to a file, independent of script reruns"""
+
+    def __init__(self, store, rollup, dataset, start_date, end_date, fmt, compression, directory, scope=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.file_name = export_file_name(dataset, start_date, end_date, fmt, compression, scope)
+        self.path = os.path.join(directory, f"{self.id}-{self.file_name}")
+        self.bytes_written = 0
+        self.error = None
+        self.done = False
+        self._stream = export_stream(store, rollup, dataset, start_date, end_date, fmt, compression)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                for block in self._stream:
+                    f.write(block)
+                    self.bytes_written += len(block)
+            os.replace(tmp_path, self.path)
+        except Exception as exc:  # Reported through the job's status
+            self.error = exc
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        finally:
+            self.done = True
@@ -0,0 +1,123 @@
+import datetime
+import itertools
+import threading
+
+import numpy as np
+import pandas as pd
+
+# ---------- Holt-Winters ----------
+SEASON = 7  # Weekly seasonality of daily series
+FORECAST_DAYS = 14
+BAND_Z = 1.96  # 95% prediction bands
+# Smoothing parameters tried for every series; each store keeps the one with the lowest one-step error
+SMOOTHING_GRID = np.array(list(itertools.product((0.1, 0.3, 0.5), (0.01, 0.05), (0.05, 0.2))))
+
+
+class HoltWinters:
+    """Additive Holt-Winters with weekly seasonality for a stores × days array, over a parameter grid.
+
+    State is (parameter sets, stores) so every series and every candidate
+    parameter set advances together; ``update`` is O(1) per store and set.
+    One-step-ahead squared errors are accumulated per set, so the best
+    parameters (and the error variance behind the bands) are always known.
+    """
+
+    def __init__(self, history, grid=SMOOTHING_GRID):
+        history = np.asarray(history, dtype=np.float64)
+        if history.shape[1] < 2 * SEASON:
+            raise ValueError(f"Holt-Winters needs at least {2 * SEASON} days of history")
+        k, n = len(grid), len(history)
+        self.alpha, self.beta, self.gamma = (grid[:, j, None] for j in range(3))
+        first, second = history[:, :SEASON].mean(axis=1), history[:, SEASON:2 * SEASON].mean(axis=1)
+        self.level = np.broadcast_to(first, (k, n)).copy()
+        self.trend = np.broadcast_to((second - first) / SEASON, (k, n)).copy()
+        initial_season = (history[:, :SEASON] - first[:, None]).T[:, None, :]
+        self.season = np.broadcast_to(initial_season, (SEASON, k, n)).copy()
+        self.sse = np.zeros((k, n))
+        self.steps = 0
+        for day in range(history.shape[1]):
+            self.update(history[:, day])
+
+    def update(self, values):
+        """Fold in the next day's value of every store"""
+        pos = self.steps % SEASON
+        season = self.season[pos]
+        error = values - (self.level + self.trend + season)
+        self.sse += error ** 2
+        level = self.alpha * (values - season) + (1 - self.alpha) * (self.level + self.trend)
+        self.trend = self.beta * (level - self.level) + (1 - self.beta) * self.trend
+        self.season[pos] = self.gamma * (values - level) + (1 - self.gamma) * season
+        self.level = level
+        self.steps += 1
+
+    def forecast(self, horizon=FORECAST_DAYS):
+        """(mean, lower, upper), each stores × horizon, from every store's best parameter set"""
+        n = self.level.shape[1]
+        best = self.sse.argmin(axis=0)
+        stores = np.arange(n)
+        steps = np.arange(1, horizon + 1)
+        level, trend = self.level[best, stores], self.trend[best, stores]
+        season = self.season[(self.steps + steps - 1) % SEASON][:, best, stores].T
+        mean = level[:, None] + steps[None, :] * trend[:, None] + season
+        # h-step error variance: sigma^2 (1 + sum_{j<h} c_j^2), c_j = alpha (1 + j beta) + gamma [j % 7 == 0]
+        alpha, beta, gamma = self.alpha[best, 0], self.beta[best, 0], self.gamma[best, 0]
+        j = steps[None, :-1]
+        c = alpha[:, None] * (1 + j * beta[:, None]) + gamma[:, None] * (j % SEASON == 0)
+        growth = np.concatenate((np.ones((n, 1)), 1 + np.cumsum(c ** 2, axis=1)), axis=1)
+        band = BAND_Z * np.sqrt(self.sse[best, stores] / self.steps)[:, None] * np.sqrt(growth)
+        return mean, np.maximum(mean - band, 0), mean + band
+
+
+# ---------- Rollup Forecasts ----------
+class RollupForecaster:
+    """Holt-Winters state of a daily rollup's columns, fitted in the background and kept current.
+
+    Only complete days are fitted; ``advance`` folds in days that completed
+    since the last call (from whichever rollup is current) without refitting.
+    """
+
+    def __init__(self, columns=('qr_scans', 'orders')):
+        self.columns = columns
+        self.models = None
+        self.through = None  # Last fitted day
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.models is not None
+
+    def start(self, rollup, through):
+        """Fit every column up to and including `through` on a background thread"""
+        threading.Thread(target=self._fit, args=(rollup, through), daemon=True).start()
+        return self
+
+    def _fit(self, rollup, through):
+        try:
+            window = rollup.window(rollup.start, through)
+            models = {col: HoltWinters(window[col].to_numpy()[None, :]) for col in self.columns}
+            with self._lock:
+                self.models, self.through = models, through
+        except Exception as exc:  # Reported next to the chart
+            self.error = exc
+
+    def advance(self, rollup, through):
+        """Fold in completed days after the fitted state, one O(1) update each"""
+        with self._lock:
+            if not self.ready or through <= self.through:
+                return
+            window = rollup.window(self.through + datetime.timedelta(days=1), through)
+            for col, model in self.models.items():
+                for value in window[col].to_numpy():
+                    model.update(np.array([value], dtype=np.float64))
+            self.through = through
+
+    def frame(self, horizon=FORECAST_DAYS):
+        """Forecast rows for the days after the fitted state: <col>, <col>_lower and <col>_upper"""
+        with self._lock:
+            columns = {}
+            for col, model in self.models.items():
+                mean, lower, upper = model.forecast(horizon)
+                columns.update({col: mean[0], f"{col}_lower": lower[0], f"{col}_upper": upper[0]})
+            start = self.through + datetime.timedelta(days=1)
+        return pd.DataFrame(columns, index=pd.date_range(start, periods=horizon, freq='D'))
@@ -0,0 +1,86 @@
+import pandas as pd
+
+from jbujb_config import CHAIN_RAW_EVENT_DAYS, CHAIN_STORES, DATA_DIR, HISTORY_DAYS, RAW_EVENT_DAYS, SEED
+from jbujb_data import build_kpi_metrics, compare_periods, event_kpis
+from jbujb_storage import HAVE_ARROW, open_or_build_event_store
+
+# ---------- Sources ----------
+# jbujb_chain and jbujb_sql are imported on use, so a single-store client never loads them
+
+
+def open_store(as_of, merchant_id='default', seed=SEED, now=None, root=DATA_DIR):
+    """Event store of the flagship ('default') or of one chain location, persisted under root when possible"""
+    root = root if HAVE_ARROW else None
+    if merchant_id == 'default':
+        return open_or_build_event_store('default', as_of, seed, HISTORY_DAYS, RAW_EVENT_DAYS, root, now=now)
+    from jbujb_chain import merchant_seed
+    return open_or_build_event_store(merchant_id, as_of, merchant_seed(merchant_id), HISTORY_DAYS,
+                                     CHAIN_RAW_EVENT_DAYS, root)
+
+
+def open_sql_backend(path, store):
+    """Pooled SQL backend at path (SQLite, or DuckDB for .duckdb files), synced with store"""
+    from jbujb_sql import SQLBackend
+    backend = SQLBackend(path, engine='duckdb' if path.endswith('.duckdb') else 'sqlite')
+    backend.sync(store)
+    return backend
+
+
+def open_chain(as_of, n_stores=CHAIN_STORES, root=DATA_DIR):
+    """Merged aggregate of every chain location"""
+    from jbujb_chain import build_chain_aggregate, chain_merchant_ids
+    return build_chain_aggregate(chain_merchant_ids(n_stores), as_of, HISTORY_DAYS, CHAIN_RAW_EVENT_DAYS,
+                                 root if HAVE_ARROW else None)
+
+
+# ---------- Reports ----------
+# Plain-dict views of the dashboard's sections for machine clients (see jbujb_api)
+def frame_records(frame):
+    """Rows of a frame as dicts; a time index becomes a 'time' column"""
+    if isinstance(frame.index, pd.DatetimeIndex):
+        frame = frame.rename_axis('time').reset_index()
+    return frame.to_dict('records')
+
+
+def kpi_report(rollup, source, start_date, end_date, baseline='previous_period', today_metrics=None):
+    """Window metrics, the baseline's metrics and the formatted KPI grid.
+
+    ``today_metrics`` (e.g. a stream's running sums) replace the event KPIs,
+    as the dashboard does for a streamed "Today" window.
+    """
+    data = {**source.kpis(start_date, end_date), **rollup.period_metrics(start_date, end_date)}
+    if today_metrics:
+        data.update(today_metrics)
+    comparison = None
+    if baseline is not None:
+        comparison = compare_periods(rollup, start_date, end_date, extra_metrics=event_kpis(source))[baseline]
+    return {
+        'metrics': data,
+        'baseline': baseline,
+        'comparison': comparison,
+        'kpis': build_kpi_metrics(data, comparison)
+    }
+
+
+def trend_report(source, start_date, end_date):
+    """Trend rows at the coarsest rollup level that still gives enough points"""
+    level, trend = source.pyramid.trend(start_date, end_date)
+    return {'level': level, 'rows': frame_records(trend)}
+
+
+def menu_report(section, start_date, end_date, n=5):
+    """Best-selling items and category totals of the window"""
+    return {
+        'top_items': frame_records(section.top_items(start_date, end_date, n)),
+        'categories': frame_records(section.category_metrics(start_date, end_date)),
+        'item_count': section.item_count()
+    }
+
+
+def customer_report(section, source, start_date, end_date, n=5):
+    """Top customers, RFM segments, and retention metrics from the cohort matrix and distinct counts"""
+    return {
+        'top_customers': frame_records(section.top_customers(start_date, end_date, n)),
+        'segments': frame_records(section.customer_segments(start_date, end_date)),
+        'retention': {**source.cohorts.metrics(start_date, end_date), **source.distinct.metrics(start_date, end_date)}
+    }
@@ -0,0 +1,286 @@
+import collections
+import contextlib
+import datetime
+import queue
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from jbujb_data import ITEM_SORT_COLUMNS, item_frame
+from jbujb_events import PAST_CUSTOMER_STATES, CustomerState, EventStore, day_to_ts, ts_to_day
+
+# ---------- Schema ----------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    merchant_id TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    PRIMARY KEY (merchant_id, item_id)
+);
+CREATE TABLE IF NOT EXISTS orders (
+    merchant_id TEXT NOT NULL,
+    ts BIGINT NOT NULL,
+    customer_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    amount REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_merchant_ts ON orders (merchant_id, ts);
+CREATE INDEX IF NOT EXISTS orders_merchant_item ON orders (merchant_id, item_id);
+CREATE TABLE IF NOT EXISTS item_views (
+    merchant_id TEXT NOT NULL,
+    ts BIGINT NOT NULL,
+    item_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS item_views_merchant_ts ON item_views (merchant_id, ts);
+CREATE TABLE IF NOT EXISTS customer_base (
+    merchant_id TEXT NOT NULL,
+    customer_id INTEGER NOT NULL,
+    first_ts BIGINT NOT NULL,
+    last_ts BIGINT NOT NULL,
+    orders INTEGER NOT NULL,
+    spend REAL NOT NULL,
+    PRIMARY KEY (merchant_id, customer_id)
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    merchant_id TEXT PRIMARY KEY,
+    last_ts BIGINT NOT NULL
+);
+"""
+
+
+# SQL sort keys, in ITEM_SORT_COLUMNS order (computed from the unrounded totals)
+ITEM_SORT_EXPRESSIONS = (
+    "orders",
+    "revenue",
+    "views",
+    "CASE WHEN views > 0 THEN orders * 100.0 / views ELSE 0 END",
+    "CASE WHEN orders > 0 THEN revenue / orders ELSE 0 END",
+)
+
+
+# ---------- Connection Pool ----------
+class ConnectionPool:
+    """Fixed-size pool of connections to one database file, safe to share across sessions"""
+
+    def __init__(self, path, size=4, engine='sqlite'):
+        self.path = path
+        self.engine = engine
+        self._idle = queue.Queue(maxsize=size)
+        for _ in range(size):
+            self._idle.put(self._connect())
+
+    def _connect(self):
+        if self.engine == 'duckdb':
+            import duckdb  # Optional engine, only needed when selected
+            return duckdb.connect(self.path)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        # WAL lets readers in other sessions proceed while a load is writing
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self):
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+
+# ---------- SQL Backend ----------
+class SQLBackend:
+    """File-based SQL backend answering each dashboard section with one aggregated query.
+
+    Exposes the same section methods as EventStore, so either can back the
+    menu and customer sections.
+    """
+
+    def __init__(self, path, merchant_id='default', pool_size=4, engine='sqlite'):
+        self.pool = ConnectionPool(path, pool_size, engine)
+        self.merchant_id = merchant_id
+        self._states = collections.OrderedDict()  # (end date, watermark) -> CustomerState
+        self._states_lock = threading.Lock()
+        with self.pool.connection() as conn:
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+            conn.commit()
+
+    def _watermark_ts(self):
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT last_ts FROM watermarks WHERE merchant_id = ?",
+                               [self.merchant_id]).fetchone()
+        return row[0] if row else None
+
+    def watermark(self):
+        """Date of the store watermark at the last load or sync, or None before the first load"""
+        last_ts = self._watermark_ts()
+        return ts_to_day(last_ts) if last_ts is not None else None
+
+    def _event_rows(self, store, since=None):
+        """Order and item view rows of the store's raw tables, all of them or those at or after ``since``"""
+        orders, sessions = store.orders, store.sessions
+        if since is not None:
+            orders = orders.view(since, store.watermark + 1)
+            sessions = sessions.view(since, store.watermark + 1)
+        rows = zip([self.merchant_id] * len(orders['ts']), orders['ts'].tolist(), orders['customer'].tolist(),
+                   orders['item'].tolist(), orders['amount'].tolist())
+        viewed = sessions['item'] >= 0
+        views = zip([self.merchant_id] * int(viewed.sum()), sessions['ts'][viewed].tolist(),
+                    sessions['item'][viewed].tolist())
+        return rows, views
+
+    def load_event_store(self, store: EventStore):
+        """Replace this merchant's rows with the store's raw orders, item views, menu and customer base"""
+        rows, views = self._event_rows(store)
+        items = [(self.merchant_id, item_id, str(name), str(store.categories[category]))
+                 for item_id, (name, category) in enumerate(zip(store.items, store.item_category))]
+        base = store.customer_base
+        customer = np.flatnonzero(base.orders)
+        customers = zip([self.merchant_id] * len(customer), customer.tolist(), base.first_ts[customer].tolist(),
+                        base.last_ts[customer].tolist(), base.orders[customer].tolist(), base.spend[customer].tolist())
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM orders WHERE merchant_id = ?", [self.merchant_id])
+            conn.execute("DELETE FROM customer_base WHERE merchant_id = ?", [self.merchant_id])
+            conn.execute("DELETE FROM items WHERE merchant_id = ?", [self.merchant_id])
+            conn.execute("DELETE FROM item_views WHERE merchant_id = ?", [self.merchant_id])
+            conn.execute("DELETE FROM watermarks WHERE merchant_id = ?", [self.merchant_id])
+            conn.executemany("INSERT INTO items VALUES (?, ?, ?, ?)", items)
+            conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?)", rows)
+            conn.executemany("INSERT INTO item_views VALUES (?, ?, ?)", views)
+            conn.executemany("INSERT INTO customer_base VALUES (?, ?, ?, ?, ?, ?)", customers)
+            conn.execute("INSERT INTO watermarks VALUES (?, ?)", [self.merchant_id, int(store.watermark)])
+            conn.commit()
+
+    def sync(self, store: EventStore):
+        """Bring this merchant's rows up to the store's watermark.
+
+        Events the store ingested since the last sync are inserted; rows at the
+        old watermark second are replaced, since more events may have arrived
+        within it. Once the store has compacted orders the database still holds
+        as raw rows (they are now in its customer base), everything is reloaded.
+        """
+        last_ts = self._watermark_ts()
+        with self.pool.connection() as conn:
+            first_ts, = conn.execute("SELECT MIN(ts) FROM orders WHERE merchant_id = ?", [self.merchant_id]).fetchone()
+        if last_ts is None or (first_ts is not None and first_ts < day_to_ts(store.raw_start)):
+            self.load_event_store(store)
+            return
+        if last_ts >= store.watermark:
+            return  # Already current (or synced by a process further ahead)
+        rows, views = self._event_rows(store, since=last_ts)
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM orders WHERE merchant_id = ? AND ts >= ?", [self.merchant_id, last_ts])
+            conn.execute("DELETE FROM item_views WHERE merchant_id = ? AND ts >= ?", [self.merchant_id, last_ts])
+            conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?)", rows)
+            conn.executemany("INSERT INTO item_views VALUES (?, ?, ?)", views)
+            conn.execute("UPDATE watermarks SET last_ts = ? WHERE merchant_id = ?",
+                         [int(store.watermark), self.merchant_id])
+            conn.commit()
+
+    def _query(self, sql, params):
+        with self.pool.connection() as conn:
+            cursor = conn.execute(sql, params)
+            columns = [desc[0] for desc in cursor.description]
+            return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    def _window(self, start_date, end_date):
+        return day_to_ts(start_date), day_to_ts(end_date + datetime.timedelta(days=1))
+
+    def item_count(self):
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM items WHERE merchant_id = ?", [self.merchant_id]).fetchone()[0]
+
+    def item_page(self, start_date, end_date, sort_by="Orders", descending=True, page=0, page_size=20):
+        """One page of every menu item, sorted and sliced by the database (ties by catalog order)"""
+        sort_expr = ITEM_SORT_EXPRESSIONS[ITEM_SORT_COLUMNS.index(sort_by)]
+        window = [self.merchant_id, *self._window(start_date, end_date)]
+        frame = self._query(f"""
+            WITH o AS (
+                SELECT item_id, COUNT(*) AS orders, SUM(amount) AS revenue
+                FROM orders
+                WHERE merchant_id = ? AND ts >= ? AND ts < ?
+                GROUP BY item_id
+            ), v AS (
+                SELECT item_id, COUNT(*) AS views
+                FROM item_views
+                WHERE merchant_id = ? AND ts >= ? AND ts < ?
+                GROUP BY item_id
+            ), t AS (
+                SELECT i.item_id, i.name, i.category, COALESCE(v.views, 0) AS views,
+                       COALESCE(o.orders, 0) AS orders, COALESCE(o.revenue, 0) AS revenue
+                FROM items i
+                LEFT JOIN o ON o.item_id = i.item_id
+                LEFT JOIN v ON v.item_id = i.item_id
+                WHERE i.merchant_id = ?
+            )
+            SELECT name, category, views, orders, revenue
+            FROM t
+            ORDER BY {sort_expr} {'DESC' if descending else 'ASC'}, item_id
+            LIMIT ? OFFSET ?
+        """, [*window, *window, self.merchant_id, page_size, page * page_size])
+        return item_frame(frame['name'].to_numpy(), frame['category'].to_numpy(), frame['views'].to_numpy(),
+                          frame['orders'].to_numpy(), frame['revenue'].to_numpy(dtype=float))
+
+    def top_items(self, start_date, end_date, n=5):
+        """Best-selling items of the window"""
+        frame = self.item_page(start_date, end_date, "Orders", True, 0, n)
+        return frame[frame["Orders"] > 0].reset_index(drop=True)
+
+    def category_metrics(self, start_date, end_date):
+        """Orders and revenue per menu category for the window"""
+        return self._query("""
+            SELECT i.category AS "Category", COUNT(*) AS "Orders",
+                   ROUND(SUM(o.amount)) AS "Revenue (MAD)",
+                   ROUND(SUM(o.amount) / COUNT(*), 1) AS "Avg Order Value"
+            FROM orders o
+            JOIN items i ON i.merchant_id = o.merchant_id AND i.item_id = o.item_id
+            WHERE o.merchant_id = ? AND o.ts >= ? AND o.ts < ?
+            GROUP BY i.category
+            ORDER BY MIN(i.item_id)
+        """, [self.merchant_id, *self._window(start_date, end_date)])
+
+    def customer_state(self, end_date):
+        """Per-customer lifetime aggregates up to end_date: the base and the loaded orders reduced by one GROUP BY.
+
+        States are memoized per end date until the next load moves the watermark,
+        so the customer table and segment chart of a rerun share one query.
+        """
+        key = end_date, self._watermark_ts()
+        with self._states_lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+                return state
+        frame = self._query("""
+            SELECT customer_id, MIN(first_ts) AS first_ts, MAX(last_ts) AS last_ts, SUM(orders) AS orders,
+                   SUM(spend) AS spend
+            FROM (
+                SELECT customer_id, first_ts, last_ts, orders, spend
+                FROM customer_base
+                WHERE merchant_id = ?
+                UNION ALL
+                SELECT customer_id, ts, ts, 1, amount
+                FROM orders
+                WHERE merchant_id = ? AND ts < ?
+            ) AS lifetime
+            GROUP BY customer_id
+        """, [self.merchant_id, self.merchant_id, self._window(end_date, end_date)[1]])
+        state = CustomerState.from_totals(*(frame[col].to_numpy() for col in
+                                            ('customer_id', 'first_ts', 'last_ts', 'orders', 'spend')))
+        with self._states_lock:
+            self._states[key] = state
+            while len(self._states) > PAST_CUSTOMER_STATES:
+                self._states.popitem(last=False)
+        return state
+
+    def top_customers(self, start_date, end_date, n=5):
+        """Highest lifetime spenders active in the window, with their RFM scores"""
+        return self.customer_state(end_date).top_customers(*self._window(start_date, end_date), n)
+
+    def customer_segments(self, start_date, end_date):
+        """Customer counts and average lifetime spend per RFM segment"""
+        return self.customer_state(end_date).segments(*self._window(start_date, end_date))
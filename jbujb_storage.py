@@ -0,0 +1,278 @@
+import datetime
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from jbujb_events import (DAY_SECONDS, CustomerState, EventStore, EventTable, SyntheticFeed, day_to_ts,
+                          simulate_event_store)
+
+try:
+    import pyarrow as pa
+except ImportError:  # Persistence is optional; the dashboard falls back to in-memory data
+    pa = None
+
+HAVE_ARROW = pa is not None
+
+# ---------- On-Disk Layout ----------
+# <root>/merchant=<id>/meta.json
+# <root>/merchant=<id>/rollups/daily.arrow
+# <root>/merchant=<id>/rollups/distinct.arrow  (HyperLogLog registers per day)
+# <root>/merchant=<id>/rollups/sketches.arrow  (duration sketches per day)
+# <root>/merchant=<id>/rollups/customers.arrow  (lifetime totals per customer before the raw tier)
+# <root>/merchant=<id>/events/<table>/month=<YYYY-MM>.arrow
+EVENT_TABLES = ('scans', 'sessions', 'orders')
+STORE_FORMAT = 5  # Bumped when event columns or rollup files change; older stores are rebuilt
+
+
+def merchant_dir(root, merchant_id):
+    return os.path.join(root, f"merchant={merchant_id}")
+
+
+def _month_keys(start_date, end_date):
+    """Every calendar month touched by an inclusive date window"""
+    return np.arange(np.datetime64(start_date, 'M'), np.datetime64(end_date, 'M') + 1)
+
+
+def _month_start_ts(months):
+    return months.astype('datetime64[D]').astype(np.int64) * DAY_SECONDS
+
+
+def _arrow_column(values):
+    if values.dtype == np.bool_:
+        values = values.view(np.uint8)
+    if values.ndim == 2:
+        # One fixed-size list per row, e.g. a day's HyperLogLog registers
+        return pa.FixedSizeListArray.from_arrays(pa.array(values.reshape(-1)), values.shape[1])
+    return values
+
+
+def _write_arrow(path, columns, compression=None):
+    """Write numpy columns (1-D, or 2-D with one row per entry) as one Arrow IPC batch.
+
+    Uncompressed files are mmap friendly; ``compression`` ('zstd' or 'lz4')
+    suits files that are read whole anyway.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.table({name: _arrow_column(values) for name, values in columns.items()})
+    # Write to a temporary file and rename so a crash never leaves a torn partition
+    tmp_path = path + '.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression=compression)) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def _read_arrow(path, dtypes):
+    """Memory-map an Arrow IPC file and expose its columns as zero-copy numpy views (unless compressed)"""
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    columns = {}
+    for name, dtype in dtypes.items():
+        column = table.column(name)
+        if pa.types.is_fixed_size_list(column.type):
+            width = column.type.list_size
+            column = pa.chunked_array([chunk.flatten() for chunk in column.chunks], column.type.value_type)
+            columns[name] = _read_values(column, dtype).reshape(-1, width)
+        else:
+            columns[name] = _read_values(column, dtype)
+    return columns
+
+
+def _read_values(column, dtype):
+    if column.num_chunks == 1:
+        values = column.chunk(0).to_numpy(zero_copy_only=True)
+    elif column.num_chunks:
+        values = column.combine_chunks().to_numpy()  # Written in several record batches: one copy
+    else:
+        values = np.empty(0, dtype=np.uint8 if dtype == 'bool' else dtype)
+    return values.view(np.bool_) if dtype == 'bool' else values
+
+
+def _write_summaries(path, cube):
+    """Per-day summary rows of every measure of a cube, history included, from its first day"""
+    first = np.datetime64(cube.first, 'D').astype(np.int64)
+    rows = {name: cube.daily(name) for name in cube.counts}
+    day = np.arange(first, first + len(next(iter(rows.values()))), dtype=np.int32)
+    # Summaries are read whole when a store opens, so they are compressed rather than mapped
+    _write_arrow(path, {'day': day, **rows}, compression='zstd')
+
+
+def _read_history(path, dtypes, before):
+    """Per-day summary rows of the days before ``before``, as a cube history"""
+    rows = _read_arrow(path, {'day': 'int32', **dtypes})
+    day = rows.pop('day')
+    lo = np.searchsorted(day, np.datetime64(before, 'D').astype(np.int64))
+    return {name: values[:lo] for name, values in rows.items()}
+
+
+CUSTOMER_COLUMNS = {'customer': 'int64', 'first_ts': 'int64', 'last_ts': 'int64', 'orders': 'int64',
+                    'spend': 'float64'}
+
+
+def _write_customers(path, state):
+    """Totals of every customer with orders"""
+    customer = np.flatnonzero(state.orders)
+    _write_arrow(path, {'customer': customer, 'first_ts': state.first_ts[customer], 'last_ts': state.last_ts[customer],
+                        'orders': state.orders[customer], 'spend': state.spend[customer]}, compression='zstd')
+
+
+# ---------- Save / Load ----------
+def save_event_store(store, root):
+    """Persist raw events (partitioned by month), the full daily rollup, per-day summaries and the customer base"""
+    base = merchant_dir(root, store.merchant_id)
+    months = _month_keys(store.raw_start, store.end)
+    bounds = _month_start_ts(months[1:])
+
+    dtypes = {}
+    for name in EVENT_TABLES:
+        table = getattr(store, name)
+        dtypes[name] = {col: str(dtype) for col, dtype in table.dtypes.items()}
+        columns = table.columns
+        splits = np.searchsorted(columns['ts'], bounds, 'left')
+        directory = os.path.join(base, 'events', name)
+        written = set()
+        for month, lo, hi in zip(months, np.concatenate(([0], splits)), np.concatenate((splits, [len(table)]))):
+            written.add(f"month={month}.arrow")
+            _write_arrow(os.path.join(directory, f"month={month}.arrow"),
+                         {col: values[lo:hi] for col, values in columns.items()})
+        # Months compacted away live on in the rollups and the customer base
+        for file_name in set(os.listdir(directory)) - written:
+            if file_name.startswith('month='):
+                os.remove(os.path.join(directory, file_name))
+
+    daily = store.daily_frame()
+    _write_arrow(os.path.join(base, 'rollups', 'daily.arrow'), {
+        'day': (daily.index.values.astype('datetime64[D]').astype(np.int64)).astype(np.int32),
+        'qr_scans': daily['qr_scans'].to_numpy(),
+        'orders': daily['orders'].to_numpy(),
+        'revenue': daily['revenue'].to_numpy()
+    })
+    _write_summaries(os.path.join(base, 'rollups', 'distinct.arrow'), store.distinct)
+    _write_summaries(os.path.join(base, 'rollups', 'sketches.arrow'), store.sketches)
+    _write_customers(os.path.join(base, 'rollups', 'customers.arrow'), store.customer_base)
+
+    meta = {
+        'format': STORE_FORMAT,
+        'merchant_id': store.merchant_id,
+        'raw_start': store.raw_start.isoformat(),
+        'end': store.end.isoformat(),
+        'watermark': int(store.watermark),
+        'n_customers': int(store.n_customers),
+        'items': store.items.tolist(),
+        'item_category': store.item_category.tolist(),
+        'categories': store.categories.tolist(),
+        'dtypes': dtypes
+    }
+    tmp_path = os.path.join(base, 'meta.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(base, 'meta.json'))
+
+
+def open_event_store(root, merchant_id='default', since=None):
+    """Open a persisted EventStore, or return None if nothing (current) has been saved.
+
+    Only the monthly event partitions from ``since`` onwards are mapped, each
+    as a read-only part of its table (appends go to a separate tail part);
+    earlier days are served from the daily rollup and per-day summary files.
+    """
+    base = merchant_dir(root, merchant_id)
+    meta_path = os.path.join(base, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get('format') != STORE_FORMAT:
+        return None
+
+    end = datetime.date.fromisoformat(meta['end'])
+    saved_start = raw_start = datetime.date.fromisoformat(meta['raw_start'])
+    if since is not None and since > raw_start:
+        # Partitions hold whole months, so raw events start at the first day of since's month
+        raw_start = max(raw_start, since.replace(day=1))
+
+    rollup = _read_arrow(os.path.join(base, 'rollups', 'daily.arrow'),
+                         {'day': 'int32', 'qr_scans': 'int32', 'orders': 'int32', 'revenue': 'float32'})
+    days = pd.to_datetime(rollup.pop('day').astype('datetime64[D]'))
+    daily = pd.DataFrame(rollup, index=pd.DatetimeIndex(days))
+    compacted = daily.iloc[:(raw_start - days[0].date()).days]
+    history = _read_history(os.path.join(base, 'rollups', 'distinct.arrow'),
+                            {'scanners': 'uint8', 'buyers': 'uint8'}, raw_start)
+    history.update(_read_history(os.path.join(base, 'rollups', 'sketches.arrow'),
+                                 {'fulfillment': 'int32', 'session_duration': 'int32'}, raw_start))
+
+    totals = _read_arrow(os.path.join(base, 'rollups', 'customers.arrow'), CUSTOMER_COLUMNS)
+    customer_base = CustomerState.from_totals(*totals.values(), size=meta['n_customers'])
+    if raw_start > saved_start:
+        # Orders of the months left unmapped still count towards each customer's lifetime totals
+        for month in _month_keys(saved_start, raw_start - datetime.timedelta(days=1)):
+            path = os.path.join(base, 'events', 'orders', f"month={month}.arrow")
+            if os.path.exists(path):
+                orders = _read_arrow(path, {col: meta['dtypes']['orders'][col] for col in ('ts', 'customer', 'amount')})
+                customer_base.add(orders['customer'], orders['ts'], orders['amount'])
+
+    tables = {}
+    for name in EVENT_TABLES:
+        dtypes = meta['dtypes'][name]
+        parts = []
+        for month in _month_keys(raw_start, end):
+            path = os.path.join(base, 'events', name, f"month={month}.arrow")
+            if os.path.exists(path):
+                parts.append(_read_arrow(path, dtypes))
+        parts = parts or [{col: np.empty(0, dtype) for col, dtype in dtypes.items()}]
+        tables[name] = EventTable.from_parts(parts)
+
+    return EventStore(
+        scans=tables['scans'],
+        sessions=tables['sessions'],
+        orders=tables['orders'],
+        compacted=compacted,
+        raw_start=raw_start,
+        end=end,
+        items=np.array(meta['items']),
+        item_category=np.array(meta['item_category'], dtype=np.int16),
+        categories=np.array(meta['categories']),
+        n_customers=meta['n_customers'],
+        merchant_id=merchant_id,
+        watermark=meta.get('watermark'),
+        history=history,
+        customer_base=customer_base
+    )
+
+
+def roll_forward(store, as_of, raw_days, seed=None, now=None):
+    """Carry a store forward to as_of: feed events up to now (or the day's end), then compact old raw days"""
+    feed = SyntheticFeed(store, seed)  # Drawn at the rates of the days before the rollover
+    store.extend_to(as_of)
+    until = day_to_ts(as_of + datetime.timedelta(days=1))
+    until = until if now is None else min(now, until)
+    for since in range(store.watermark, until, DAY_SECONDS):  # A day per poll bounds the feed's arrays
+        store.append(feed.poll(since, min(since + DAY_SECONDS, until)))
+    store.compact(as_of - datetime.timedelta(days=raw_days - 1))
+    return store
+
+
+def open_or_build_event_store(merchant_id, as_of, seed, history_days, raw_days, root=None, now=None):
+    """Open a merchant's persisted store when it is current, otherwise build and persist it.
+
+    A store persisted fewer than raw_days days before as_of is rolled
+    forward (see roll_forward) and persisted again rather than rebuilt.
+    With ``now`` (epoch seconds) a persisted store holding events from later
+    than now (e.g. one built through the end of the day) is rebuilt, so live
+    updates start from the clock instead of from a watermark ahead of it.
+    """
+    persist = root is not None and HAVE_ARROW
+    if persist:
+        store = open_event_store(root, merchant_id, since=as_of - datetime.timedelta(days=raw_days-1))
+        if store is not None and store.end == as_of and (now is None or store.watermark <= now):
+            return store
+        if store is not None and store.end < as_of and (as_of - store.end).days < raw_days:
+            roll_forward(store, as_of, raw_days, (seed, as_of.toordinal()), now)
+            save_event_store(store, root)
+            return store
+    store = simulate_event_store(history_days, seed=seed, end=as_of, raw_days=raw_days, merchant_id=merchant_id,
+                                 now=now)
+    if persist:
+        save_event_store(store, root)
+    return store
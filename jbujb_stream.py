@@ -0,0 +1,322 @@
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from jbujb_data import SKETCH_BINS, percentile_metrics, sketch_counts
+from jbujb_events import DAY_SECONDS, SyntheticFeed, day_to_ts, now_ts, simulate_event_store, ts_to_day
+from jbujb_trace import count
+
+# ---------- Event Records ----------
+SCAN, ORDER = 0, 1
+CANCELED, COUPON = 1, 2  # Bit flags on order records
+
+# One fixed-size record per scan (with its session) or order
+EVENT_DTYPE = np.dtype([
+    ('ts', np.int64),
+    ('kind', np.uint8),
+    ('customer', np.int32),
+    ('item', np.int16),
+    ('amount', np.float32),
+    ('duration_s', np.uint16),
+    ('pages', np.uint8),
+    ('scan_to_order_s', np.uint16),
+    ('fulfillment_s', np.uint16),
+    ('flags', np.uint8),
+])
+
+
+def record_from_json(event):
+    """One EVENT_DTYPE tuple from a decoded NDJSON event, or None for events without a customer"""
+    if event.get('customer') is None:
+        return None
+    flags = (CANCELED if event.get('canceled') else 0) | (COUPON if event.get('coupon') else 0)
+    return (
+        int(event['ts']), ORDER if event['type'] == 'order' else SCAN, event['customer'],
+        event.get('item', -1), event.get('amount', 0.0), event.get('duration_s', 0), event.get('pages', 0),
+        event.get('scan_to_order_s', 0), event.get('fulfillment_s', 0), flags
+    )
+
+
+def batch_to_json(batch):
+    """NDJSON-ready dicts for a feed batch (see SyntheticFeed.poll)"""
+    events = [
+        {'ts': int(ts), 'type': 'scan', 'customer': int(customer), 'duration_s': int(duration), 'pages': int(pages),
+         'item': int(item)}
+        for ts, customer, duration, pages, item in zip(*(batch['sessions'][col] for col in
+                                                          ('ts', 'customer', 'duration_s', 'pages', 'item')))
+    ]
+    orders = batch['orders']
+    events += [
+        {'ts': int(ts), 'type': 'order', 'customer': int(customer), 'item': int(item), 'amount': round(float(amount), 2),
+         'scan_to_order_s': int(wait), 'fulfillment_s': int(prep), 'canceled': bool(canceled), 'coupon': bool(coupon)}
+        for ts, customer, item, amount, wait, prep, canceled, coupon in zip(*(orders[col] for col in (
+            'ts', 'customer', 'item', 'amount', 'scan_to_order_s', 'fulfillment_s', 'canceled', 'coupon')))
+    ]
+    return sorted(events, key=lambda event: event['ts'])
+
+
+def records_to_batch(records, watermark):
+    """EventStore.append batch (scans, sessions, orders) for time-sorted EVENT_DTYPE records"""
+    scans, orders = records[records['kind'] == SCAN], records[records['kind'] == ORDER]
+    return {
+        'scans': {'ts': scans['ts'], 'customer': scans['customer']},
+        'sessions': {'ts': scans['ts'], 'customer': scans['customer'], 'duration_s': scans['duration_s'],
+                     'pages': scans['pages'], 'item': scans['item']},
+        'orders': {'ts': orders['ts'], 'customer': orders['customer'], 'item': orders['item'],
+                   'amount': orders['amount'], 'scan_to_order_s': orders['scan_to_order_s'],
+                   'fulfillment_s': orders['fulfillment_s'], 'canceled': orders['flags'] & CANCELED > 0,
+                   'coupon': orders['flags'] & COUPON > 0},
+        'watermark': watermark
+    }
+
+
+# ---------- Ring Buffer ----------
+class RingBuffer:
+    """Fixed-capacity, array-backed buffer of the most recent records"""
+
+    def __init__(self, capacity, dtype=EVENT_DTYPE):
+        self._data = np.zeros(capacity, dtype=dtype)
+        self._head = 0  # Next write position
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def append(self, record):
+        """O(1) append; overwrites the oldest record once full"""
+        self._data[self._head] = record
+        self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def extend(self, records):
+        """Append many records with at most two slice assignments"""
+        records = records[-self.capacity:]
+        n = len(records)
+        first = min(n, self.capacity - self._head)
+        self._data[self._head:self._head + first] = records[:first]
+        self._data[:n - first] = records[first:]
+        self._head = (self._head + n) % self.capacity
+        self._size = min(self._size + n, self.capacity)
+
+    def values(self):
+        """Buffered records, oldest first"""
+        if self._size < self.capacity:
+            return self._data[:self._size]
+        return np.concatenate((self._data[self._head:], self._data[:self._head]))
+
+    def since(self, ts):
+        """Buffered records with a timestamp of at least ts"""
+        values = self.values()
+        return values[np.searchsorted(values['ts'], ts, 'left'):]
+
+
+# ---------- Running "Today" Aggregates ----------
+class TodayAggregates:
+    """Running sums for the current day, updated per batch without rescanning"""
+
+    def __init__(self, day):
+        self.reset(day)
+
+    def reset(self, day):
+        self.day = day
+        self.hourly_scans = np.zeros(24, dtype=np.int64)
+        self.hourly_orders = np.zeros(24, dtype=np.int64)
+        self.revenue = 0.0
+        self.session_seconds = 0
+        self.bounces = 0
+        self.scan_to_order_seconds = 0
+        self.fulfillment_seconds = 0
+        self.fulfilled = 0
+        self.canceled = 0
+        self.coupons = 0
+        self.fulfillment_sketch = np.zeros(SKETCH_BINS, dtype=np.int64)
+        self.session_duration_sketch = np.zeros(SKETCH_BINS, dtype=np.int64)
+
+    def update(self, records):
+        hour = records['ts'] % DAY_SECONDS // 3600
+        scans = records['kind'] == SCAN
+        orders = ~scans
+        canceled = orders & (records['flags'] & CANCELED > 0)
+        fulfilled = orders & ~canceled
+        self.hourly_scans += np.bincount(hour[scans], minlength=24)
+        self.hourly_orders += np.bincount(hour[orders], minlength=24)
+        self.revenue += float(records['amount'][orders].sum(dtype=np.float64))
+        self.session_seconds += int(records['duration_s'][scans].sum(dtype=np.int64))
+        self.bounces += int(np.count_nonzero(records['pages'][scans] <= 1))
+        self.scan_to_order_seconds += int(records['scan_to_order_s'][orders].sum(dtype=np.int64))
+        self.fulfillment_seconds += int(records['fulfillment_s'][fulfilled].sum(dtype=np.int64))
+        self.fulfilled += int(np.count_nonzero(fulfilled))
+        self.canceled += int(np.count_nonzero(canceled))
+        self.coupons += int(np.count_nonzero(orders & (records['flags'] & COUPON > 0)))
+        self.fulfillment_sketch += sketch_counts(records['fulfillment_s'][fulfilled])
+        self.session_duration_sketch += sketch_counts(records['duration_s'][scans])
+
+    def metrics(self):
+        """KPI dict for the day so far, in the same shape as EventStore.kpis"""
+        scans = int(self.hourly_scans.sum())
+        orders = int(self.hourly_orders.sum())
+        return {
+            **percentile_metrics('fulfillment', self.fulfillment_sketch),
+            **percentile_metrics('session_duration', self.session_duration_sketch),
+            'total_qr_scans': scans,
+            'total_orders': orders,
+            'total_revenue': self.revenue,
+            'conversion_rate': (orders / scans * 100) if scans > 0 else 0,
+            'avg_order_value': self.revenue / max(orders, 1),
+            'avg_session_duration': self.session_seconds / scans / 60 if scans else None,
+            'bounce_rate': self.bounces / scans * 100 if scans else None,
+            'avg_time_scan_to_order': self.scan_to_order_seconds / orders / 60 if orders else None,
+            'canceled_orders': self.canceled if orders else None,
+            'coupon_redemption_rate': self.coupons / orders * 100 if orders else None,
+            'avg_fulfillment_time': self.fulfillment_seconds / self.fulfilled / 60 if self.fulfilled else None,
+            'peak_hour': f"{int(self.hourly_orders.argmax()):02d}:00" if orders else None
+        }
+
+
+# ---------- NDJSON Source ----------
+def _fits(record):
+    try:
+        np.array([record], dtype=EVENT_DTYPE)
+    except (ValueError, TypeError, OverflowError):
+        return False
+    return True
+
+
+class NDJSONTail:
+    """Tails an append-only NDJSON file, returning only complete new lines"""
+
+    def __init__(self, path):
+        self.path = path
+        self.rejected = 0  # Events without a customer, which no customer metric can place
+        self.malformed = 0  # Lines that are not a readable event; skipped rather than stalling the feed
+        self._offset = 0
+        self._partial = b''
+
+    def poll(self):
+        """Records appended since the last poll, as an EVENT_DTYPE array.
+
+        The read offset only moves once the whole batch has parsed, and a bad
+        line is counted and skipped instead of failing the lines around it.
+        """
+        if not os.path.exists(self.path):
+            return np.empty(0, dtype=EVENT_DTYPE)
+        if os.path.getsize(self.path) < self._offset:
+            # Truncated or rotated: start over from the beginning
+            self._offset, self._partial = 0, b''
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        lines = (self._partial + chunk).split(b'\n')
+        partial = lines.pop()
+        valid, rejected, malformed = [], 0, 0
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = record_from_json(json.loads(line))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                malformed += 1
+                continue
+            if record is None:
+                rejected += 1
+            else:
+                valid.append(record)
+        try:
+            records = np.array(valid, dtype=EVENT_DTYPE)
+        except (ValueError, TypeError, OverflowError):
+            # Some field does not fit its column: find the offending records one by one
+            fits = [record for record in valid if _fits(record)]
+            malformed += len(valid) - len(fits)
+            records = np.array(fits, dtype=EVENT_DTYPE)
+        self._offset += len(chunk)
+        self._partial = partial
+        self.rejected += rejected
+        self.malformed += malformed
+        count('stream_events_rejected', rejected, reason='no_customer')
+        count('stream_events_rejected', malformed, reason='malformed')
+        return records
+
+
+# ---------- Ingestion ----------
+class StreamIngestor:
+    """Moves feed events into the ring buffer, today's running sums and the event store.
+
+    Shared by every session; ``pump`` is cheap when nothing new arrived.
+    Events go through ``EventStore.append``, so the raw tables, customer
+    state, cube, sketches and rollups see them like any other batch. Events
+    older than the store's watermark (already ingested time) are skipped.
+
+    Memory is bounded per day, not flat: the ring and today's sums are
+    fixed-size, but the store keeps every raw event of its last day. Events
+    past that day are left for the next day's store, which the callers open
+    per as_of date and which rolls forward and compacts its raw window.
+    """
+
+    def __init__(self, source, store, rollup, capacity=262144):
+        self.source = source
+        self.store = store
+        self.rollup = rollup
+        self.ring = RingBuffer(capacity)
+        self.today = TodayAggregates(ts_to_day(store.watermark))
+        self.events_seen = 0
+        self._lock = threading.Lock()
+
+    def pump(self):
+        """Ingest whatever the source has; returns the number of new events"""
+        with self._lock:
+            records = self.source.poll()
+            # Events at the watermark second may still arrive; the store's own day ends its tables
+            end_ts = day_to_ts(self.store.end + datetime.timedelta(days=1))
+            records = records[(records['ts'] >= self.store.watermark) & (records['ts'] < end_ts)]
+            if not len(records):
+                return 0
+            records = np.sort(records, order='ts', kind='stable')
+            self.ring.extend(records)
+            self.events_seen += len(records)
+            day = ts_to_day(records['ts'][-1])
+            if day > self.today.day:
+                self.today.reset(day)
+            self.today.update(records[records['ts'] >= day_to_ts(self.today.day)])
+            dates, totals = self.store.append(records_to_batch(records, int(records['ts'][-1])))
+            self.rollup.add(dates, totals)
+            return len(records)
+
+    def hourly(self, kind=ORDER):
+        """Today's events per hour, read from the ring while it still holds the whole day.
+
+        Once a busy day overflows the ring, the running sums take over.
+        """
+        with self._lock:
+            events = self.ring.since(day_to_ts(self.today.day))
+            hourly_sums = self.today.hourly_orders if kind == ORDER else self.today.hourly_scans
+            if len(events) < self.today.hourly_orders.sum() + self.today.hourly_scans.sum():
+                return hourly_sums.copy()
+            events = events[events['kind'] == kind]
+            return np.bincount(events['ts'] % DAY_SECONDS // 3600, minlength=24)
+
+
+# ---------- Local Feed Stand-In ----------
+def write_synthetic_feed(path, interval=1.0, seed=None):
+    """Append synthetic POS/QR events to an NDJSON file in real time"""
+    feed = SyntheticFeed(simulate_event_store(14, raw_days=14, end=datetime.date.today()), seed)
+    watermark = now_ts()
+    while True:
+        time.sleep(interval)
+        now = now_ts()
+        with open(path, 'a') as f:
+            for event in batch_to_json(feed.poll(watermark, now)):
+                f.write(json.dumps(event) + '\n')
+        watermark = now
+
+
+if __name__ == '__main__':
+    write_synthetic_feed(sys.argv[1] if len(sys.argv) > 1 else 'events.ndjson')
@@ -0,0 +1,230 @@
+import collections
+import contextlib
+import functools
+import http.server
+import json
+import os
+import threading
+import time
+
+# ---------- Tracer ----------
+MAX_SPANS = 20000  # Spans kept for the Chrome trace export
+
+
+class Tracer:
+    """Timing spans and counters of dashboard runs, exportable as Chrome trace events or Prometheus text.
+
+    Spans are kept in a bounded ring for the trace export; per-span totals and
+    counters are aggregated as they arrive, so the Prometheus view is O(names).
+    """
+
+    def __init__(self, max_spans=MAX_SPANS):
+        self.spans = collections.deque(maxlen=max_spans)
+        self.totals = collections.defaultdict(lambda: [0, 0.0])  # (cat, name) -> [count, seconds]
+        self.counters = collections.Counter()  # (name, sorted label items) -> value
+        self.run_counters = collections.Counter()  # The same, for the latest run only
+        self.run = 0
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def begin_run(self):
+        """Start a new script run; the debug panel shows the spans of the latest one"""
+        with self._lock:
+            self.run += 1
+            self.run_counters = collections.Counter()
+
+    def record(self, name, cat, start, seconds, args=None):
+        with self._lock:
+            self.spans.append((self.run, name, cat, start, seconds, threading.get_ident(), args))
+            total = self.totals[cat, name]
+            total[0] += 1
+            total[1] += seconds
+
+    def add(self, name, value=1, labels=None):
+        key = name, tuple(sorted((labels or {}).items()))
+        with self._lock:
+            self.counters[key] += value
+            self.run_counters[key] += value
+
+    def run_spans(self, run=None):
+        """(name, cat, seconds, args) of every span of one run, the latest by default"""
+        run = self.run if run is None else run
+        with self._lock:
+            return [(name, cat, seconds, args) for span_run, name, cat, _, seconds, _, args in self.spans
+                    if span_run == run]
+
+    def chrome_trace(self):
+        """Retained spans and current counters in the Chrome trace-event format (chrome://tracing, Perfetto)"""
+        pid = os.getpid()
+        with self._lock:
+            events = [{'name': name, 'cat': cat, 'ph': 'X', 'pid': pid, 'tid': tid,
+                       'ts': (start - self.origin) * 1e6, 'dur': seconds * 1e6, 'args': dict(args or {}, run=run)}
+                      for run, name, cat, start, seconds, tid, args in self.spans]
+            now = (time.perf_counter() - self.origin) * 1e6
+            events += [{'name': name, 'ph': 'C', 'pid': pid, 'ts': now,
+                        'args': {','.join(f"{k}={v}" for k, v in labels) or name: value}}
+                       for (name, labels), value in self.counters.items()]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def prometheus_text(self):
+        """Span totals and counters in the Prometheus text exposition format"""
+        lines = ["# HELP jbujb_span_seconds Time spent in dashboard sections, fragments and cache lookups",
+                 "# TYPE jbujb_span_seconds summary"]
+        with self._lock:
+            for (cat, name), (n, seconds) in sorted(self.totals.items()):
+                labels = _prometheus_labels((('cat', cat), ('name', name)))
+                lines += [f"jbujb_span_seconds_sum{labels} {seconds:.6f}", f"jbujb_span_seconds_count{labels} {n}"]
+            declared = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE jbujb_{name}_total counter")
+                    declared.add(name)
+                lines.append(f"jbujb_{name}_total{_prometheus_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+
+# ---------- Active Tracers ----------
+# Each Streamlit session runs its script on its own thread, so the tracers a run
+# reports to are thread-local. With none active every call below is a no-op.
+_local = threading.local()
+_NO_SPAN = contextlib.nullcontext()
+
+
+def activate(*tracers):
+    """Report spans and counters of this thread to the given tracers (None entries are skipped)"""
+    _local.tracers = tuple(tracer for tracer in tracers if tracer is not None)
+    _local.section = None
+    _local.cache_misses = []
+    for tracer in _local.tracers:
+        tracer.begin_run()
+
+
+class _Span:
+    __slots__ = ('tracers', 'name', 'cat', 'args', 'start')
+
+    def __init__(self, tracers, name, cat, args):
+        self.tracers, self.name, self.cat, self.args = tracers, name, cat, args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        for tracer in self.tracers:
+            tracer.record(self.name, self.cat, self.start, seconds, self.args)
+
+
+def span(name, cat='block', **args):
+    """Context manager timing a block"""
+    tracers = getattr(_local, 'tracers', None)
+    if not tracers:
+        return _NO_SPAN
+    return _Span(tracers, name, cat, args)
+
+
+def count(name, value=1, **labels):
+    """Add to a counter, e.g. count('rows_processed', n, source='kpis')"""
+    tracers = getattr(_local, 'tracers', None)
+    if tracers:
+        for tracer in tracers:
+            tracer.add(name, value, labels)
+
+
+def section(name):
+    """End the running top-level section (if any) and start the next; section(None) ends the last one"""
+    tracers = getattr(_local, 'tracers', None)
+    if not tracers:
+        return
+    now = time.perf_counter()
+    if _local.section is not None:
+        previous, start = _local.section
+        for tracer in tracers:
+            tracer.record(previous, 'section', start, now - start)
+    _local.section = (name, now) if name is not None else None
+
+
+def traced(name, cat='fragment', resume=None):
+    """Decorator timing every call of a function.
+
+    A fragment can rerun on its own, on a fresh script thread with no active
+    tracers; ``resume()`` then returns the tracers to activate for that run.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if resume is not None and getattr(_local, 'tracers', None) is None:
+                activate(*resume())
+            with span(name, cat):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def traced_cache(name, cache):
+    """Wrap a caching decorator such as st.cache_resource(...) so every lookup is a span tagged hit or miss.
+
+    The cached body flags a miss on a per-thread stack, which keeps nested
+    lookups (a loader calling another loader) apart.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def body(*args, **kwargs):
+            if getattr(_local, 'cache_misses', None):
+                _local.cache_misses[-1] = True
+            return fn(*args, **kwargs)
+
+        cached = cache(body)
+
+        @functools.wraps(fn)
+        def lookup(*args, **kwargs):
+            tracers = getattr(_local, 'tracers', None)
+            if not tracers:
+                return cached(*args, **kwargs)
+            _local.cache_misses.append(False)
+            start = time.perf_counter()
+            try:
+                return cached(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                result = 'miss' if _local.cache_misses.pop() else 'hit'
+                for tracer in tracers:
+                    tracer.record(name, 'cache', start, seconds, {'result': result})
+                    tracer.add('cache_lookups', 1, {'cache': name, 'result': result})
+
+        lookup.clear = cached.clear
+        return lookup
+    return decorate
+
+
+# ---------- Metrics Endpoint ----------
+def serve_metrics(tracer, port, host='127.0.0.1'):
+    """Serve the tracer's Prometheus text at /metrics (and its Chrome trace at /trace) from a daemon thread"""
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, content_type = tracer.prometheus_text().encode(), 'text/plain; version=0.0.4'
+            elif self.path == '/trace':
+                body, content_type = json.dumps(tracer.chrome_trace()).encode(), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,41 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from jbujb_api import api_server
+
+
+class FailingService:
+    tracers = ()
+
+    def handle(self, report, params, if_none_match=None):
+        if report == 'missing':
+            raise LookupError("no such report")
+        raise RuntimeError("backend went away")
+
+
+@pytest.fixture
+def base_url():
+    server = api_server(FailingService(), 0, '127.0.0.1')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as exc:
+        return exc.code, json.loads(exc.read())
+
+
+def test_unexpected_errors_return_json_500(base_url, capsys):
+    assert _get(f"{base_url}/v1/kpis") == (500, {'error': 'internal error'})
+    assert 'backend went away' in capsys.readouterr().err
+    # The server keeps answering after a failure
+    assert _get(f"{base_url}/v1/missing") == (404, {'error': 'no such report'})
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from jbujb_charts import downsample_frame, lttb_indices, minmax_indices
+
+
+def _reference_lttb(x, y, n_out):
+    """Textbook LTTB, one bucket at a time"""
+    n = len(y)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected, a = [0], 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        if b + 2 < len(edges):
+            nxt = slice(edges[b + 1], edges[b + 2])
+            ax, ay = x[nxt].mean(), y[nxt].mean()
+        else:
+            ax, ay = x[-1], y[-1]
+        areas = [abs((x[a] - ax) * (y[i] - y[a]) - (x[a] - x[i]) * (ay - y[a])) for i in range(lo, hi)]
+        a = lo + int(np.argmax(areas))
+        selected.append(a)
+    return np.array(selected + [n - 1])
+
+
+def test_lttb_matches_the_reference():
+    rng = np.random.default_rng(0)
+    x = np.arange(5000, dtype=float)
+    y = np.cumsum(rng.normal(size=5000))
+    for n_out in (3, 10, 800, 4999):
+        np.testing.assert_array_equal(lttb_indices(x, y, n_out), _reference_lttb(x, y, n_out))
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    y = np.zeros(10_000)
+    y[1234], y[8765] = 50.0, -50.0
+    keep = lttb_indices(np.arange(len(y)), y, 100)
+    assert len(keep) == 100 and np.all(np.diff(keep) > 0)
+    assert {0, 1234, 8765, len(y) - 1} <= set(keep.tolist())
+
+
+def test_lttb_edge_cases():
+    assert len(lttb_indices([], [], 800)) == 0
+    np.testing.assert_array_equal(lttb_indices(np.arange(5), np.ones(5), 800), np.arange(5))  # n below the target
+    np.testing.assert_array_equal(lttb_indices([0], [3.0], 800), [0])  # A single day
+    keep = lttb_indices(np.arange(1000), np.full(1000, 7.0), 50)  # A constant series
+    assert len(keep) == 50 and np.all(np.diff(keep) > 0) and keep[-1] == 999
+
+
+def test_minmax_keeps_bucket_extremes():
+    y = np.sin(np.linspace(0, 20, 2000))
+    keep = minmax_indices(y, 40)
+    assert keep[0] == 0 and keep[-1] == len(y) - 1 and len(keep) <= 42
+    assert y[keep].max() == y.max() and y[keep].min() == y.min()
+    assert len(minmax_indices(np.empty(0), 40)) == 0
+    np.testing.assert_array_equal(minmax_indices(np.ones(3), 40), np.arange(3))
+    assert len(minmax_indices(np.full(1000, 2.0), 40)) <= 42
+
+
+def test_downsample_frame_shares_one_axis():
+    index = pd.date_range('2024-01-01', periods=3000, freq='h')
+    rng = np.random.default_rng(1)
+    frame = pd.DataFrame({'orders': rng.poisson(5, 3000), 'qr_scans': rng.poisson(40, 3000)}, index=index)
+    for method in ('lttb', 'minmax'):
+        sampled = downsample_frame(frame, ['orders', 'qr_scans'], 400, method)
+        assert len(sampled) <= 400 and sampled.index.is_monotonic_increasing
+        assert sampled.index[0] == index[0] and sampled.index[-1] == index[-1]
+    assert downsample_frame(frame.iloc[:10], ['orders'], 400).equals(frame.iloc[:10])
+    assert downsample_frame(frame.iloc[:0], ['orders'], 400).empty
@@ -0,0 +1,89 @@
+import datetime
+
+import numpy as np
+
+from jbujb_events import CohortMatrix, day_to_ts
+
+START = datetime.date(2026, 1, 5)  # A Monday
+WEEKS = 10
+END = START + datetime.timedelta(weeks=WEEKS) - datetime.timedelta(days=1)
+
+
+def _orders(n=5000, customers=300, seed=0):
+    rng = np.random.default_rng(seed)
+    ts = np.sort(rng.integers(day_to_ts(START), day_to_ts(END + datetime.timedelta(days=1)), n))
+    return rng.integers(0, customers, n), ts
+
+
+def _reference(customer, ts):
+    week = (ts - day_to_ts(START)) // (7 * 86400)
+    first = {}
+    for c, w in zip(customer.tolist(), week.tolist()):
+        first.setdefault(c, w)
+    counts = np.zeros((WEEKS, WEEKS), dtype=np.int64)
+    for c, w in set(zip(customer.tolist(), week.tolist())):
+        counts[first[c], w - first[c]] += 1
+    return counts
+
+
+def test_matches_distinct_customers_per_cohort_week():
+    customer, ts = _orders()
+    matrix = CohortMatrix.from_orders(START, END, customer, ts, 300)
+    np.testing.assert_array_equal(matrix.counts, _reference(customer, ts))
+
+
+def test_batches_add_up_to_one_build():
+    customer, ts = _orders()
+    whole = CohortMatrix.from_orders(START, END, customer, ts)
+    batched = CohortMatrix.from_orders(START, START, customer[:0], ts[:0])
+    for part in np.array_split(np.arange(len(ts)), 7):
+        batched.add(customer[part], ts[part])
+    np.testing.assert_array_equal(batched.counts, whole.counts)
+
+
+def test_steady_customers_are_fully_retained():
+    # Every customer orders every week: a constant series
+    week = np.repeat(np.arange(WEEKS), 20)
+    ts = day_to_ts(START) + week * 7 * 86400 + 3600
+    matrix = CohortMatrix.from_orders(START, END, np.tile(np.arange(20), WEEKS), ts)
+    metrics = matrix.metrics(START, END)
+    assert metrics['customer_retention_rate'] == 100 and metrics['churn_rate'] == 0
+    assert metrics['repeat_customer_pct'] == (WEEKS - 1) / WEEKS * 100
+    assert metrics['avg_customer_lifetime_weeks'] == WEEKS
+    np.testing.assert_array_equal(matrix.retention_curve(END), np.ones(WEEKS))
+
+
+def test_single_day_window_uses_the_previous_weeks_cohort():
+    customer, ts = _orders()
+    matrix = CohortMatrix.from_orders(START, END, customer, ts)
+    day = START + datetime.timedelta(weeks=4, days=2)
+    metrics = matrix.metrics(day, day)
+    assert metrics['customer_retention_rate'] == matrix.counts[3, 1] / matrix.counts[3, 0] * 100
+    # Only the first week has no earlier cohort to report on
+    assert matrix.metrics(START, START)['customer_retention_rate'] is None
+
+
+def test_empty_ranges():
+    matrix = CohortMatrix.from_orders(START, END, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    assert not matrix.counts.any()
+    assert all(value is None for value in matrix.metrics(START, END).values())
+    assert matrix.frame(END).isna().all().all()
+
+    customer, ts = _orders()
+    matrix = CohortMatrix.from_orders(START, END, customer, ts)
+    before = START - datetime.timedelta(days=1)
+    assert all(value is None for value in matrix.metrics(before - datetime.timedelta(days=7), before).values())
+    assert matrix.frame(before).empty
+
+
+def test_frame_hides_unobserved_cells():
+    customer, ts = _orders(customers=5000)
+    frame = CohortMatrix.from_orders(START, END, customer, ts).frame(END, weeks=4)
+    assert frame.shape == (4, 4)
+    assert (frame['W0'] == 100).all()
+    # The newest cohort has only been observed for its first week
+    assert frame.iloc[-1, 1:].isna().all() and frame.iloc[0].notna().all()
+
+    # A week that acquired nobody has no retention rather than 0%
+    customer, ts = _orders(customers=50)
+    assert CohortMatrix.from_orders(START, END, customer, ts).frame(END, weeks=4).isna().all().all()
@@ -0,0 +1,60 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from jbujb_events import CustomerState, day_to_ts, simulate_event_store
+from jbujb_storage import HAVE_ARROW, open_event_store, save_event_store
+
+END = datetime.date(2026, 3, 31)
+
+
+def _assert_same_state(a, b):
+    size = max(len(a), len(b))
+    for state in (a, b):
+        state._grow(size)
+    active = np.flatnonzero(a.orders)
+    np.testing.assert_array_equal(active, np.flatnonzero(b.orders))
+    for column in ('first_ts', 'last_ts', 'orders'):
+        np.testing.assert_array_equal(getattr(a, column)[active], getattr(b, column)[active])
+    np.testing.assert_allclose(a.spend[active], b.spend[active])
+
+
+@pytest.fixture(scope='module')
+def store():
+    return simulate_event_store(200, seed=6, end=END, raw_days=60, n_customers=20000, merchant_id='m1')
+
+
+def test_customers_include_orders_before_the_raw_tier(store):
+    raw = store.orders.columns
+    assert store.customer_base.orders.sum() == store.compacted['orders'].sum()
+    assert store.customers.orders.sum() == store.compacted['orders'].sum() + len(raw['ts'])
+    assert store.customers.first_ts[np.flatnonzero(store.customers.orders)].min() < day_to_ts(store.raw_start)
+
+
+def test_rfm_windows_are_memoized_independently():
+    state = CustomerState.from_orders(np.arange(10), np.arange(10) * 86400, np.ones(10))
+    week = state.rfm(0, 7 * 86400)
+    state.lapsed_vips(9 * 86400)
+    assert state.rfm(0, 7 * 86400) is week
+    state.add(np.array([3]), np.array([9 * 86400]), np.array([2.0]))
+    assert state.rfm(0, 7 * 86400) is not week
+
+
+def test_compaction_folds_orders_into_the_base():
+    store = simulate_event_store(200, seed=6, end=END, raw_days=60, n_customers=20000)
+    before = store.customer_state(END - datetime.timedelta(days=1)).copy()
+    lifetime = store.customers.copy()
+    store.compact(END - datetime.timedelta(days=20))
+    _assert_same_state(store.customers, lifetime)
+    _assert_same_state(store.customer_state(END - datetime.timedelta(days=1)), before)
+
+
+@pytest.mark.skipif(not HAVE_ARROW, reason="persistence needs pyarrow")
+def test_base_is_persisted(store, tmp_path):
+    save_event_store(store, str(tmp_path))
+    _assert_same_state(open_event_store(str(tmp_path), 'm1').customers, store.customers)
+    # Months left unmapped are folded into the base when the store opens
+    reopened = open_event_store(str(tmp_path), 'm1', since=END - datetime.timedelta(days=10))
+    assert reopened.raw_start == datetime.date(2026, 3, 1)
+    _assert_same_state(reopened.customers, store.customers)
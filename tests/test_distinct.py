@@ -0,0 +1,98 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from jbujb_data import HLL_REGISTERS, distinct_metrics, hll_estimate, hll_positions
+from jbujb_events import DailyDistinct, day_to_ts, simulate_event_store
+from jbujb_storage import HAVE_ARROW, open_event_store, save_event_store
+
+START = datetime.date(2026, 1, 1)
+
+
+def _registers(keys, seed=0):
+    registers = np.zeros(HLL_REGISTERS, dtype=np.uint8)
+    register, rank = hll_positions(keys, seed)
+    np.maximum.at(registers, register, rank)
+    return registers
+
+
+@pytest.mark.parametrize('n', [1, 100, 5000, 200000])
+def test_estimate_within_three_standard_errors(n):
+    # 2^12 registers give about 1.6% standard error
+    assert hll_estimate(_registers(np.arange(n))) == pytest.approx(n, rel=0.05)
+
+
+def test_empty_registers_count_nothing():
+    assert hll_estimate(np.zeros(HLL_REGISTERS, dtype=np.uint8)) == 0
+    assert distinct_metrics(*[np.zeros(HLL_REGISTERS, dtype=np.uint8)] * 3) == {
+        'unique_scanners': 0, 'unique_buyers': 0, 'repeat_visitors_pct': None}
+
+
+def test_duplicates_do_not_count_twice():
+    keys = np.arange(3000)
+    np.testing.assert_array_equal(_registers(np.concatenate((keys, keys, keys[::-1]))), _registers(keys))
+
+
+def _distinct(days=10, per_day=1000, overlap=500):
+    """Day d sees keys [d * (per_day - overlap), d * (per_day - overlap) + per_day)"""
+    step = per_day - overlap
+    keys = np.concatenate([np.arange(d * step, d * step + per_day) for d in range(days)])
+    ts = np.repeat(day_to_ts(START) + np.arange(days) * 86400 + 3600, per_day)
+    return DailyDistinct.from_keys(START, days, seed=7, history={'scanners': np.zeros((0, HLL_REGISTERS), np.uint8)},
+                                   scanners=(ts, keys))
+
+
+def test_window_unions_days():
+    distinct = _distinct()
+    estimate = hll_estimate(distinct.union(START, START + datetime.timedelta(days=9), 'scanners'))
+    assert estimate == pytest.approx(9 * 500 + 1000, rel=0.05)
+    single = hll_estimate(distinct.union(START + datetime.timedelta(days=3), START + datetime.timedelta(days=3),
+                                         'scanners'))
+    assert single == pytest.approx(1000, rel=0.05)
+
+
+def test_empty_and_outside_windows():
+    distinct = _distinct()
+    for start_date, end_date in [(START + datetime.timedelta(days=5), START + datetime.timedelta(days=4)),
+                                 (START - datetime.timedelta(days=30), START - datetime.timedelta(days=1)),
+                                 (START + datetime.timedelta(days=20), START + datetime.timedelta(days=25))]:
+        assert not distinct.union(start_date, end_date, 'scanners').any()
+
+
+def test_dropped_days_roll_into_history():
+    distinct = _distinct()
+    window = START, START + datetime.timedelta(days=9)
+    before = distinct.union(*window, 'scanners')
+    distinct.drop_before(START + datetime.timedelta(days=6))
+    assert distinct.start == START + datetime.timedelta(days=6)
+    assert distinct.first == START
+    assert len(distinct.history['scanners']) == 6
+    np.testing.assert_array_equal(distinct.union(*window, 'scanners'), before)
+    # A window inside the history alone, and one straddling history and registers
+    assert hll_estimate(distinct.union(START, START, 'scanners')) == pytest.approx(1000, rel=0.05)
+    assert hll_estimate(distinct.union(START + datetime.timedelta(days=5), START + datetime.timedelta(days=6),
+                                       'scanners')) == pytest.approx(1500, rel=0.05)
+
+
+def test_long_windows_reach_past_the_raw_tier():
+    end = datetime.date(2026, 3, 31)
+    store = simulate_event_store(400, seed=3, end=end, raw_days=30, n_customers=100000)
+    assert store.distinct.first == store.start
+    metrics = {days: store.distinct.metrics(end - datetime.timedelta(days=days - 1), end)['unique_scanners']
+               for days in (30, 90, 365)}
+    assert metrics[30] < metrics[90] < metrics[365]
+
+
+@pytest.mark.skipif(not HAVE_ARROW, reason="persistence needs pyarrow")
+def test_history_is_persisted(tmp_path):
+    end = datetime.date(2026, 3, 31)
+    store = simulate_event_store(200, seed=3, end=end, raw_days=60, merchant_id='m1')
+    save_event_store(store, str(tmp_path))
+    window = end - datetime.timedelta(days=179), end
+    # Opening from a later month leaves the first raw months to the persisted registers
+    reopened = open_event_store(str(tmp_path), 'm1', since=end - datetime.timedelta(days=20))
+    assert reopened.raw_start == datetime.date(2026, 3, 1)
+    assert reopened.distinct.first == store.distinct.first
+    np.testing.assert_array_equal(reopened.distinct.union(*window, 'buyers'), store.distinct.union(*window, 'buyers'))
+    assert reopened.distinct.metrics(*window) == store.distinct.metrics(*window)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from jbujb_forecast import SEASON, HoltWinters
+
+PATTERN = np.array([0.0, -10.0, -5.0, 0.0, 5.0, 20.0, 15.0])
+
+
+def _seasonal(days, level=100.0, slope=0.5):
+    t = np.arange(days)
+    return level + slope * t + PATTERN[t % SEASON]
+
+
+def test_needs_two_seasons_of_history():
+    with pytest.raises(ValueError):
+        HoltWinters(np.ones((1, 2 * SEASON - 1)))
+    mean, lower, upper = HoltWinters(np.ones((1, 2 * SEASON))).forecast(3)
+    assert mean.shape == lower.shape == upper.shape == (1, 3)
+
+
+def test_constant_series_forecasts_itself_with_no_band():
+    mean, lower, upper = HoltWinters(np.full((1, 8 * SEASON), 42.0)).forecast(14)
+    np.testing.assert_allclose(mean, 42.0)
+    np.testing.assert_allclose(lower, 42.0)
+    np.testing.assert_allclose(upper, 42.0)
+
+
+def test_recovers_trend_and_weekly_season():
+    days, horizon = 20 * SEASON, 14
+    mean, lower, upper = HoltWinters(_seasonal(days)[None, :]).forecast(horizon)
+    expected = _seasonal(days + horizon)[days:]
+    np.testing.assert_allclose(mean[0], expected, rtol=0.02)
+    assert (lower <= mean).all() and (mean <= upper).all()
+    # Bands widen with the horizon
+    assert np.all(np.diff(upper[0] - mean[0]) >= 0)
+
+
+def test_lower_band_is_never_negative():
+    rng = np.random.default_rng(0)
+    _, lower, _ = HoltWinters(rng.poisson(1.0, (1, 6 * SEASON))).forecast(14)
+    assert (lower >= 0).all()
+
+
+def test_batched_stores_match_single_fits():
+    rng = np.random.default_rng(1)
+    history = _seasonal(10 * SEASON)[None, :] * rng.uniform(0.5, 2.0, (4, 1)) + rng.normal(0, 3, (4, 10 * SEASON))
+    batched = HoltWinters(history).forecast(7)
+    for store in range(len(history)):
+        single = HoltWinters(history[store:store + 1]).forecast(7)
+        for a, b in zip(batched, single):
+            np.testing.assert_allclose(a[store], b[0])
+
+
+def test_updates_match_a_refit():
+    history = _seasonal(12 * SEASON) + np.random.default_rng(2).normal(0, 2, 12 * SEASON)
+    model = HoltWinters(history[None, :10 * SEASON])
+    for value in history[10 * SEASON:]:
+        model.update(np.array([value]))
+    for a, b in zip(model.forecast(), HoltWinters(history[None, :]).forecast()):
+        np.testing.assert_allclose(a, b)
@@ -0,0 +1,94 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from jbujb_data import SKETCH_ACCURACY, SKETCH_BINS, SKETCH_MAX_VALUE, sketch_counts, sketch_quantiles
+from jbujb_events import HourSketch, day_to_ts, simulate_event_store
+from jbujb_storage import HAVE_ARROW, open_event_store, save_event_store
+
+START = datetime.date(2026, 1, 1)
+QUANTILES = (0.01, 0.25, 0.5, 0.9, 0.95, 0.99, 1.0)
+
+
+@pytest.mark.parametrize('values', [
+    np.random.default_rng(1).lognormal(6, 1, 100000),
+    np.random.default_rng(2).gamma(6.0, 100.0, 20000),
+    np.random.default_rng(3).uniform(1, 60000, 5000),
+    np.arange(1, 3),
+])
+def test_quantiles_within_relative_accuracy(values):
+    estimates = sketch_quantiles(sketch_counts(values), QUANTILES)
+    exact = np.quantile(values, QUANTILES, method='lower')
+    np.testing.assert_allclose(estimates, exact, rtol=SKETCH_ACCURACY)
+
+
+def test_empty_sketch_has_no_quantiles():
+    assert sketch_quantiles(np.zeros(SKETCH_BINS, dtype=np.int64)) == [None, None, None]
+
+
+def test_constant_values():
+    for value in (0, 1, 600, SKETCH_MAX_VALUE):
+        estimates = sketch_quantiles(sketch_counts(np.full(1000, value)))
+        np.testing.assert_allclose(estimates, [value] * 3, rtol=SKETCH_ACCURACY)
+
+
+def test_values_above_the_maximum_are_clamped():
+    assert sketch_quantiles(sketch_counts([10 * SKETCH_MAX_VALUE]), (0.5,))[0] == \
+        pytest.approx(SKETCH_MAX_VALUE, rel=SKETCH_ACCURACY)
+
+
+def test_sketches_merge_by_addition():
+    rng = np.random.default_rng(4)
+    a, b = rng.gamma(2.0, 20.0, 3000), rng.gamma(4.0, 100.0, 7000)
+    np.testing.assert_array_equal(sketch_counts(a) + sketch_counts(b), sketch_counts(np.concatenate((a, b))))
+
+
+def _sketch(days=10):
+    """Day d holds 100 durations of (d + 1) * 60 seconds, spread over the day's hours"""
+    ts = day_to_ts(START) + np.repeat(np.arange(days) * 86400, 100) + np.tile(np.arange(100) * 800, days)
+    values = np.repeat((np.arange(days) + 1) * 60, 100)
+    return HourSketch.from_values(START, days, history={'fulfillment': np.zeros((0, SKETCH_BINS), np.int32)},
+                                  fulfillment=(ts, values))
+
+
+def test_single_day_and_empty_windows():
+    sketch = _sketch()
+    day = START + datetime.timedelta(days=4)
+    assert sketch.percentiles(day, day, 'fulfillment')['fulfillment_p50'] == pytest.approx(5, rel=SKETCH_ACCURACY)
+    for start_date, end_date in [(day, day - datetime.timedelta(days=1)),
+                                 (START - datetime.timedelta(days=9), START - datetime.timedelta(days=1))]:
+        assert set(sketch.percentiles(start_date, end_date, 'fulfillment').values()) == {None}
+
+
+def test_dropped_days_roll_into_history():
+    sketch = _sketch()
+    window = START, START + datetime.timedelta(days=9)
+    before = sketch.percentiles(*window, 'fulfillment')
+    sketch.drop_before(START + datetime.timedelta(days=8))
+    assert sketch.history['fulfillment'].shape == (8, SKETCH_BINS)
+    assert sketch.percentiles(*window, 'fulfillment') == before
+    # History days alone still answer their own windows
+    assert sketch.percentiles(START, START, 'fulfillment')['fulfillment_p99'] == \
+        pytest.approx(1, rel=SKETCH_ACCURACY)
+
+
+def test_long_windows_include_history_days():
+    end = datetime.date(2026, 3, 31)
+    store = simulate_event_store(400, seed=5, end=end, raw_days=30)
+    assert len(store.sketches.history['session_duration']) == 370
+    history = store.sketches.history_window(store.start, end, 'session_duration')
+    np.testing.assert_array_equal(history.sum(axis=1), store.compacted['qr_scans'].to_numpy())
+    year = store.sketches.percentiles(end - datetime.timedelta(days=364), end, 'session_duration')
+    assert year['session_duration_p50'] is not None
+
+
+@pytest.mark.skipif(not HAVE_ARROW, reason="persistence needs pyarrow")
+def test_history_is_persisted(tmp_path):
+    end = datetime.date(2026, 3, 31)
+    store = simulate_event_store(200, seed=5, end=end, raw_days=60, merchant_id='m1')
+    save_event_store(store, str(tmp_path))
+    reopened = open_event_store(str(tmp_path), 'm1', since=end - datetime.timedelta(days=20))
+    window = end - datetime.timedelta(days=179), end
+    for name in ('fulfillment', 'session_duration'):
+        assert reopened.sketches.percentiles(*window, name) == store.sketches.percentiles(*window, name)
@@ -0,0 +1,40 @@
+import datetime
+
+from jbujb_events import SyntheticFeed, day_to_ts, simulate_event_store
+from jbujb_sql import SQLBackend
+from jbujb_storage import roll_forward
+
+END = datetime.date(2026, 3, 31)
+
+
+def test_customer_sections_match_the_store(tmp_path):
+    store = simulate_event_store(120, seed=7, end=END, raw_days=30, n_customers=5000)
+    backend = SQLBackend(str(tmp_path / 'jbujb.sqlite'))
+    backend.load_event_store(store)
+    start_date, end_date = END - datetime.timedelta(days=6), END - datetime.timedelta(days=1)
+    assert backend.top_customers(start_date, end_date).equals(store.top_customers(start_date, end_date))
+    assert backend.customer_segments(start_date, end_date).equals(store.customer_segments(start_date, end_date))
+    # One GROUP BY per end date until the next load
+    assert backend.customer_state(end_date) is backend.customer_state(end_date)
+
+
+def test_sync_follows_live_events_and_rollover(tmp_path):
+    now = day_to_ts(END) + 10 * 3600
+    store = simulate_event_store(60, seed=7, end=END, raw_days=20, n_customers=2000, now=now)
+    backend = SQLBackend(str(tmp_path / 'jbujb.sqlite'))
+    backend.sync(store)
+    feed = SyntheticFeed(store, seed=3)
+    store.append(feed.poll(store.watermark, now + 4 * 3600))
+
+    # Only the new events are inserted, and they reach the sections
+    backend.sync(store)
+    assert backend._watermark_ts() == store.watermark
+    assert backend.top_items(END, END, n=10).equals(store.top_items(END, END, n=10))
+    assert backend.customer_segments(END, END).equals(store.customer_segments(END, END))
+
+    # The next day's store has compacted its oldest raw day into the customer base
+    tomorrow = END + datetime.timedelta(days=1)
+    roll_forward(store, tomorrow, 20, seed=3, now=day_to_ts(tomorrow) + 3600)
+    backend.sync(store)
+    assert backend.customer_segments(END, tomorrow).equals(store.customer_segments(END, tomorrow))
+    assert backend.top_customers(END, tomorrow).equals(store.top_customers(END, tomorrow))
@@ -0,0 +1,87 @@
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+from jbujb_events import SyntheticFeed, day_to_ts, simulate_event_store
+from jbujb_storage import HAVE_ARROW, open_event_store, open_or_build_event_store, save_event_store
+
+pytestmark = pytest.mark.skipif(not HAVE_ARROW, reason="persistence needs pyarrow")
+
+END = datetime.date(2026, 3, 10)
+NOW = day_to_ts(END) + 12 * 3600
+
+
+@pytest.fixture
+def root(tmp_path):
+    store = simulate_event_store(60, seed=1, end=END, raw_days=40, merchant_id='m1', now=NOW)
+    save_event_store(store, str(tmp_path))
+    return str(tmp_path)
+
+
+def _lengths(store):
+    return {name: len(getattr(store, name)) for name in ('scans', 'sessions', 'orders')}
+
+
+def test_reopened_partitions_stay_mapped(root):
+    store = open_event_store(root, 'm1')
+    parts = store.orders.parts()
+    assert len(parts) == 3  # January, February and March partitions
+    assert not any(part['ts'].flags.writeable for part in parts)
+
+
+def test_append_to_reopened_store(root):
+    store = open_event_store(root, 'm1')
+    before = _lengths(store)
+    feed = SyntheticFeed(store, seed=2)
+
+    # An empty batch leaves the mapped partitions untouched
+    store.append(feed.poll(store.watermark, store.watermark))
+    assert _lengths(store) == before
+
+    batch = feed.poll(store.watermark, NOW + 3600)
+    store.append(batch)
+    assert store.watermark == NOW + 3600
+    assert _lengths(store) == {name: before[name] + len(batch[name]['ts']) for name in before}
+    hour = store.orders.view(NOW, NOW + 3600)
+    np.testing.assert_array_equal(hour['ts'], batch['orders']['ts'])
+    # Windows reaching into both the mapped March partition and the appended tail
+    assert store.kpis(END, END)['canceled_orders'] is not None
+    assert store.daily_frame()['orders'].iloc[-1] == len(store.orders.view(day_to_ts(END), NOW + 3600)['ts'])
+
+    save_event_store(store, root)
+    reopened = open_event_store(root, 'm1')
+    assert reopened.watermark == NOW + 3600
+    assert _lengths(reopened) == _lengths(store)
+    np.testing.assert_array_equal(reopened.orders.columns['amount'], store.orders.columns['amount'])
+
+
+def test_compact_after_append(root):
+    store = open_event_store(root, 'm1')
+    feed = SyntheticFeed(store, seed=3)
+    store.append(feed.poll(store.watermark, NOW + 600))
+    daily = store.daily_frame()
+    store.compact(datetime.date(2026, 2, 15))
+    assert store.raw_start == datetime.date(2026, 2, 15)
+    assert store.scans.columns['ts'][0] >= day_to_ts(store.raw_start)
+    np.testing.assert_array_equal(store.daily_frame()['orders'].to_numpy(), daily['orders'].to_numpy())
+
+
+def test_rollover_compacts_and_persists(root):
+    store = open_event_store(root, 'm1')
+    daily = store.daily_frame()
+    as_of = END + datetime.timedelta(days=3)
+    rolled = open_or_build_event_store('m1', as_of, 1, 60, 40, root, now=day_to_ts(as_of) + 6 * 3600)
+    assert (rolled.end, rolled.raw_start) == (as_of, as_of - datetime.timedelta(days=39))
+    assert rolled.watermark == day_to_ts(as_of) + 6 * 3600
+    rolled_daily = rolled.daily_frame()
+    assert len(rolled_daily) == len(daily) + 3
+    # Days before the rollover keep their totals; the fed days have events
+    np.testing.assert_array_equal(rolled_daily['orders'].iloc[:len(daily) - 1], daily['orders'].iloc[:-1])
+    assert (rolled_daily['qr_scans'].iloc[-3:-1] > 0).all()
+
+    reopened = open_event_store(root, 'm1')
+    assert (reopened.end, reopened.raw_start) == (rolled.end, rolled.raw_start)
+    np.testing.assert_array_equal(reopened.daily_frame()['orders'], rolled_daily['orders'])
+    assert not os.path.exists(os.path.join(root, 'merchant=m1', 'events', 'orders', 'month=2026-01.arrow'))
@@ -0,0 +1,65 @@
+import datetime
+import json
+
+from jbujb_data import DailyRollup
+from jbujb_events import SyntheticFeed, day_to_ts, simulate_event_store
+from jbujb_stream import NDJSONTail, StreamIngestor, batch_to_json
+
+END = datetime.date(2026, 3, 10)
+NOW = day_to_ts(END) + 12 * 3600
+
+
+def _scan(ts, customer=7):
+    return json.dumps({'ts': ts, 'type': 'scan', 'customer': customer, 'duration_s': 60, 'pages': 2, 'item': 1})
+
+
+def _write(path, *lines):
+    with open(path, 'a') as f:
+        f.write(''.join(line + '\n' for line in lines))
+
+
+def test_bad_lines_are_skipped_and_counted(tmp_path):
+    path = tmp_path / 'events.ndjson'
+    _write(path, _scan(NOW), '{not json', json.dumps({'ts': NOW, 'type': 'scan', 'customer': None}),
+           json.dumps({'type': 'scan', 'customer': 3}), _scan(NOW + 1, customer=2 ** 40), _scan(NOW + 2))
+    tail = NDJSONTail(str(path))
+    records = tail.poll()
+    assert records['ts'].tolist() == [NOW, NOW + 2]
+    assert tail.malformed == 3  # Unparseable, missing ts, customer out of range
+    assert tail.rejected == 1  # No customer
+
+    # The offset moved past the bad lines, so later polls only see new events
+    _write(path, _scan(NOW + 3))
+    assert tail.poll()['ts'].tolist() == [NOW + 3]
+    assert tail.malformed == 3
+
+
+def test_partial_line_waits_for_its_newline(tmp_path):
+    path = tmp_path / 'events.ndjson'
+    line = _scan(NOW)
+    with open(path, 'w') as f:
+        f.write(line[:10])
+    tail = NDJSONTail(str(path))
+    assert len(tail.poll()) == 0
+    with open(path, 'a') as f:
+        f.write(line[10:] + '\n')
+    assert tail.poll()['ts'].tolist() == [NOW]
+    assert tail.malformed == 0
+
+
+def test_ingestor_keeps_only_the_stores_day(tmp_path):
+    store = simulate_event_store(30, seed=1, end=END, raw_days=14, now=NOW)
+    rollup = DailyRollup(store.daily_frame())
+    path = tmp_path / 'events.ndjson'
+    feed = SyntheticFeed(store, seed=2)
+    tomorrow = day_to_ts(END + datetime.timedelta(days=1))
+    _write(path, *(json.dumps(event) for event in batch_to_json(feed.poll(store.watermark, tomorrow + 3600))))
+    before = len(store.scans) + len(store.orders)
+
+    ingestor = StreamIngestor(NDJSONTail(str(path)), store, rollup, capacity=64)
+    added = ingestor.pump()
+    assert added > len(ingestor.ring) == 64  # The ring stays at its capacity
+    assert len(store.scans) + len(store.orders) == before + added
+    # Events past the store's last day are left for the next day's store
+    assert store.scans.view(tomorrow, tomorrow + 3600)['ts'].size == 0
+    assert ingestor.pump() == 0
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from jbujb_trace import Tracer, activate, count, section, span, traced, traced_cache
+
+
+def _memoize(fn):
+    """Minimal stand-in for st.cache_resource: a memo with a clear()"""
+    results = {}
+
+    def cached(*args):
+        if args not in results:
+            results[args] = fn(*args)
+        return results[args]
+
+    cached.clear = results.clear
+    return cached
+
+
+@pytest.fixture
+def tracer():
+    tracer = Tracer()
+    activate(tracer)
+    yield tracer
+    activate()  # Leave this thread untraced for the other tests
+
+
+def test_untraced_calls_are_no_ops():
+    activate()
+    with span('idle'):
+        count('rows_processed', 5)
+        section('kpis')
+
+
+def test_sections_spans_and_counters_of_one_run(tracer):
+    section('kpis')
+    with span('query', 'block', source='sql'):
+        count('rows_processed', 3, source='kpis')
+    count('rows_processed', 4, source='kpis')
+    section(None)
+    spans = {name: (cat, args) for name, cat, _, args in tracer.run_spans()}
+    assert spans == {'query': ('block', {'source': 'sql'}), 'kpis': ('section', None)}
+    assert tracer.counters['rows_processed', (('source', 'kpis'),)] == 7
+
+    # The next run starts empty but keeps the totals
+    activate(tracer)
+    assert tracer.run_spans() == [] and not tracer.run_counters
+    assert tracer.totals['section', 'kpis'][0] == 1
+
+
+def test_cache_lookups_are_tagged_hit_or_miss(tracer):
+    @traced_cache('square', _memoize)
+    def square(x):
+        return x * x
+
+    @traced('chart')
+    def chart(x):
+        return square(x) + 1
+
+    assert [chart(3), chart(3), chart(4)] == [10, 10, 17]
+    results = [args['result'] for name, cat, _, args in tracer.run_spans() if cat == 'cache']
+    assert results == ['miss', 'hit', 'miss']
+    assert tracer.totals['fragment', 'chart'][0] == 3
+
+
+def test_exports(tracer):
+    with span('load "store"', 'block'):
+        count('cache_lookups', 1, cache='a"b', result='hit')
+    trace = json.loads(json.dumps(tracer.chrome_trace()))
+    durations = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+    assert len(durations) == 1 and durations[0]['dur'] >= 0 and durations[0]['args'] == {'run': tracer.run}
+    text = tracer.prometheus_text()
+    assert 'jbujb_span_seconds_count{cat="block",name="load \\"store\\""} 1' in text
+    assert 'jbujb_cache_lookups_total{cache="a\\"b",result="hit"} 1' in text